@@ -0,0 +1,77 @@
+"""
+Gateway CPU overhead per request, parsing proxy vs passthrough.
+
+Runs the gateway app in-process against a stub upstream that returns a canned
+completion, so the measured CPU time is the gateway's own work.
+
+    python scripts/bench_gateway.py --requests 500 --completion_kb 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "gateway"))
+import api  # noqa: E402
+
+
+def _stub_upstream(completion_kb: int) -> httpx.AsyncClient:
+    content = "x" * (completion_kb * 1024)
+    body = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode()
+
+    def handler(request):
+        return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def _run(passthrough: bool, requests: int, completion_kb: int, prompt_kb: int) -> dict:
+    api.GATEWAY_PASSTHROUGH = passthrough
+    # The app's own lifespan builds the admission queue, upstream pool, caches and counters;
+    # only its upstream client is swapped for the stub
+    api._create_upstream_client = lambda: _stub_upstream(completion_kb)
+    with tempfile.TemporaryDirectory() as batch_dir:
+        api.GATEWAY_BATCH_DIR = batch_dir
+        async with api.lifespan(api.app):
+            cpu, wall = await _measure(requests, prompt_kb)
+    return {
+        "mode": "passthrough" if passthrough else "parse",
+        "cpu_ms_per_request": round(cpu * 1000 / requests, 3),
+        "wall_ms_per_request": round(wall * 1000 / requests, 3),
+    }
+
+
+async def _measure(requests: int, prompt_kb: int) -> tuple:
+    payload = json.dumps({
+        "model": "bench",
+        "messages": [{"role": "user", "content": "y" * (prompt_kb * 1024)}],
+    }).encode()
+    headers = {"Authorization": f"Bearer {api.API_KEY}", "Content-Type": "application/json"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://gw") as client:
+        for _ in range(10):  # warm-up
+            await client.post("/v1/chat/completions", content=payload, headers=headers)
+        cpu, wall = time.process_time(), time.perf_counter()
+        for _ in range(requests):
+            r = await client.post("/v1/chat/completions", content=payload, headers=headers)
+            r.raise_for_status()
+        return time.process_time() - cpu, time.perf_counter() - wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gateway proxy overhead.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--completion_kb", type=int, default=64)
+    parser.add_argument("--prompt_kb", type=int, default=16)
+    args = parser.parse_args()
+    # The stub client also runs in this process; its cost is identical in both modes
+    for passthrough in (False, True):
+        print(json.dumps(asyncio.run(_run(passthrough, args.requests, args.completion_kb, args.prompt_kb))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Admission control for upstream generation slots.
+
+At most `slots` requests are in flight upstream; the rest wait in a queue
+ordered by priority class, then by model, then FIFO. When the queue is full,
+requests are rejected with a Retry-After estimate instead of piling up on llama.cpp.
+
+llama.cpp runs in router mode with `--models-max 1`, so serving a different
+model than the previous request forces a model reload. Within a priority class
+the queue therefore drains requests for the current model first. Two fairness
+bounds stop other models from starving: after `max_model_run` consecutive
+dispatches of one model while others wait, and once a waiter is older than
+`max_model_wait_s`, the oldest waiter is served regardless of model.
+"""
+import asyncio
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after_s: int):
+        super().__init__(f"Gateway queue is full, retry after {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+class Lease:
+    """A granted slot; `release` is idempotent so every exit path may call it"""
+
+    def __init__(self, controller: "AdmissionController", started: float, swapped: bool = False):
+        self._controller = controller
+        self._started = started
+        self._callbacks: List[Callable[[], None]] = []
+        self.swapped = swapped
+        self.released = False
+
+    def on_release(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self._controller._release(time.perf_counter() - self._started, self.swapped)
+            for callback in self._callbacks:
+                callback()
+
+
+@dataclass
+class _Waiter:
+    rank: int
+    seq: int
+    name: str
+    model: Optional[str]
+    enqueued: float
+    future: asyncio.Future = field(repr=False)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        slots: int = 1,
+        max_queue: int = 64,
+        classes: tuple = ("interactive", "default", "batch"),
+        max_model_run: int = 8,
+        max_model_wait_s: float = 30.0,
+    ):
+        self.slots = max(1, slots)
+        self.max_queue = max_queue
+        self.classes = classes
+        self.max_model_run = max_model_run
+        self.max_model_wait_s = max_model_wait_s
+        self._ranks = {name: rank for rank, name in enumerate(classes)}
+        self._in_flight = 0
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._service_s_ewma: Optional[float] = None
+        self._stats: Dict[str, Dict[str, float]] = {
+            name: {"admitted": 0, "rejected": 0, "queued": 0, "wait_s_total": 0.0, "wait_s_max": 0.0}
+            for name in classes
+        }
+        self.current_model: Optional[str] = None
+        self._model_run = 0
+        self.swaps = 0
+        self._swap_service_s_total = 0.0
+        self._swap_overhead_s_total = 0.0
+        self._forced_switches = 0
+
+    def priority_class(self, name: Optional[str]) -> str:
+        return name if name in self._ranks else ("default" if "default" in self._ranks else self.classes[-1])
+
+    def retry_after_s(self) -> int:
+        """Estimated time until a new request would reach a slot"""
+        service_s = self._service_s_ewma or 1.0
+        return max(1, math.ceil(service_s * (len(self._queue) + 1) / self.slots))
+
+    def _dispatch(self, model: Optional[str]) -> bool:
+        """Track the model sent upstream; returns True when it forces a model swap"""
+        if model is None:
+            return False
+        swapped = self.current_model is not None and model != self.current_model
+        if model == self.current_model:
+            self._model_run += 1
+        else:
+            self.current_model = model
+            self._model_run = 1
+        if swapped:
+            self.swaps += 1
+        return swapped
+
+    def _other_model(self, waiter: "_Waiter") -> bool:
+        return waiter.model is not None and waiter.model != self.current_model
+
+    async def acquire(self, priority: Optional[str] = None, model: Optional[str] = None) -> Lease:
+        name = self.priority_class(priority)
+        stats = self._stats[name]
+        enqueued = time.perf_counter()
+        if self._in_flight < self.slots and not self._queue:
+            self._in_flight += 1
+        else:
+            if len(self._queue) >= self.max_queue:
+                stats["rejected"] += 1
+                raise AdmissionRejected(self.retry_after_s())
+            future = asyncio.get_running_loop().create_future()
+            waiter = _Waiter(self._ranks[name], next(self._seq), name, model, enqueued, future)
+            self._queue.append(waiter)
+            stats["queued"] += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just as the caller went away
+                    self._release(None, False)
+                elif waiter in self._queue:
+                    self._queue.remove(waiter)
+                raise
+        swapped = self._dispatch(model)
+        waited = time.perf_counter() - enqueued
+        stats["admitted"] += 1
+        stats["wait_s_total"] += waited
+        stats["wait_s_max"] = max(stats["wait_s_max"], waited)
+        return Lease(self, time.perf_counter(), swapped)
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None, model: Optional[str] = None):
+        lease = await self.acquire(priority, model)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def _next_waiter(self) -> "_Waiter":
+        oldest = min(self._queue, key=lambda w: w.seq)
+        if any(self._other_model(w) for w in self._queue) and (
+            self._model_run >= self.max_model_run
+            or time.perf_counter() - oldest.enqueued > self.max_model_wait_s
+        ):
+            self._forced_switches += int(self._other_model(oldest))
+            return oldest
+        return min(self._queue, key=lambda w: (w.rank, self._other_model(w), w.seq))
+
+    def _release(self, service_s: Optional[float], swapped: bool) -> None:
+        if service_s is not None:
+            ewma = self._service_s_ewma
+            if swapped:
+                # Reload time is attributed to the swap, not to the service-time estimate
+                self._swap_service_s_total += service_s
+                self._swap_overhead_s_total += max(service_s - (ewma or 0.0), 0.0)
+            else:
+                self._service_s_ewma = service_s if ewma is None else 0.8 * ewma + 0.2 * service_s
+        while self._queue:
+            waiter = self._next_waiter()
+            self._queue.remove(waiter)
+            if not waiter.future.done():
+                # Hand the slot straight to the next waiter; in-flight count is unchanged
+                waiter.future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def metrics(self) -> dict:
+        depth = {name: 0 for name in self.classes}
+        by_model: Dict[str, int] = {}
+        for waiter in self._queue:
+            depth[waiter.name] += 1
+            model = waiter.model or "unspecified"
+            by_model[model] = by_model.get(model, 0) + 1
+        by_class = {}
+        for name, stats in self._stats.items():
+            admitted = stats["admitted"]
+            by_class[name] = {
+                **stats,
+                "wait_s_total": round(stats["wait_s_total"], 4),
+                "wait_s_max": round(stats["wait_s_max"], 4),
+                "wait_s_mean": round(stats["wait_s_total"] / admitted, 4) if admitted else 0.0,
+                "queue_depth": depth[name],
+            }
+        return {
+            "slots": self.slots,
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "service_s_ewma": None if self._service_s_ewma is None else round(self._service_s_ewma, 4),
+            "classes": by_class,
+            "models": {
+                "current": self.current_model,
+                "queue_depth": by_model,
+                "swaps": self.swaps,
+                "forced_switches": self._forced_switches,
+                "swap_service_s_total": round(self._swap_service_s_total, 4),
+                "swap_overhead_s_total": round(self._swap_overhead_s_total, 4),
+            },
+        }
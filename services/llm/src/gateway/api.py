@@ -1,35 +1,394 @@
-import os, json
+import asyncio, os, json, time
+from contextlib import asynccontextmanager
 from typing import Optional
 import httpx
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile
 from starlette.middleware.cors import CORSMiddleware
 
+from admission import AdmissionController, AdmissionRejected, Lease
+from batches import BatchError, BatchManager
+from coalesce import ResponseCache, SingleFlight, StoredResponse, is_deterministic, request_key
+from embeddings import EmbeddingBatcher, EmbeddingError
+from jsonscan import top_level
+from kvslots import SlotManager, with_slot
+from upstreams import Upstream, UpstreamPool, affinity_key
+
 API_KEY = os.getenv("API_KEY", "local-llm")
 UPSTREAM_BASE_URL = os.getenv("UPSTREAM_BASE_URL", "http://llm:8000/v1")
+# Comma-separated llama.cpp replicas; defaults to the single UPSTREAM_BASE_URL
+UPSTREAM_BASE_URLS = [u.strip() for u in os.getenv("UPSTREAM_BASE_URLS", UPSTREAM_BASE_URL).split(",") if u.strip()]
+UPSTREAM_HEALTH_INTERVAL_S = float(os.getenv("UPSTREAM_HEALTH_INTERVAL_S", "10"))
+# Requests with the same x-session-id, or the same first N bytes of their messages, prefer
+# the same replica (its KV cache holds the prefix) unless it is this many requests busier
+GATEWAY_AFFINITY_PREFIX_BYTES = int(os.getenv("GATEWAY_AFFINITY_PREFIX_BYTES", "4096"))
+GATEWAY_MAX_AFFINITY_SKEW = int(os.getenv("GATEWAY_MAX_AFFINITY_SKEW", "2"))
+
+# Upstream connection pool and timeouts. The read timeout bounds the wait for the
+# next byte (a non-streamed completion sends nothing until it is done), connect
+# failures surface within UPSTREAM_CONNECT_TIMEOUT_S instead of hanging a worker.
+UPSTREAM_CONNECT_TIMEOUT_S = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT_S", "5"))
+UPSTREAM_READ_TIMEOUT_S = float(os.getenv("UPSTREAM_READ_TIMEOUT_S", "600"))
+UPSTREAM_WRITE_TIMEOUT_S = float(os.getenv("UPSTREAM_WRITE_TIMEOUT_S", "30"))
+UPSTREAM_POOL_TIMEOUT_S = float(os.getenv("UPSTREAM_POOL_TIMEOUT_S", "30"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "64"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "32"))
+UPSTREAM_KEEPALIVE_EXPIRY_S = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY_S", "30"))
+
+# Passthrough mode forwards request/response bytes untouched (no JSON parse/re-encode);
+# GATEWAY_PASSTHROUGH=0 restores the parsing proxy.
+GATEWAY_PASSTHROUGH = os.getenv("GATEWAY_PASSTHROUGH", "1") != "0"
+
+# Top-level request keys the gateway acts on, read with one scan of the body per request
+# (`jsonscan.top_level`); the same keys nested in a schema, metadata or a message are ignored
+_MAX_TOKENS_KEYS = ("max_tokens", "max_completion_tokens", "n_predict")
+_REQUEST_FIELDS = ("model", "stream", "temperature") + _MAX_TOKENS_KEYS
+_HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+    "trailer", "transfer-encoding", "upgrade", "host", "content-length",
+}
+# Never forwarded upstream: the gateway's own credentials and encodings the proxy would have to undo
+_REQUEST_DROP = _HOP_BY_HOP | {"authorization", "x-api-key", "accept-encoding", "x-stream"}
+_RESPONSE_DROP = _HOP_BY_HOP | {"content-encoding"}
+
+# Admission control: llama.cpp runs `-np 1`, so by default one generation per replica is in
+# flight upstream and the rest wait here, highest priority class first.
+GATEWAY_SLOTS = int(os.getenv("GATEWAY_SLOTS", "1"))
+GATEWAY_MAX_QUEUE = int(os.getenv("GATEWAY_MAX_QUEUE", "64"))
+GATEWAY_PRIORITY_CLASSES = tuple(
+    c.strip() for c in os.getenv("GATEWAY_PRIORITY_CLASSES", "interactive,default,batch").split(",") if c.strip()
+)
+# Deterministic (`"temperature": 0`) non-streaming requests: identical in-flight requests share
+# one upstream call; completed responses are cached when GATEWAY_CACHE_MAX_BYTES > 0.
+GATEWAY_COALESCE = os.getenv("GATEWAY_COALESCE", "1") != "0"
+GATEWAY_CACHE_MAX_BYTES = int(os.getenv("GATEWAY_CACHE_MAX_BYTES", "0"))
+GATEWAY_CACHE_TTL_S = float(os.getenv("GATEWAY_CACHE_TTL_S", "600"))
+# Model hot-swap: drain one model's queue before switching, but switch after this many
+# consecutive requests or once another model's request has waited this long
+GATEWAY_MAX_MODEL_RUN = int(os.getenv("GATEWAY_MAX_MODEL_RUN", "8"))
+GATEWAY_MAX_MODEL_WAIT_S = float(os.getenv("GATEWAY_MAX_MODEL_WAIT_S", "30"))
+# /v1/models is cached this long, and dropped whenever a model swap was dispatched
+GATEWAY_MODELS_TTL_S = float(os.getenv("GATEWAY_MODELS_TTL_S", "30"))
+# Offline batches (/v1/files + /v1/batches) are stored here and resumed after a restart;
+# their requests enter the admission queue at "batch" priority
+GATEWAY_BATCH_DIR = os.getenv("GATEWAY_BATCH_DIR", "batches")
+GATEWAY_BATCH_CONCURRENCY = int(os.getenv("GATEWAY_BATCH_CONCURRENCY", "0"))  # 0 = number of slots
+GATEWAY_MAX_FILE_BYTES = int(os.getenv("GATEWAY_MAX_FILE_BYTES", str(100 * 2 ** 20)))  # uploads above get a 413
+# KV-cache persistence: pin each x-session-id to one of the GATEWAY_SLOTS llama.cpp slots and
+# save/restore its KV state when sessions take turns (needs llama.cpp `--slot-save-path`)
+GATEWAY_KV_SLOTS = os.getenv("GATEWAY_KV_SLOTS", "0") != "0"
+# /v1/embeddings: concurrent requests are merged into upstream batches of up to this many
+# inputs, waiting at most GATEWAY_EMBED_MAX_WAIT_MS for more to arrive
+GATEWAY_EMBED_MAX_BATCH = int(os.getenv("GATEWAY_EMBED_MAX_BATCH", "32"))
+GATEWAY_EMBED_MAX_WAIT_MS = float(os.getenv("GATEWAY_EMBED_MAX_WAIT_MS", "5"))
+# Extra API keys pinned to a priority class, "key:class,key:class"
+GATEWAY_PRIORITY_KEYS = dict(
+    item.strip().split(":", 1) for item in os.getenv("GATEWAY_PRIORITY_KEYS", "").split(",") if ":" in item
+)
+
+
+def _create_upstream_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            connect=UPSTREAM_CONNECT_TIMEOUT_S,
+            read=UPSTREAM_READ_TIMEOUT_S,
+            write=UPSTREAM_WRITE_TIMEOUT_S,
+            pool=UPSTREAM_POOL_TIMEOUT_S,
+        ),
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY_S,
+        ),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled keep-alive client for the whole process
+    app.state.upstream = _create_upstream_client()
+    app.state.upstreams = UpstreamPool(UPSTREAM_BASE_URLS, max_affinity_skew=GATEWAY_MAX_AFFINITY_SKEW)
+    slots = GATEWAY_SLOTS * len(app.state.upstreams.upstreams)
+    app.state.admission = AdmissionController(
+        slots,
+        GATEWAY_MAX_QUEUE,
+        GATEWAY_PRIORITY_CLASSES,
+        max_model_run=GATEWAY_MAX_MODEL_RUN,
+        max_model_wait_s=GATEWAY_MAX_MODEL_WAIT_S,
+    )
+    app.state.models_cache = None
+    app.state.cancellations = {
+        "streaming": 0,
+        "non_streaming": 0,
+        "tokens_streamed_before_cancel": 0,
+        "max_tokens_unused": 0,
+    }
+    app.state.batches = BatchManager(GATEWAY_BATCH_DIR, _batch_caller(app), GATEWAY_BATCH_CONCURRENCY or slots)
+    app.state.batches.resume()
+    app.state.single_flight = SingleFlight()
+    app.state.kv_slots = SlotManager(GATEWAY_SLOTS) if GATEWAY_KV_SLOTS else None
+    app.state.embeddings = EmbeddingBatcher(_embedding_caller(app), GATEWAY_EMBED_MAX_BATCH, GATEWAY_EMBED_MAX_WAIT_MS / 1000)
+    app.state.response_cache = ResponseCache(GATEWAY_CACHE_MAX_BYTES, GATEWAY_CACHE_TTL_S)
+    health_checks = asyncio.create_task(
+        app.state.upstreams.run_health_checks(app.state.upstream, UPSTREAM_HEALTH_INTERVAL_S)
+    )
+    try:
+        yield
+    finally:
+        health_checks.cancel()
+        await app.state.embeddings.close()
+        await app.state.batches.close()
+        await app.state.upstream.aclose()
 
-app = FastAPI(title="LLM Gateway", version="1.0")
+
+app = FastAPI(title="LLM Gateway", version="1.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
 
-def _auth_ok(request: Request) -> bool:
+def _request_keys(request: Request) -> tuple:
     bearer = request.headers.get("Authorization", "").replace("Bearer ", "").strip()
     xkey = request.headers.get("x-api-key", "").strip()
-    return bearer == API_KEY or xkey == API_KEY
+    return bearer, xkey
+
+def _auth_ok(request: Request) -> bool:
+    return any(key == API_KEY or key in GATEWAY_PRIORITY_KEYS for key in _request_keys(request) if key)
+
+def _priority(request: Request) -> Optional[str]:
+    """Priority class: pinned by the API key, otherwise the `x-priority` header"""
+    for key in _request_keys(request):
+        if key in GATEWAY_PRIORITY_KEYS:
+            return GATEWAY_PRIORITY_KEYS[key]
+    return request.headers.get("x-priority")
+
+def _request_fields(body: bytes) -> dict:
+    return top_level(body, _REQUEST_FIELDS)
+
+def _requested_model(fields: dict) -> Optional[str]:
+    model = fields.get("model")
+    return model if isinstance(model, str) else None
+
+async def _admit(request: Request, model: Optional[str]) -> Lease:
+    try:
+        return await request.app.state.admission.acquire(_priority(request), model)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+
+def _record_cancel(request: Request, fields: dict, streaming: bool, tokens_sent: int = 0) -> None:
+    """Count a generation cut short by a client disconnect and the tokens it no longer produces"""
+    stats = request.app.state.cancellations
+    stats["streaming" if streaming else "non_streaming"] += 1
+    stats["tokens_streamed_before_cancel"] += tokens_sent
+    max_tokens = next((fields[k] for k in _MAX_TOKENS_KEYS if isinstance(fields.get(k), int)), None)
+    if max_tokens is not None:
+        # Upper bound: the generation might have stopped earlier on its own
+        stats["max_tokens_unused"] += max(max_tokens - tokens_sent, 0)
+
+async def _relay(request: Request, fields: dict, chunks, resp: httpx.Response, lease: Lease):
+    """Relay an upstream stream; if the client goes away, close the upstream connection
+    at once (llama.cpp stops generating when its client disconnects) and free the slot"""
+    events = 0
+    try:
+        async for chunk in chunks:
+            events += chunk.count(b"data:")
+            yield chunk
+    except (asyncio.CancelledError, GeneratorExit):
+        _record_cancel(request, fields, True, events)
+        raise
+    finally:
+        await resp.aclose()
+        lease.release()
+
+class _RelayResponse(StreamingResponse):
+    """Always finalizes the body iterator, also when sending to a gone client fails"""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+async def _until_disconnect(request: Request, fields: dict, work, streaming: bool = False) -> Response:
+    """Run a request until its response is ready, cancelling it (and its upstream call) if the
+    client disconnects first. For streams that covers the admission wait and opening the upstream
+    stream; once relaying, `_relay` handles the disconnect"""
+    task = asyncio.ensure_future(work)
+
+    async def disconnected():
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+    if not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        _record_cancel(request, fields, streaming)
+        return Response(status_code=499)
+    return task.result()
+
+async def _close_stream(resp: httpx.Response, lease: Lease):
+    # Also runs when the body iterator was never exhausted; Lease.release is idempotent
+    await resp.aclose()
+    lease.release()
+
+def _upstream(request: Request) -> httpx.AsyncClient:
+    return request.app.state.upstream
+
+def _upstream_error(e: httpx.HTTPError, upstream: Optional[Upstream] = None) -> HTTPException:
+    if upstream is not None and isinstance(e, httpx.ConnectError):
+        upstream.mark_failed()
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail=f"Upstream timeout: {type(e).__name__}")
+    return HTTPException(status_code=502, detail=f"Upstream unavailable: {type(e).__name__}")
+
+async def _upstream_json(request: Request, method: str, url: str, upstream: Optional[Upstream] = None, **kwargs) -> JSONResponse:
+    try:
+        r = await _upstream(request).request(method, url, **kwargs)
+    except httpx.HTTPError as e:
+        raise _upstream_error(e, upstream)
+    return JSONResponse(r.json(), status_code=r.status_code)
 
 @app.get("/v1/models")
 async def models(request: Request):
     if not _auth_ok(request):
         raise HTTPException(status_code=401, detail="Invalid API key")
-    async with httpx.AsyncClient(timeout=None) as client:
-        r = await client.get(f"{UPSTREAM_BASE_URL}/models")
-        return JSONResponse(r.json(), status_code=r.status_code)
+    state = request.app.state
+    # Router-mode /v1/models reports which model is loaded, so a swap invalidates the cache
+    cached = state.models_cache
+    if cached is not None and cached[1] == state.admission.swaps and time.monotonic() - cached[2] < GATEWAY_MODELS_TTL_S:
+        return _stored_response(cached[0], "hit")
+    upstream = state.upstreams.pick()
+    response = await _upstream_json(request, "GET", f"{upstream.base_url}/models", upstream)
+    stored = StoredResponse(response.status_code, {"content-type": "application/json"}, bytes(response.body))
+    if response.status_code == 200:
+        state.models_cache = (stored, state.admission.swaps, time.monotonic())
+    return _stored_response(stored, "miss")
+
+def _wants_stream(request: Request, fields: dict) -> bool:
+    hint = request.headers.get("x-stream")
+    if hint is not None:
+        return hint.strip().lower() in ("1", "true", "yes")
+    return fields.get("stream") is True
+
+def _forward_headers(headers) -> dict:
+    forwarded = {k: v for k, v in headers.items() if k.lower() not in _REQUEST_DROP}
+    forwarded["Accept-Encoding"] = "identity"
+    return forwarded
+
+def _response_headers(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in _RESPONSE_DROP}
+
+async def _passthrough(request: Request, upstream: Upstream, path: str, body: bytes, fields: dict, lease: Lease) -> Response:
+    """Forward bytes and headers unchanged in both directions; `lease` is released once the body is sent"""
+    client = _upstream(request)
+    upstream_request = client.build_request("POST", f"{upstream.base_url}{path}", content=body, headers=_forward_headers(request.headers))
+    try:
+        resp = await client.send(upstream_request, stream=True)
+    except httpx.HTTPError as e:
+        raise _upstream_error(e, upstream)
+    headers = _response_headers(resp.headers)
+    if _wants_stream(request, fields):
+        return _RelayResponse(
+            _relay(request, fields, resp.aiter_raw(), resp, lease),
+            status_code=resp.status_code,
+            headers=headers,
+            background=BackgroundTask(_close_stream, resp, lease),
+        )
+    try:
+        content = await resp.aread()
+    except httpx.HTTPError as e:
+        raise _upstream_error(e)
+    finally:
+        await resp.aclose()
+    return Response(content=content, status_code=resp.status_code, headers=headers)
 
 async def _proxy_json(request: Request, path: str):
     if not _auth_ok(request):
         raise HTTPException(status_code=401, detail="Invalid API key")
     body = await request.body()
+    fields = _request_fields(body)
+    if _wants_stream(request, fields):
+        # A client that leaves while queued must not start a generation once admitted
+        return await _until_disconnect(request, fields, _admitted(request, path, body, fields), streaming=True)
+    if is_deterministic(fields):
+        return await _until_disconnect(request, fields, _deduplicated(request, path, body, fields))
+    return await _until_disconnect(request, fields, _admitted(request, path, body, fields))
+
+def _stored_response(stored: StoredResponse, status: str) -> Response:
+    return Response(
+        content=stored.body,
+        status_code=stored.status_code,
+        headers={**stored.headers, "x-gateway-cache": status},
+    )
+
+async def _deduplicated(request: Request, path: str, body: bytes, fields: dict) -> Response:
+    """Serve a deterministic request from the cache, an identical in-flight call, or upstream"""
+    state = request.app.state
+    key = request_key(path, body)
+    cache = state.response_cache
+    if cache.enabled:
+        cached = cache.get(key)
+        if cached is not None:
+            return _stored_response(cached, "hit")
+
+    async def call() -> StoredResponse:
+        response = await _admitted(request, path, body, fields)
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+        stored = StoredResponse(response.status_code, headers, bytes(response.body))
+        if cache.enabled and 200 <= stored.status_code < 300:
+            cache.set(key, stored)
+        return stored
+
+    if not GATEWAY_COALESCE:
+        return _stored_response(await call(), "miss")
+    stored, shared = await state.single_flight.do(key, call)
+    return _stored_response(stored, "coalesced" if shared else "miss")
+
+def _route(pool: UpstreamPool, lease: Lease, body: bytes, model: Optional[str], session_id: Optional[str]) -> Upstream:
+    """Pick the replica for an admitted request; it counts as outstanding until the lease is released"""
+    upstream = pool.pick(affinity_key(session_id, body, GATEWAY_AFFINITY_PREFIX_BYTES), model)
+    pool.begin(upstream, model)
+    lease.on_release(lambda: pool.end(upstream))
+    return upstream
+
+async def _pin_slot(app: FastAPI, lease: Lease, upstream: Upstream, body: bytes, model: Optional[str], session_id: Optional[str]) -> bytes:
+    """Load the session's KV state into a llama.cpp slot and direct the request to it"""
+    kv = app.state.kv_slots
+    if kv is None:
+        return body
+    slot_id = await kv.acquire(app.state.upstream, upstream, session_id, model)
+    if slot_id is None:
+        return body
+    lease.on_release(lambda: kv.release(upstream, slot_id))
+    return with_slot(body, slot_id)
+
+async def _admitted(request: Request, path: str, body: bytes, fields: dict) -> Response:
+    model = _requested_model(fields)
+    lease = await _admit(request, model)
+    session_id = request.headers.get("x-session-id")
+    upstream = _route(request.app.state.upstreams, lease, body, model, session_id)
+    try:
+        body = await _pin_slot(request.app, lease, upstream, body, model, session_id)
+        response = await _forward(request, upstream, path, body, fields, lease)
+    except BaseException:
+        lease.release()
+        raise
+    if not isinstance(response, StreamingResponse):
+        lease.release()
+    return response
+
+async def _forward(request: Request, upstream: Upstream, path: str, body: bytes, fields: dict, lease: Lease) -> Response:
+    if GATEWAY_PASSTHROUGH:
+        return await _passthrough(request, upstream, path, body, fields, lease)
     headers = {"Content-Type": "application/json"}
     stream = False
     try:
@@ -37,16 +396,63 @@ async def _proxy_json(request: Request, path: str):
         stream = bool(payload.get("stream", False))
     except Exception:
         pass
-    async with httpx.AsyncClient(timeout=None) as client:
-        if stream:
-            async def gen():
-                async with client.stream("POST", f"{UPSTREAM_BASE_URL}{path}", content=body, headers=headers) as resp:
-                    async for chunk in resp.aiter_bytes():
-                        yield chunk
-            return StreamingResponse(gen(), media_type="text/event-stream")
-        else:
-            r = await client.post(f"{UPSTREAM_BASE_URL}{path}", content=body, headers=headers)
-            return JSONResponse(r.json(), status_code=r.status_code)
+    if stream:
+        # Open the upstream response before answering, so connect errors become a 502/504
+        client = _upstream(request)
+        upstream_request = client.build_request("POST", f"{upstream.base_url}{path}", content=body, headers=headers)
+        try:
+            resp = await client.send(upstream_request, stream=True)
+        except httpx.HTTPError as e:
+            raise _upstream_error(e, upstream)
+        return _RelayResponse(
+            _relay(request, fields, resp.aiter_bytes(), resp, lease),
+            status_code=resp.status_code,
+            media_type="text/event-stream",
+            background=BackgroundTask(_close_stream, resp, lease),
+        )
+    return await _upstream_json(request, "POST", f"{upstream.base_url}{path}", upstream, content=body, headers=headers)
+
+def _batch_caller(app: FastAPI):
+    """Upstream call used by batch workers: batch priority, waits instead of taking a 429"""
+    async def call(path: str, body: bytes) -> tuple:
+        state = app.state
+        model = _requested_model(_request_fields(body))
+        while True:
+            try:
+                lease = await state.admission.acquire("batch", model)
+                break
+            except AdmissionRejected as e:
+                await asyncio.sleep(e.retry_after_s)
+        try:
+            upstream = _route(state.upstreams, lease, body, model, None)
+            body = await _pin_slot(app, lease, upstream, body, model, None)
+            try:
+                r = await state.upstream.post(f"{upstream.base_url}{path}", content=body, headers={"Content-Type": "application/json"})
+            except httpx.ConnectError:
+                upstream.mark_failed()
+                raise
+            return r.status_code, r.content
+        finally:
+            lease.release()
+    return call
+
+def _embedding_caller(app: FastAPI):
+    """Upstream call for one merged embeddings batch; it takes a single admission slot"""
+    async def call(payload: dict) -> tuple:
+        state = app.state
+        model = payload.get("model")
+        body = json.dumps(payload).encode()
+        lease = await state.admission.acquire(None, model)
+        try:
+            upstream = _route(state.upstreams, lease, body, model, None)
+            try:
+                r = await state.upstream.post(f"{upstream.base_url}/embeddings", content=body, headers={"Content-Type": "application/json"})
+            except httpx.HTTPError as e:
+                raise _upstream_error(e, upstream)
+            return r.status_code, r.content
+        finally:
+            lease.release()
+    return call
 
 @app.post("/v1/chat/completions")
 async def chat_completions(request: Request):
@@ -56,6 +462,140 @@ async def chat_completions(request: Request):
 async def completions(request: Request):
     return await _proxy_json(request, "/completions")
 
+@app.post("/tokenize")
+async def tokenize(request: Request):
+    # llama.cpp serves /tokenize at the server root, not under /v1
+    if not _auth_ok(request):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    body = await request.body()
+    upstream = request.app.state.upstreams.pick()
+    return await _upstream_json(request, "POST", f"{upstream.root_url}/tokenize", upstream, content=body, headers={"Content-Type": "application/json"})
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    if not _auth_ok(request):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    try:
+        payload = await request.json()
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        return await request.app.state.embeddings.embed(payload)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+    except EmbeddingError as e:
+        return Response(content=e.body, status_code=e.status_code, media_type="application/json")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _batch_error(e: BatchError) -> HTTPException:
+    return HTTPException(status_code=404 if str(e).startswith("No such") else 400, detail=str(e))
+
+@app.post("/v1/files")
+async def create_file(request: Request):
+    """Upload a batch input file: multipart `file` field (OpenAI clients) or a raw JSONL body"""
+    if not _auth_ok(request):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    purpose = request.query_params.get("purpose", "batch")
+    filename = request.query_params.get("filename")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > GATEWAY_MAX_FILE_BYTES:
+        raise _too_large()
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            raise HTTPException(status_code=400, detail="Multipart upload needs a `file` field holding the file")
+        content = await upload.read(GATEWAY_MAX_FILE_BYTES + 1)
+        purpose = form.get("purpose", purpose)
+        filename = upload.filename
+    else:
+        # Bodies without a Content-Length are cut off as soon as they pass the limit
+        content = bytearray()
+        async for chunk in request.stream():
+            content += chunk
+            if len(content) > GATEWAY_MAX_FILE_BYTES:
+                raise _too_large()
+        content = bytes(content)
+    if len(content) > GATEWAY_MAX_FILE_BYTES:
+        raise _too_large()
+    return request.app.state.batches.create_file(content, purpose, filename)
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds {GATEWAY_MAX_FILE_BYTES} bytes")
+
+@app.get("/v1/files/{file_id}")
+async def get_file(request: Request, file_id: str):
+    if not _auth_ok(request):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    try:
+        return request.app.state.batches.get_file(file_id)
+    except BatchError as e:
+        raise _batch_error(e)
+
+@app.get("/v1/files/{file_id}/content")
+async def get_file_content(request: Request, file_id: str):
+    if not _auth_ok(request):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    try:
+        path = request.app.state.batches.file_content_path(file_id)
+    except BatchError as e:
+        raise _batch_error(e)
+    return FileResponse(path, media_type="application/jsonl")
+
+@app.post("/v1/batches")
+async def create_batch(request: Request):
+    if not _auth_ok(request):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    payload = await request.json()
+    try:
+        return request.app.state.batches.create_batch(
+            payload["input_file_id"],
+            payload.get("endpoint", "/v1/chat/completions"),
+            payload.get("completion_window", "24h"),
+            payload.get("metadata"),
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Missing field: {e}")
+    except BatchError as e:
+        raise _batch_error(e)
+
+@app.get("/v1/batches")
+async def list_batches(request: Request):
+    if not _auth_ok(request):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return {"object": "list", "data": request.app.state.batches.list_batches()}
+
+@app.get("/v1/batches/{batch_id}")
+async def get_batch(request: Request, batch_id: str):
+    if not _auth_ok(request):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    try:
+        return request.app.state.batches.get_batch(batch_id)
+    except BatchError as e:
+        raise _batch_error(e)
+
+@app.post("/v1/batches/{batch_id}/cancel")
+async def cancel_batch(request: Request, batch_id: str):
+    if not _auth_ok(request):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    try:
+        return request.app.state.batches.cancel(batch_id)
+    except BatchError as e:
+        raise _batch_error(e)
+
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    state = request.app.state
+    return {
+        "admission": state.admission.metrics(),
+        "coalescing": state.single_flight.metrics(),
+        "response_cache": state.response_cache.metrics(),
+        "upstreams": state.upstreams.metrics(),
+        "cancellations": dict(state.cancellations),
+        "embeddings": state.embeddings.metrics(),
+        "kv_slots": state.kv_slots.metrics() if state.kv_slots is not None else {"enabled": False},
+    }
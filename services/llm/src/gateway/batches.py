@@ -0,0 +1,277 @@
+"""
+OpenAI-style offline batches.
+
+Input files are JSONL, one request per line:
+    {"custom_id": "...", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+A batch runs them in the background with bounded concurrency (through the
+admission queue at batch priority, so it only fills slots interactive traffic
+leaves idle) and appends one result line per request to its output file.
+
+Everything lives under `root` (metadata as JSON, files as JSONL). After a
+restart, unfinished batches are resumed and requests that already have a result
+line are skipped.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# (url path, body bytes) -> (status code, response body bytes)
+BatchCall = Callable[[str, bytes], Awaitable[Tuple[int, bytes]]]
+
+SUPPORTED_ENDPOINTS = ("/v1/chat/completions", "/v1/completions")
+_FINAL = ("completed", "failed", "cancelled")
+
+
+class BatchError(Exception):
+    pass
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class BatchManager:
+    def __init__(self, root: str, call: BatchCall, concurrency: int = 4):
+        self.root = root
+        self.call = call
+        self.concurrency = max(1, concurrency)
+        os.makedirs(os.path.join(root, "files"), exist_ok=True)
+        os.makedirs(os.path.join(root, "batches"), exist_ok=True)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._batches: Dict[str, dict] = {}
+
+    # ---- files ---------------------------------------------------------------
+
+    def _file_path(self, file_id: str) -> str:
+        return os.path.join(self.root, "files", f"{file_id}.jsonl")
+
+    def _file_meta_path(self, file_id: str) -> str:
+        return os.path.join(self.root, "files", f"{file_id}.json")
+
+    def create_file(self, content: bytes, purpose: str = "batch", filename: Optional[str] = None) -> dict:
+        file_id = f"file-{uuid.uuid4().hex}"
+        with open(self._file_path(file_id), "wb") as f:
+            f.write(content)
+        return self._new_file_meta(file_id, len(content), purpose, filename)
+
+    def _new_file_meta(self, file_id: str, size: int, purpose: str, filename: Optional[str] = None) -> dict:
+        meta = {
+            "id": file_id,
+            "object": "file",
+            "bytes": size,
+            "created_at": int(time.time()),
+            "filename": filename or f"{file_id}.jsonl",
+            "purpose": purpose,
+        }
+        _write_json(self._file_meta_path(file_id), meta)
+        return meta
+
+    def get_file(self, file_id: str) -> dict:
+        path = self._file_meta_path(file_id)
+        if not os.path.isfile(path):
+            raise BatchError(f"No such file: {file_id}")
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        content = self._file_path(file_id)
+        if os.path.isfile(content):
+            meta["bytes"] = os.path.getsize(content)
+        return meta
+
+    def file_content_path(self, file_id: str) -> str:
+        self.get_file(file_id)
+        return self._file_path(file_id)
+
+    # ---- batches -------------------------------------------------------------
+
+    def _batch_path(self, batch_id: str) -> str:
+        return os.path.join(self.root, "batches", f"{batch_id}.json")
+
+    def _save(self, batch: dict) -> None:
+        _write_json(self._batch_path(batch["id"]), batch)
+
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str = "24h", metadata: Optional[dict] = None) -> dict:
+        if endpoint not in SUPPORTED_ENDPOINTS:
+            raise BatchError(f"Unsupported endpoint: {endpoint}")
+        self.get_file(input_file_id)
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        output_file_id = f"file-{uuid.uuid4().hex}"
+        error_file_id = f"file-{uuid.uuid4().hex}"
+        open(self._file_path(output_file_id), "wb").close()
+        open(self._file_path(error_file_id), "wb").close()
+        self._new_file_meta(output_file_id, 0, "batch_output")
+        self._new_file_meta(error_file_id, 0, "batch_output")
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": endpoint,
+            "input_file_id": input_file_id,
+            "output_file_id": output_file_id,
+            "error_file_id": error_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "created_at": int(time.time()),
+            "in_progress_at": None,
+            "completed_at": None,
+            "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": metadata or {},
+        }
+        self._batches[batch_id] = batch
+        self._save(batch)
+        self._start(batch_id)
+        return batch
+
+    def get_batch(self, batch_id: str) -> dict:
+        batch = self._batches.get(batch_id)
+        if batch is None:
+            path = self._batch_path(batch_id)
+            if not os.path.isfile(path):
+                raise BatchError(f"No such batch: {batch_id}")
+            with open(path, encoding="utf-8") as f:
+                batch = json.load(f)
+            self._batches[batch_id] = batch
+        return batch
+
+    def list_batches(self) -> List[dict]:
+        for name in os.listdir(os.path.join(self.root, "batches")):
+            if name.endswith(".json"):
+                self.get_batch(name[:-5])
+        return sorted(self._batches.values(), key=lambda b: b["created_at"], reverse=True)
+
+    def cancel(self, batch_id: str) -> dict:
+        batch = self.get_batch(batch_id)
+        if batch["status"] not in _FINAL:
+            batch["status"] = "cancelling"
+            self._save(batch)
+            task = self._tasks.get(batch_id)
+            if task is None:
+                self._finish(batch, "cancelled")
+            else:
+                task.cancel()
+        return batch
+
+    def resume(self) -> List[str]:
+        """Restart batches a previous gateway process left unfinished"""
+        resumed = []
+        for batch in self.list_batches():
+            if batch["status"] == "cancelling":
+                self._finish(batch, "cancelled")
+            elif batch["status"] not in _FINAL:
+                self._start(batch["id"])
+                resumed.append(batch["id"])
+        return resumed
+
+    async def close(self) -> None:
+        """Stop workers on shutdown; their batches stay in progress and resume on the next start"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start(self, batch_id: str) -> None:
+        task = asyncio.get_running_loop().create_task(self._run(batch_id))
+        self._tasks[batch_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(batch_id, None))
+
+    def _finish(self, batch: dict, status: str) -> None:
+        batch["status"] = status
+        batch[f"{status}_at"] = int(time.time())
+        self._save(batch)
+
+    def _done_indices(self, batch: dict) -> Set[int]:
+        done = set()
+        for file_id in (batch["output_file_id"], batch["error_file_id"]):
+            with open(self._file_path(file_id), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        done.add(int(json.loads(line)["id"].rsplit("_", 1)[1]))
+                    except (ValueError, KeyError, IndexError):
+                        continue  # a line torn by a crash is retried
+        return done
+
+    @staticmethod
+    def _terminate_last_line(path: str) -> None:
+        """A line torn by a crash must not swallow the next appended result"""
+        with open(path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    async def _run(self, batch_id: str) -> None:
+        batch = self.get_batch(batch_id)
+        try:
+            with open(self._file_path(batch["input_file_id"]), encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+        except OSError as e:
+            batch["errors"] = {"data": [{"message": f"Cannot read input file: {e}"}]}
+            self._finish(batch, "failed")
+            return
+
+        done = self._done_indices(batch)
+        for file_id in (batch["output_file_id"], batch["error_file_id"]):
+            self._terminate_last_line(self._file_path(file_id))
+        counts = batch["request_counts"]
+        counts["total"] = len(lines)
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = batch["in_progress_at"] or int(time.time())
+        self._save(batch)
+
+        output = open(self._file_path(batch["output_file_id"]), "a", encoding="utf-8")
+        errors = open(self._file_path(batch["error_file_id"]), "a", encoding="utf-8")
+
+        async def run_one(index: int, line: str) -> None:
+            async with self._semaphore:
+                result = await self._execute(batch, index, line)
+            failed = result.get("error") is not None
+            target = errors if failed else output
+            target.write(json.dumps(result) + "\n")
+            target.flush()
+            counts["failed" if failed else "completed"] += 1
+            self._save(batch)
+
+        try:
+            await asyncio.gather(*(run_one(i, line) for i, line in enumerate(lines) if i not in done))
+        except asyncio.CancelledError:
+            if batch["status"] == "cancelling":
+                self._finish(batch, "cancelled")
+            raise
+        finally:
+            output.close()
+            errors.close()
+        self._finish(batch, "completed")
+
+    async def _execute(self, batch: dict, index: int, line: str) -> dict:
+        result = {"id": f"batch_req_{batch['id']}_{index}", "custom_id": None, "response": None, "error": None}
+        try:
+            request = json.loads(line)
+            result["custom_id"] = request.get("custom_id")
+            url = request.get("url", batch["endpoint"])
+            if url != batch["endpoint"]:
+                raise BatchError(f"Request url {url} does not match the batch endpoint {batch['endpoint']}")
+            body = json.dumps({**request["body"], "stream": False}).encode()
+        except (ValueError, KeyError, TypeError, BatchError) as e:
+            result["error"] = {"code": "invalid_request", "message": str(e)}
+            return result
+        try:
+            status, content = await self.call(url[len("/v1"):], body)
+        except Exception as e:
+            result["error"] = {"code": "upstream_error", "message": str(e) or type(e).__name__}
+            return result
+        try:
+            response_body = json.loads(content)
+        except ValueError:
+            response_body = content.decode("utf-8", "replace")
+        result["response"] = {"status_code": status, "request_id": result["id"], "body": response_body}
+        if status >= 400:
+            result["error"] = {"code": f"http_{status}", "message": "Upstream returned an error"}
+        return result
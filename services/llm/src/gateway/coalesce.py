@@ -0,0 +1,129 @@
+"""
+Deduplication of deterministic requests.
+
+`SingleFlight` runs one upstream call per key while identical requests are in
+flight; `ResponseCache` keeps completed responses in a byte-bounded LRU with TTL.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+def is_deterministic(fields: dict) -> bool:
+    """Only an explicit top-level `"temperature": 0` makes a request deterministic (the server
+    default samples); `fields` holds the body's top-level scalars (`jsonscan.top_level`)"""
+    temperature = fields.get("temperature")
+    return isinstance(temperature, (int, float)) and not isinstance(temperature, bool) and temperature == 0
+
+
+def request_key(path: str, body: bytes) -> str:
+    return hashlib.sha256(path.encode() + b"\0" + body).hexdigest()
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+    stored_at: float = field(default_factory=time.monotonic)
+
+
+class SingleFlight:
+    """Share one in-flight call among callers with the same key"""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, bool]:
+        """Returns (result, shared); shared is True when another caller's call was reused"""
+        task = self._tasks.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            # A task, so one caller going away does not cancel the call for the others
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _: (self._tasks.pop(key, None), self._waiters.pop(key, None)))
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            # The call keeps running while anyone still waits for it; the last one out cancels it
+            if key in self._waiters:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not task.done():
+                    self.abandoned += 1
+                    task.cancel()
+            raise
+
+    def metrics(self) -> dict:
+        return {"in_flight": len(self._tasks), "leaders": self.leaders, "coalesced": self.coalesced, "abandoned": self.abandoned}
+
+
+class ResponseCache:
+    """LRU of successful responses bounded by total body bytes, entries expire after `ttl_s`"""
+
+    def __init__(self, max_bytes: int, ttl_s: float):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.stored_at > self.ttl_s:
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: str, response: StoredResponse) -> None:
+        size = len(response.body)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = response
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
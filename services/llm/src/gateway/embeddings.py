@@ -0,0 +1,194 @@
+"""
+Micro-batching for /v1/embeddings.
+
+Concurrent requests with the same model and options are merged into one
+upstream call: a batch is sent once it holds `max_batch` inputs or its first
+request has waited `max_wait_s`, and the upstream `data` list is split back
+into one response per caller.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# (request payload) -> (status code, response body bytes)
+EmbeddingCall = Callable[[dict], Awaitable[Tuple[int, bytes]]]
+
+
+class EmbeddingError(Exception):
+    """Upstream answered a batch with an error; every caller in it gets the same response"""
+
+    def __init__(self, status_code: int, body: bytes):
+        super().__init__(f"Upstream returned {status_code}")
+        self.status_code = status_code
+        self.body = body
+
+
+def normalize_input(value: Any) -> List[Any]:
+    """The OpenAI `input` forms as a list of single inputs (strings or token arrays)"""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list) and value and all(isinstance(v, int) for v in value):
+        return [value]  # one pre-tokenized input
+    if isinstance(value, list) and value:
+        return value
+    raise ValueError("`input` must be a non-empty string, list of strings or token arrays")
+
+
+@dataclass
+class _Pending:
+    inputs: List[Any]
+    future: asyncio.Future = field(repr=False)
+    arrived: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class _Batch:
+    options: dict
+    pending: List[_Pending] = field(default_factory=list)
+    size: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingBatcher:
+    def __init__(self, call: EmbeddingCall, max_batch: int = 32, max_wait_s: float = 0.005):
+        self.call = call
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max_wait_s
+        self._open: Dict[str, _Batch] = {}
+        self._tasks: set = set()
+        self.requests = 0
+        self.inputs = 0
+        self.batches = 0
+        self.batched_inputs = 0
+        self.max_batch_seen = 0
+        self.flushed_full = 0
+        self.flushed_timer = 0
+        self.errors = 0
+        self.wait_s_total = 0.0
+        self.upstream_s_total = 0.0
+
+    async def embed(self, payload: dict) -> dict:
+        """Embed `payload["input"]` as part of a shared batch; returns an OpenAI embeddings response"""
+        inputs = normalize_input(payload.get("input"))
+        options = {k: v for k, v in payload.items() if k != "input"}
+        self.requests += 1
+        self.inputs += len(inputs)
+        if len(inputs) >= self.max_batch:
+            batch = _Batch(options)
+            future = self._add(batch, inputs)
+            self.flushed_full += 1
+            self._flush(batch)
+            return await future
+        key = json.dumps(options, sort_keys=True)
+        batch = self._open.get(key)
+        if batch is not None and batch.size + len(inputs) > self.max_batch:
+            self._close(key, full=True)
+            batch = None
+        if batch is None:
+            batch = _Batch(options)
+            self._open[key] = batch
+            batch.timer = asyncio.get_running_loop().call_later(self.max_wait_s, self._close, key, False)
+        future = self._add(batch, inputs)
+        if batch.size >= self.max_batch:
+            self._close(key, full=True)
+        return await future
+
+    def _add(self, batch: _Batch, inputs: List[Any]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        batch.pending.append(_Pending(inputs, future))
+        batch.size += len(inputs)
+        return future
+
+    def _close(self, key: str, full: bool) -> None:
+        batch = self._open.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        if full:
+            self.flushed_full += 1
+        else:
+            self.flushed_timer += 1
+        self._flush(batch)
+
+    def _flush(self, batch: _Batch) -> None:
+        task = asyncio.ensure_future(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: _Batch) -> None:
+        started = time.perf_counter()
+        self.wait_s_total += sum(started - p.arrived for p in batch.pending)
+        self.batches += 1
+        self.batched_inputs += batch.size
+        self.max_batch_seen = max(self.max_batch_seen, batch.size)
+        inputs = [item for p in batch.pending for item in p.inputs]
+        try:
+            status, content = await self.call({**batch.options, "input": inputs})
+            if status >= 400:
+                raise EmbeddingError(status, content)
+            try:
+                results = self._split(batch, json.loads(content))
+            except (ValueError, KeyError, TypeError):
+                raise EmbeddingError(502, b'{"error": "Malformed upstream embeddings response"}')
+        except asyncio.CancelledError:
+            for p in batch.pending:
+                p.future.cancel()
+            raise
+        except Exception as e:
+            self.errors += 1
+            for p in batch.pending:
+                if not p.future.done():
+                    p.future.set_exception(e)
+            return
+        finally:
+            self.upstream_s_total += time.perf_counter() - started
+        for p, result in zip(batch.pending, results):
+            if not p.future.done():
+                p.future.set_result(result)
+
+    @staticmethod
+    def _split(batch: _Batch, response: dict) -> List[dict]:
+        data = sorted(response["data"], key=lambda d: d.get("index", 0))
+        if len(data) != batch.size:
+            raise ValueError("Upstream returned a different number of embeddings")
+        usage = response.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        # Upstream usage covers the whole batch; each caller gets its share by input size
+        sizes = [sum(len(item) for item in p.inputs) for p in batch.pending]
+        total_size = sum(sizes) or 1
+        results, offset = [], 0
+        for p, size in zip(batch.pending, sizes):
+            items = [{**d, "index": i} for i, d in enumerate(data[offset:offset + len(p.inputs)])]
+            offset += len(p.inputs)
+            tokens = round(prompt_tokens * size / total_size)
+            results.append({
+                "object": "list",
+                "data": items,
+                "model": response.get("model", batch.options.get("model")),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+        return results
+
+    async def close(self) -> None:
+        for key in list(self._open):
+            self._close(key, full=False)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        return {
+            "requests": self.requests,
+            "inputs": self.inputs,
+            "upstream_batches": self.batches,
+            "batch_size_mean": round(self.batched_inputs / self.batches, 3) if self.batches else 0.0,
+            "batch_size_max": self.max_batch_seen,
+            "flushed_full": self.flushed_full,
+            "flushed_timer": self.flushed_timer,
+            "errors": self.errors,
+            "wait_s_mean": round(self.wait_s_total / self.requests, 6) if self.requests else 0.0,
+            "inputs_per_upstream_s": round(self.batched_inputs / self.upstream_s_total, 2) if self.upstream_s_total else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_s": self.max_wait_s,
+        }
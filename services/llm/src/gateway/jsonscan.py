@@ -0,0 +1,95 @@
+"""
+Top-level keys of a JSON request body without decoding the body.
+
+The gateway acts on a handful of top-level flags (`model`, `stream`, `max_tokens`,
+`temperature`) of bodies that are mostly prompt text. `top_level` walks the body's
+strings and brackets, tracking the nesting depth, and decodes only the scalar values
+of the wanted keys at depth 1; nested objects (tool schemas, `response_format`,
+`metadata`) and message strings are skipped without being parsed. Strings are skipped
+with `bytes.find`, so a long prompt costs a memchr rather than a decode.
+
+The walk runs one Python step per string or bracket, so bodies made of many small
+tokens (large tool schemas, quoted JSON in messages) are decoded with `json.loads`
+instead, which is faster there; both give the same result.
+"""
+import functools
+import json
+import re
+from typing import Any, Dict, Tuple
+
+_STRUCTURAL = re.compile(rb'[{}\[\]"]')
+_COLON = re.compile(rb"\s*:\s*")
+_SCALAR = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null')
+_OPEN = b"{["
+# The walk hands over to json.loads after one step per this many bytes of body (plus a few)
+_BYTES_PER_STEP = 512
+
+
+class _TooManyTokens(Exception):
+    pass
+
+
+def top_level(body: bytes, keys: Tuple[str, ...]) -> Dict[str, Any]:
+    """Scalar values of `keys` in a JSON object body; nested keys and non-scalar values are left out"""
+    if not body.lstrip().startswith(b"{"):
+        return {}
+    try:
+        return _scanned(body, _quoted(keys), 64 + len(body) // _BYTES_PER_STEP)
+    except _TooManyTokens:
+        return _decoded(body, keys)
+
+
+@functools.lru_cache(maxsize=32)
+def _quoted(keys: Tuple[str, ...]) -> Dict[bytes, str]:
+    return {json.dumps(key).encode(): key for key in keys}
+
+
+def _decoded(body: bytes, keys: Tuple[str, ...]) -> Dict[str, Any]:
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return {}
+    return {key: payload[key] for key in keys if key in payload and not isinstance(payload[key], (dict, list))}
+
+
+def _scanned(body: bytes, wanted: Dict[bytes, str], steps: int) -> Dict[str, Any]:
+    found: Dict[str, Any] = {}
+    depth = 0
+    pos = 0
+    while steps > 0:
+        steps -= 1
+        match = _STRUCTURAL.search(body, pos)
+        if match is None:
+            return found
+        start = match.start()
+        if body[start] in _OPEN:
+            depth += 1
+            pos = start + 1
+        elif body[start] != 0x22:  # closing bracket
+            depth -= 1
+            pos = start + 1
+        else:
+            # Each escaped quote inside the string costs a step of its own
+            pos = body.find(b'"', start + 1)
+            while pos != -1 and _escaped(body, pos):
+                steps -= 1
+                pos = body.find(b'"', pos + 1)
+            if pos == -1:
+                return found
+            pos += 1
+            if depth == 1 and body[start:pos] in wanted:
+                # A key only when a colon follows; the same text as a value is skipped
+                colon = _COLON.match(body, pos)
+                value = _SCALAR.match(body, colon.end()) if colon else None
+                if value is not None:
+                    # Like json.loads, a repeated key keeps its last value
+                    found[wanted[body[start:pos]]] = json.loads(value.group())
+    raise _TooManyTokens()
+
+
+def _escaped(body: bytes, quote: int) -> bool:
+    """Whether the quote at `quote` is preceded by an odd number of backslashes"""
+    backslash = quote - 1
+    while body[backslash] == 0x5C:
+        backslash -= 1
+    return (quote - 1 - backslash) % 2 == 1
@@ -0,0 +1,197 @@
+"""
+KV-cache slot persistence per session.
+
+llama.cpp keeps one KV cache per slot (`-np`). When sessions interleave on a
+slot, each one evicts the other's prompt prefix and the next call re-prefills
+it. The manager pins a session (x-session-id + model) to a slot via `id_slot`
+and, before another session takes that slot, saves the resident KV state with
+`POST /slots/{id}?action=save`; a session coming back is restored with
+`?action=restore` instead of being re-prefilled. Requires llama.cpp to run with
+`--slot-save-path`; a replica that answers 404/501 to the slot API is left alone.
+"""
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from upstreams import Upstream
+
+
+@dataclass
+class _Slot:
+    id: int
+    resident: Optional[str] = None  # session key whose prefix the slot holds
+    busy: bool = False
+    last_used: float = 0.0
+
+
+@dataclass
+class _Replica:
+    slots: List[_Slot]
+    saved: Set[str] = field(default_factory=set)  # session keys with a state file on this replica
+    supported: bool = True
+    model: Optional[str] = None
+
+
+def session_key(session_id: str, model: Optional[str]) -> str:
+    """A saved KV state only fits the model that produced it"""
+    return f"{model or ''}|{session_id}"
+
+
+def with_slot(body: bytes, slot_id: int) -> bytes:
+    """Prepend `id_slot` to a JSON object body without re-encoding it"""
+    stripped = body.lstrip()
+    if not stripped.startswith(b"{"):
+        return body
+    rest = stripped[1:].lstrip()
+    separator = b"" if rest.startswith(b"}") else b","
+    return b'{"id_slot":%d%s' % (slot_id, separator) + rest
+
+
+class SlotManager:
+    def __init__(self, slots_per_upstream: int):
+        self.slots_per_upstream = max(1, slots_per_upstream)
+        self._replicas: Dict[str, _Replica] = {}
+        self.prefix_hits = 0
+        self.cold = 0
+        self.unpinned = 0
+        self.saves = 0
+        self.save_ms_total = 0.0
+        self.restores = 0
+        self.restore_ms_total = 0.0
+        self.restored_tokens = 0
+        self.errors = 0
+
+    def _replica(self, upstream: Upstream) -> _Replica:
+        replica = self._replicas.get(upstream.base_url)
+        if replica is None:
+            replica = _Replica([_Slot(i) for i in range(self.slots_per_upstream)])
+            self._replicas[upstream.base_url] = replica
+        return replica
+
+    @staticmethod
+    def _filename(key: str) -> str:
+        # llama.cpp only accepts plain file names inside --slot-save-path
+        return f"session-{hashlib.sha1(key.encode()).hexdigest()}.bin"
+
+    async def _slot_action(
+        self, client: httpx.AsyncClient, upstream: Upstream, replica: _Replica, slot: _Slot, action: str, key: str, model: Optional[str]
+    ) -> Optional[dict]:
+        """POST /slots/{id}?action=...; returns the response JSON, or None when the call failed"""
+        params = {"action": action}
+        if model is not None:
+            params["model"] = model  # router mode forwards slot calls to the model's server
+        try:
+            r = await client.post(f"{upstream.root_url}/slots/{slot.id}", params=params, json={"filename": self._filename(key)})
+        except httpx.HTTPError:
+            self.errors += 1
+            return None
+        if r.status_code in (404, 501):
+            replica.supported = False  # no --slot-save-path, or a server without the slot API
+        if r.status_code != 200:
+            self.errors += 1
+            return None
+        try:
+            return r.json()
+        except ValueError:
+            return {}
+
+    async def acquire(
+        self, client: httpx.AsyncClient, upstream: Upstream, session_id: Optional[str], model: Optional[str]
+    ) -> Optional[int]:
+        """Reserve a slot for the request and load the session's KV state into it.
+
+        Returns the slot id to send as `id_slot`, or None to let llama.cpp pick
+        (slot API unsupported, or every slot busy). Call `release` when done.
+        """
+        replica = self._replica(upstream)
+        if not replica.supported:
+            return None
+        key = session_key(session_id, model) if session_id else None
+        if model is not None and model != replica.model:
+            if replica.model is not None:
+                # The model reload drops every slot's KV cache; saved state files stay valid
+                for s in replica.slots:
+                    s.resident = None
+            replica.model = model
+        free = [s for s in replica.slots if not s.busy]
+        if not free:
+            self.unpinned += 1
+            return None
+        slot = next((s for s in free if key is not None and s.resident == key), None)
+        if slot is not None:
+            self.prefix_hits += 1
+            slot.busy = True
+            slot.last_used = time.monotonic()
+            return slot.id
+        # Prefer an empty slot, then the one whose session was used longest ago
+        slot = min(free, key=lambda s: (s.resident is not None, s.last_used))
+        slot.busy = True
+        slot.last_used = time.monotonic()
+        try:
+            if slot.resident is not None:
+                await self._save(client, upstream, replica, slot, model)
+            slot.resident = key
+            if key is not None:
+                if key in replica.saved:
+                    await self._restore(client, upstream, replica, slot, key, model)
+                else:
+                    self.cold += 1
+        except BaseException:
+            slot.resident = None
+            slot.busy = False
+            raise
+        return slot.id
+
+    async def _save(self, client: httpx.AsyncClient, upstream: Upstream, replica: _Replica, slot: _Slot, model: Optional[str]) -> None:
+        key = slot.resident
+        started = time.perf_counter()
+        result = await self._slot_action(client, upstream, replica, slot, "save", key, model)
+        if result is not None:
+            self.saves += 1
+            self.save_ms_total += result.get("timings", {}).get("save_ms", (time.perf_counter() - started) * 1000)
+            replica.saved.add(key)
+        slot.resident = None
+
+    async def _restore(self, client: httpx.AsyncClient, upstream: Upstream, replica: _Replica, slot: _Slot, key: str, model: Optional[str]) -> None:
+        started = time.perf_counter()
+        result = await self._slot_action(client, upstream, replica, slot, "restore", key, model)
+        if result is None:
+            replica.saved.discard(key)
+            self.cold += 1
+            return
+        self.restores += 1
+        self.restore_ms_total += result.get("timings", {}).get("restore_ms", (time.perf_counter() - started) * 1000)
+        self.restored_tokens += result.get("n_restored", 0)
+
+    def release(self, upstream: Upstream, slot_id: int) -> None:
+        slot = self._replica(upstream).slots[slot_id]
+        slot.busy = False
+        slot.last_used = time.monotonic()
+
+    def metrics(self) -> dict:
+        pinned = self.prefix_hits + self.restores + self.cold
+        return {
+            "enabled": True,
+            "prefix_hits": self.prefix_hits,
+            "prefix_hit_rate": round(self.prefix_hits / pinned, 4) if pinned else 0.0,
+            "restores": self.restores,
+            "restore_ms_total": round(self.restore_ms_total, 3),
+            "restore_ms_mean": round(self.restore_ms_total / self.restores, 3) if self.restores else 0.0,
+            "restored_tokens": self.restored_tokens,
+            "saves": self.saves,
+            "save_ms_total": round(self.save_ms_total, 3),
+            "cold": self.cold,
+            "unpinned": self.unpinned,
+            "errors": self.errors,
+            "replicas": {
+                url: {
+                    "supported": r.supported,
+                    "saved_sessions": len(r.saved),
+                    "slots": [{"id": s.id, "busy": s.busy, "resident": s.resident is not None} for s in r.slots],
+                }
+                for url, r in self._replicas.items()
+            },
+        }
@@ -0,0 +1,118 @@
+"""
+Upstream replicas: health checks and request routing.
+
+Requests go to the healthy replica with the fewest outstanding requests. With an
+affinity key (session header or prompt-prefix hash) the replica is chosen by
+rendezvous hashing instead, so follow-up calls land where their KV prefix is
+cached - unless that replica is `max_affinity_skew` requests busier than the
+least-loaded one. Replicas that last served the requested model are preferred,
+since any other replica would have to reload it.
+"""
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import httpx
+
+
+@dataclass
+class Upstream:
+    base_url: str
+    healthy: bool = True
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    affinity_hits: int = 0
+    model: Optional[str] = None
+    last_check: Optional[float] = None
+
+    def mark_failed(self) -> None:
+        """Passive health: a connect failure takes the replica out until the next good check"""
+        self.failures += 1
+        self.healthy = False
+
+    @property
+    def root_url(self) -> str:
+        """Server root (llama.cpp serves /health and /tokenize outside /v1)"""
+        return self.base_url[:-3] if self.base_url.endswith("/v1") else self.base_url
+
+
+def affinity_key(session_id: Optional[str], body: bytes, prefix_bytes: int) -> Optional[str]:
+    """Session header if given, otherwise a hash of the first `prefix_bytes` of the messages"""
+    if session_id:
+        return f"session:{session_id}"
+    if prefix_bytes <= 0:
+        return None
+    start = body.find(b'"messages"')
+    if start == -1:
+        start = body.find(b'"prompt"')
+    if start == -1:
+        return None
+    return hashlib.sha1(body[start:start + prefix_bytes]).hexdigest()
+
+
+class UpstreamPool:
+    def __init__(self, base_urls: List[str], max_affinity_skew: int = 2, health_path: str = "/health"):
+        if not base_urls:
+            raise ValueError("At least one upstream base URL is required")
+        self.upstreams = [Upstream(url.rstrip("/")) for url in base_urls]
+        self.max_affinity_skew = max_affinity_skew
+        self.health_path = health_path
+
+    def _rank(self, key: str, upstream: Upstream) -> str:
+        return hashlib.sha1(f"{key}|{upstream.base_url}".encode()).hexdigest()
+
+    def pick(self, key: Optional[str] = None, model: Optional[str] = None) -> Upstream:
+        candidates = [u for u in self.upstreams if u.healthy] or self.upstreams
+        if model is not None:
+            candidates = [u for u in candidates if u.model in (None, model)] or candidates
+        least = min(candidates, key=lambda u: u.outstanding)
+        if key is None or len(candidates) == 1:
+            return least
+        preferred = max(candidates, key=lambda u: self._rank(key, u))
+        if preferred.outstanding - least.outstanding > self.max_affinity_skew:
+            return least
+        preferred.affinity_hits += 1
+        return preferred
+
+    def begin(self, upstream: Upstream, model: Optional[str] = None) -> None:
+        upstream.outstanding += 1
+        upstream.requests += 1
+        if model is not None:
+            upstream.model = model
+
+    def end(self, upstream: Upstream) -> None:
+        upstream.outstanding -= 1
+
+    async def check(self, client: httpx.AsyncClient, timeout_s: float = 2.0) -> None:
+        async def probe(upstream: Upstream):
+            try:
+                r = await client.get(f"{upstream.root_url}{self.health_path}", timeout=timeout_s)
+                upstream.healthy = r.status_code == 200
+            except httpx.HTTPError:
+                upstream.healthy = False
+            upstream.last_check = time.time()
+
+        await asyncio.gather(*(probe(u) for u in self.upstreams))
+
+    async def run_health_checks(self, client: httpx.AsyncClient, interval_s: float) -> None:
+        while True:
+            await asyncio.sleep(interval_s)
+            await self.check(client)
+
+    def metrics(self) -> list:
+        return [
+            {
+                "base_url": u.base_url,
+                "healthy": u.healthy,
+                "outstanding": u.outstanding,
+                "requests": u.requests,
+                "failures": u.failures,
+                "affinity_hits": u.affinity_hits,
+                "model": u.model,
+                "last_check": u.last_check,
+            }
+            for u in self.upstreams
+        ]
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "gateway"))
+
+import api  # noqa: E402
+
+AUTH = {"Authorization": f"Bearer {api.API_KEY}"}
+
+
+@pytest.fixture(autouse=True)
+def batch_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_BATCH_DIR", str(tmp_path / "batches"))
+    return tmp_path / "batches"
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """Gateway app whose upstream is an in-process stub: `install(handler)` returns a TestClient"""
+    def install(handler):
+        monkeypatch.setattr(api, "_create_upstream_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        return TestClient(api.app)
+
+    return install
@@ -0,0 +1,124 @@
+import asyncio
+
+import httpx
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+from conftest import AUTH
+
+
+def test_queue_orders_by_priority_class():
+    async def scenario():
+        controller = AdmissionController(slots=1, max_queue=8)
+        order = []
+        first = await controller.acquire("default")
+
+        async def request(name, priority):
+            async with controller.slot(priority):
+                order.append(name)
+
+        tasks = [asyncio.create_task(request(n, p)) for n, p in [("b1", "batch"), ("d1", "default"), ("i1", "interactive")]]
+        await asyncio.sleep(0)
+        assert controller.metrics()["queue_depth"] == 3
+        first.release()
+        await asyncio.gather(*tasks)
+        return order, controller.metrics()
+
+    order, metrics = asyncio.run(scenario())
+    assert order == ["i1", "d1", "b1"]
+    assert metrics["in_flight"] == 0
+    assert metrics["classes"]["batch"]["queued"] == 1
+
+
+def test_full_queue_rejects_and_cancelled_waiters_leave():
+    async def scenario():
+        controller = AdmissionController(slots=1, max_queue=1)
+        lease = await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.retry_after_s >= 1
+        waiter.cancel()
+        await asyncio.sleep(0)
+        lease.release()
+        return controller.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["queue_depth"] == 0
+    assert metrics["in_flight"] == 0
+    assert metrics["classes"]["default"]["rejected"] == 1
+
+
+def test_gateway_returns_429_with_retry_after(gateway, monkeypatch):
+    import api
+
+    monkeypatch.setattr(api, "GATEWAY_MAX_QUEUE", 0)
+
+    def handler(request):
+        return httpx.Response(200, json={"ok": True})
+
+    with gateway(handler) as client:
+        assert client.post("/v1/chat/completions", headers=AUTH, json={}).status_code == 200
+        api.app.state.admission._in_flight = 1  # simulate a busy slot
+        r = client.post("/v1/chat/completions", headers=AUTH, json={})
+        assert r.status_code == 429
+        assert int(r.headers["Retry-After"]) >= 1
+        metrics = client.get("/metrics").json()["admission"]
+        assert metrics["classes"]["default"]["rejected"] == 1
+        assert metrics["classes"]["default"]["admitted"] == 1
+
+
+def _drain(controller, requests):
+    """Queue `requests` [(name, model)] behind a busy slot and return the dispatch order"""
+    async def scenario():
+        order = []
+        first = await controller.acquire(model="m1")
+
+        async def request(name, model):
+            async with controller.slot(model=model):
+                order.append(name)
+
+        tasks = [asyncio.create_task(request(n, m)) for n, m in requests]
+        await asyncio.sleep(0)
+        first.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    return asyncio.run(scenario())
+
+
+def test_queue_drains_current_model_before_swapping():
+    controller = AdmissionController(slots=1, max_queue=16, max_model_run=100)
+    order = _drain(controller, [("a", "m2"), ("b", "m1"), ("c", "m2"), ("d", "m1")])
+    assert order == ["b", "d", "a", "c"]
+    assert controller.metrics()["models"]["swaps"] == 1
+
+
+def test_model_run_bound_prevents_starvation():
+    controller = AdmissionController(slots=1, max_queue=16, max_model_run=2)
+    order = _drain(controller, [("other", "m2")] + [(f"same{i}", "m1") for i in range(4)])
+    # m1 already ran once before the queue drained, so m2 gets the slot after one more m1
+    assert order.index("other") == 1
+    assert controller.metrics()["models"]["forced_switches"] == 1
+
+
+def test_models_listing_is_cached_until_a_swap(gateway):
+    import api
+
+    calls = []
+
+    def handler(request):
+        if request.url.path.endswith("/models"):
+            calls.append(1)
+            return httpx.Response(200, json={"data": [{"id": "m1"}, {"id": "m2"}]})
+        return httpx.Response(200, json={"ok": True})
+
+    with gateway(handler) as client:
+        assert client.get("/v1/models", headers=AUTH).headers["x-gateway-cache"] == "miss"
+        assert client.get("/v1/models", headers=AUTH).headers["x-gateway-cache"] == "hit"
+        client.post("/v1/chat/completions", headers=AUTH, json={"model": "m1"})
+        client.post("/v1/chat/completions", headers=AUTH, json={"model": "m2"})  # swap
+        assert client.get("/v1/models", headers=AUTH).headers["x-gateway-cache"] == "miss"
+        assert api.app.state.admission.metrics()["models"]["swaps"] == 1
+    assert len(calls) == 2
@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import httpx
+
+import api
+from batches import BatchManager
+from conftest import AUTH
+
+
+def _input(n):
+    return "\n".join(
+        json.dumps({"custom_id": f"req-{i}", "method": "POST", "url": "/v1/chat/completions",
+                    "body": {"model": "m", "messages": [{"role": "user", "content": str(i)}]}})
+        for i in range(n)
+    ).encode() + b"\n"
+
+
+async def _wait(manager, batch_id):
+    for _ in range(200):
+        if manager.get_batch(batch_id)["status"] in ("completed", "failed", "cancelled"):
+            return manager.get_batch(batch_id)
+        await asyncio.sleep(0.01)
+    raise AssertionError("batch did not finish")
+
+
+def test_batch_runs_with_bounded_concurrency(tmp_path):
+    active, peak = [0], [0]
+
+    async def call(path, body):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        content = json.loads(body)["messages"][0]["content"]
+        if content == "3":
+            return 500, b'{"error": "boom"}'
+        return 200, json.dumps({"echo": content}).encode()
+
+    async def scenario():
+        manager = BatchManager(str(tmp_path), call, concurrency=2)
+        file = manager.create_file(_input(6) + b"not json\n")
+        batch = manager.create_batch(file["id"], "/v1/chat/completions")
+        return manager, await _wait(manager, batch["id"])
+
+    manager, batch = asyncio.run(scenario())
+    assert peak[0] == 2
+    assert batch["request_counts"] == {"total": 7, "completed": 5, "failed": 2}
+    output = [json.loads(l) for l in open(manager.file_content_path(batch["output_file_id"]))]
+    assert sorted(r["custom_id"] for r in output) == ["req-0", "req-1", "req-2", "req-4", "req-5"]
+    assert output[0]["response"]["status_code"] == 200
+
+
+def test_unfinished_batch_resumes_without_repeating_requests(tmp_path):
+    calls = []
+
+    async def call(path, body):
+        calls.append(json.loads(body)["messages"][0]["content"])
+        return 200, b"{}"
+
+    async def scenario():
+        manager = BatchManager(str(tmp_path), call)
+        file = manager.create_file(_input(3))
+        batch = manager.create_batch(file["id"], "/v1/chat/completions")
+        await manager.close()  # gateway stops before the worker ran
+        # Simulate one finished request and a torn line from the crashed process
+        with open(manager.file_content_path(batch["output_file_id"]), "w") as f:
+            f.write(json.dumps({"id": f"batch_req_{batch['id']}_0", "custom_id": "req-0"}) + "\n")
+            f.write('{"id": "batch_req_')
+
+        restarted = BatchManager(str(tmp_path), call)
+        assert restarted.resume() == [batch["id"]]
+        return await _wait(restarted, batch["id"])
+
+    batch = asyncio.run(scenario())
+    assert batch["status"] == "completed"
+    assert sorted(calls) == ["1", "2"]
+
+
+def test_batch_http_api(gateway):
+    def handler(request):
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    with gateway(handler) as client:
+        file = client.post("/v1/files?purpose=batch", headers=AUTH, content=_input(2)).json()
+        batch = client.post("/v1/batches", headers=AUTH, json={"input_file_id": file["id"], "endpoint": "/v1/chat/completions"}).json()
+        for _ in range(200):
+            status = client.get(f"/v1/batches/{batch['id']}", headers=AUTH).json()
+            if status["status"] == "completed":
+                break
+        assert status["request_counts"]["completed"] == 2
+        lines = client.get(f"/v1/files/{status['output_file_id']}/content", headers=AUTH).text.splitlines()
+        assert len(lines) == 2
+        assert client.get("/v1/batches/batch_missing", headers=AUTH).status_code == 404
+        metrics = client.get("/metrics").json()["admission"]
+        assert metrics["classes"]["batch"]["admitted"] == 2
+
+
+def test_file_upload_validation(gateway, monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_MAX_FILE_BYTES", 1024)
+
+    with gateway(lambda request: httpx.Response(200, json={})) as client:
+        missing = client.post("/v1/files", headers=AUTH, data={"purpose": "batch"}, files={"other": ("x.jsonl", _input(1))})
+        not_a_file = client.post("/v1/files", headers=AUTH, files={"file": (None, "just text")})
+        too_large = client.post("/v1/files", headers=AUTH, content=_input(50))
+        too_large_form = client.post("/v1/files", headers=AUTH, files={"file": ("in.jsonl", _input(50))})
+        ok = client.post("/v1/files", headers=AUTH, files={"file": ("in.jsonl", _input(2))})
+
+    assert (missing.status_code, not_a_file.status_code) == (400, 400)
+    assert (too_large.status_code, too_large_form.status_code) == (413, 413)
+    assert ok.status_code == 200 and ok.json()["filename"] == "in.jsonl"
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import httpx
+
+import api
+from conftest import AUTH
+
+
+def _scope(path: str) -> dict:
+    headers = [(k.lower().encode(), v.encode()) for k, v in {**AUTH, "Content-Type": "application/json"}.items()]
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": headers, "client": ("test", 1), "server": ("gw", 80), "root_path": "",
+    }
+
+
+async def _call(body: bytes, send, disconnect_after_s: float = 0.0):
+    """Drive the ASGI app directly so the client can go away mid-request"""
+    sent_body = False
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(disconnect_after_s)
+        return {"type": "http.disconnect"}
+
+    try:
+        await api.app(_scope("/v1/chat/completions"), receive, send)
+    except OSError:
+        pass
+
+
+def _run(monkeypatch, handler, scenario):
+    monkeypatch.setattr(api, "_create_upstream_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    async def main():
+        async with api.lifespan(api.app):
+            await scenario()
+            await asyncio.sleep(0.05)
+            return api.app.state.admission.metrics(), dict(api.app.state.cancellations)
+
+    return asyncio.run(main())
+
+
+def test_non_streaming_disconnect_cancels_upstream_and_frees_slot(monkeypatch):
+    upstream_cancelled = []
+
+    async def handler(request):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            upstream_cancelled.append(True)
+            raise
+        return httpx.Response(200, json={})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    body = json.dumps({"model": "m", "max_tokens": 100, "messages": []}).encode()
+    admission, cancellations = _run(monkeypatch, handler, lambda: asyncio.wait_for(_call(body, send, 0.05), 2))
+    assert upstream_cancelled == [True]
+    assert messages[0]["status"] == 499
+    assert admission["in_flight"] == 0
+    assert cancellations["non_streaming"] == 1
+    assert cancellations["max_tokens_unused"] == 100
+
+
+def test_streaming_disconnect_closes_upstream_and_counts_tokens(monkeypatch):
+    closed = []
+
+    async def events():
+        try:
+            for i in range(1000):
+                yield f'data: {{"choices": [{{"delta": {{"content": "{i}"}}}}]}}\n\n'.encode()
+                await asyncio.sleep(0.001)
+        finally:
+            closed.append(True)
+
+    def handler(request):
+        return httpx.Response(200, content=events(), headers={"content-type": "text/event-stream"})
+
+    chunks = []
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"])
+            if len(chunks) == 3:
+                raise OSError("client went away")
+
+    body = json.dumps({"model": "m", "stream": True, "max_tokens": 500, "messages": []}).encode()
+    admission, cancellations = _run(monkeypatch, handler, lambda: asyncio.wait_for(_call(body, send, 10), 2))
+    assert closed == [True]
+    assert admission["in_flight"] == 0
+    assert cancellations["streaming"] == 1
+    assert 3 <= cancellations["tokens_streamed_before_cancel"] < 500
+    assert cancellations["max_tokens_unused"] == 500 - cancellations["tokens_streamed_before_cancel"]
+
+
+def test_streaming_client_leaving_while_queued_never_reaches_upstream(monkeypatch):
+    upstream_calls = []
+
+    def handler(request):
+        upstream_calls.append(request)
+        return httpx.Response(200, content=b"data: [DONE]\n\n", headers={"content-type": "text/event-stream"})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def scenario():
+        # Hold every slot, so the streaming request waits in the admission queue
+        held = [await api.app.state.admission.acquire() for _ in range(api.app.state.admission.slots)]
+        body = json.dumps({"model": "m", "stream": True, "max_tokens": 50, "messages": []}).encode()
+        await asyncio.wait_for(_call(body, send, 0.05), 2)
+        for lease in held:
+            lease.release()
+
+    admission, cancellations = _run(monkeypatch, handler, scenario)
+    assert upstream_calls == []
+    assert messages[0]["status"] == 499
+    assert admission["in_flight"] == 0 and admission["queue_depth"] == 0
+    assert cancellations["streaming"] == 1
+    assert cancellations["max_tokens_unused"] == 50
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import httpx
+
+import api
+from coalesce import ResponseCache, StoredResponse, is_deterministic
+from conftest import AUTH
+from jsonscan import top_level
+
+
+def test_is_deterministic_requires_explicit_zero_temperature():
+    def deterministic(body):
+        return is_deterministic(top_level(body, ("temperature",)))
+
+    assert deterministic(b'{"temperature": 0, "messages": []}')
+    assert deterministic(b'{"messages": [], "temperature":0.0}')
+    assert not deterministic(b'{"temperature": 0.7}')
+    assert not deterministic(b'{"messages": []}')
+    assert not deterministic(b'{"temperature": false}')
+    # A zero temperature in metadata or a tool schema does not make a sampled request deterministic
+    assert not deterministic(b'{"metadata": {"temperature": 0}, "messages": []}')
+    assert not deterministic(b'{"tools": [{"parameters": {"temperature": 0}}], "temperature": 0.8}')
+
+
+def test_response_cache_bounds_bytes_and_expires(monkeypatch):
+    cache = ResponseCache(max_bytes=10, ttl_s=60)
+    cache.set("a", StoredResponse(200, {}, b"123456"))
+    cache.set("b", StoredResponse(200, {}, b"123456"))  # evicts "a"
+    assert cache.get("a") is None
+    assert cache.get("b").body == b"123456"
+
+    monkeypatch.setattr("coalesce.time.monotonic", lambda: 1e12)
+    assert cache.get("b") is None
+    assert cache.metrics()["evictions"] == 1
+
+
+def test_identical_inflight_requests_share_one_upstream_call(monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_CACHE_MAX_BYTES", 1 << 20)
+    calls = []
+
+    async def handler(request):
+        calls.append(request.content)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "same"}}]})
+
+    monkeypatch.setattr(api, "_create_upstream_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    body = json.dumps({"model": "m", "temperature": 0, "messages": [{"role": "user", "content": "q"}]})
+
+    async def scenario():
+        async with api.lifespan(api.app):
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://gw") as client:
+                post = lambda: client.post("/v1/chat/completions", content=body, headers=AUTH)
+                first = await asyncio.gather(*(post() for _ in range(4)))
+                again = await post()
+                metrics = (await client.get("/metrics")).json()
+        return first, again, metrics
+
+    first, again, metrics = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(r.headers["x-gateway-cache"] for r in first) == ["coalesced"] * 3 + ["miss"]
+    assert all(r.json()["choices"][0]["message"]["content"] == "same" for r in first)
+    assert again.headers["x-gateway-cache"] == "hit"
+    assert metrics["coalescing"]["coalesced"] == 3
+    assert metrics["response_cache"]["hits"] == 1
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import httpx
+
+import api
+from conftest import AUTH
+
+
+def _stub(batches, status=200):
+    async def handler(request):
+        payload = json.loads(request.content)
+        batches.append(payload["input"])
+        await asyncio.sleep(0.01)
+        if status != 200:
+            return httpx.Response(status, json={"error": "boom"})
+        data = [{"object": "embedding", "index": i, "embedding": [float(len(text))]} for i, text in enumerate(payload["input"])]
+        # Reversed on purpose: results are matched to inputs by index, not position
+        return httpx.Response(200, json={"object": "list", "data": data[::-1], "model": payload["model"], "usage": {"prompt_tokens": 10 * len(data), "total_tokens": 10 * len(data)}})
+
+    return handler
+
+
+def _run(monkeypatch, handler, scenario):
+    monkeypatch.setattr(api, "_create_upstream_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    async def main():
+        async with api.lifespan(api.app):
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://gw") as client:
+                results = await scenario(client)
+                metrics = (await client.get("/metrics")).json()["embeddings"]
+        return results, metrics
+
+    return asyncio.run(main())
+
+
+def _embed(client, text, model="embed"):
+    return client.post("/v1/embeddings", json={"model": model, "input": text}, headers=AUTH)
+
+
+def test_concurrent_requests_share_one_upstream_batch(monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_EMBED_MAX_WAIT_MS", 50)
+    batches = []
+    texts = ["a", "bb", "ccc", "dddd"]
+
+    async def scenario(client):
+        return await asyncio.gather(*(_embed(client, t) for t in texts))
+
+    responses, metrics = _run(monkeypatch, _stub(batches), scenario)
+    assert len(batches) == 1 and sorted(batches[0]) == sorted(texts)
+    for text, r in zip(texts, responses):
+        body = r.json()
+        assert r.status_code == 200
+        assert body["data"] == [{"object": "embedding", "index": 0, "embedding": [float(len(text))]}]
+        assert body["model"] == "embed"
+    assert sum(r.json()["usage"]["prompt_tokens"] for r in responses) == 40
+    assert metrics["upstream_batches"] == 1 and metrics["batch_size_max"] == 4
+    assert metrics["flushed_timer"] == 1
+
+
+def test_full_batches_are_sent_without_waiting(monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_EMBED_MAX_BATCH", 2)
+    monkeypatch.setattr(api, "GATEWAY_EMBED_MAX_WAIT_MS", 10_000)
+    batches = []
+
+    async def scenario(client):
+        return await asyncio.wait_for(asyncio.gather(*(_embed(client, t) for t in ["a", "b", "c", "d"])), 2)
+
+    responses, metrics = _run(monkeypatch, _stub(batches), scenario)
+    assert [len(b) for b in batches] == [2, 2]
+    assert all(r.status_code == 200 for r in responses)
+    assert metrics["flushed_full"] == 2 and metrics["batch_size_mean"] == 2
+
+
+def test_models_and_list_inputs_are_split_correctly(monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_EMBED_MAX_WAIT_MS", 50)
+    batches = []
+
+    async def scenario(client):
+        return await asyncio.gather(_embed(client, ["x", "yy"]), _embed(client, "zzz"), _embed(client, "q", model="other"))
+
+    (pair, single, other), _ = _run(monkeypatch, _stub(batches), scenario)
+    assert sorted(len(b) for b in batches) == [1, 3]
+    assert [d["embedding"] for d in pair.json()["data"]] == [[1.0], [2.0]]
+    assert [d["index"] for d in pair.json()["data"]] == [0, 1]
+    assert single.json()["data"][0]["embedding"] == [3.0]
+    assert other.json()["model"] == "other"
+
+
+def test_upstream_error_reaches_every_caller(monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_EMBED_MAX_WAIT_MS", 50)
+
+    async def scenario(client):
+        return await asyncio.gather(_embed(client, "a"), _embed(client, "b"), client.post("/v1/embeddings", json={"model": "embed"}, headers=AUTH))
+
+    (first, second, invalid), metrics = _run(monkeypatch, _stub([], status=500), scenario)
+    assert first.status_code == second.status_code == 500
+    assert first.json() == {"error": "boom"}
+    assert invalid.status_code == 400
+    assert metrics["errors"] == 1
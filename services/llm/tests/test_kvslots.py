@@ -0,0 +1,80 @@
+import json
+
+import httpx
+
+import api
+from conftest import AUTH
+from kvslots import with_slot
+
+
+def test_with_slot_prepends_id_slot():
+    assert json.loads(with_slot(b' {"model": "m"}', 1)) == {"id_slot": 1, "model": "m"}
+    assert json.loads(with_slot(b"{}", 0)) == {"id_slot": 0}
+
+
+def _stub(calls, supported=True):
+    def handler(request):
+        if request.url.path.startswith("/slots/"):
+            action = request.url.params["action"]
+            calls.append((action, request.url.path, json.loads(request.content)["filename"]))
+            if not supported:
+                return httpx.Response(501, json={"error": "slot save path not set"})
+            timings = {f"{action}_ms": 12.5}
+            return httpx.Response(200, json={"id_slot": 0, "n_restored": 900, "timings": timings})
+        calls.append(("completion", json.loads(request.content).get("id_slot")))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    return handler
+
+
+def _ask(client, session):
+    body = {"model": "m", "messages": [{"role": "user", "content": "q"}]}
+    r = client.post("/v1/chat/completions", json=body, headers={**AUTH, "x-session-id": session})
+    assert r.status_code == 200
+
+
+def test_interleaved_sessions_save_and_restore_kv_state(gateway, monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_KV_SLOTS", True)
+    calls = []
+    with gateway(_stub(calls)) as client:
+        for session in ("a", "a", "b", "a"):
+            _ask(client, session)
+        metrics = client.get("/metrics").json()["kv_slots"]
+
+    actions = [c[0] for c in calls]
+    assert actions == ["completion", "completion", "save", "completion", "save", "restore", "completion"]
+    assert all(c[1] == 0 for c in calls if c[0] == "completion")
+    saved_a, restored_a = calls[2][2], calls[5][2]
+    assert saved_a == restored_a and calls[4][2] != saved_a
+    assert metrics["prefix_hits"] == 1
+    assert metrics["restores"] == 1 and metrics["restore_ms_total"] == 12.5
+    assert metrics["restored_tokens"] == 900
+    assert metrics["saves"] == 2
+    assert metrics["cold"] == 2
+
+
+def test_sessions_are_pinned_to_their_own_slots(gateway, monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_KV_SLOTS", True)
+    monkeypatch.setattr(api, "GATEWAY_SLOTS", 2)
+    calls = []
+    with gateway(_stub(calls)) as client:
+        for session in ("a", "b", "a", "b"):
+            _ask(client, session)
+        metrics = client.get("/metrics").json()["kv_slots"]
+
+    assert [c[1] for c in calls] == [0, 1, 0, 1]
+    assert metrics["prefix_hits"] == 2 and metrics["saves"] == 0
+
+
+def test_slot_api_unsupported_falls_back_to_plain_requests(gateway, monkeypatch):
+    monkeypatch.setattr(api, "GATEWAY_KV_SLOTS", True)
+    calls = []
+    with gateway(_stub(calls, supported=False)) as client:
+        for session in ("a", "b", "a", "b"):
+            _ask(client, session)
+        metrics = client.get("/metrics").json()["kv_slots"]
+
+    assert [c[0] for c in calls].count("save") == 1
+    assert [c[1] for c in calls if c[0] == "completion"] == [0, 0, None, None]
+    assert metrics["errors"] == 1
+    assert metrics["replicas"]["http://llm:8000/v1"]["supported"] is False
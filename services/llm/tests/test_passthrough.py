@@ -0,0 +1,92 @@
+import asyncio
+import importlib.util
+import json
+import os
+
+import httpx
+from starlette.datastructures import State
+
+import api
+from conftest import AUTH
+from jsonscan import top_level
+
+
+def test_bytes_and_headers_pass_through_unchanged(gateway):
+    seen = {}
+    body = b'{"choices":  [{"message": {"content": "caf\\u00e9"}}], "x": 1.50}'
+
+    def handler(request):
+        seen["body"] = request.content
+        seen["headers"] = request.headers
+        return httpx.Response(200, content=body, headers={"content-type": "application/json", "x-upstream": "llama"})
+
+    request_body = b'{"model": "m",   "messages": []}'
+    with gateway(handler) as client:
+        r = client.post("/v1/chat/completions", content=request_body, headers={**AUTH, "x-request-id": "abc"})
+
+    assert r.content == body
+    assert r.headers["x-upstream"] == "llama"
+    assert seen["body"] == request_body
+    assert seen["headers"]["x-request-id"] == "abc"
+    assert "authorization" not in seen["headers"]
+
+
+def test_stream_detection():
+    class Req:
+        def __init__(self, headers):
+            self.headers = headers
+
+    def wants_stream(headers, body):
+        return api._wants_stream(Req(headers), api._request_fields(body))
+
+    assert wants_stream({}, b'{"stream": true, "messages": []}')
+    assert not wants_stream({}, b'{"stream": false}')
+    # Escaped inside a message string, not a real flag
+    assert not wants_stream({}, b'{"messages": [{"content": "{\\"stream\\": true}"}]}')
+    assert not wants_stream({"x-stream": "0"}, b'{"stream": true}')
+
+
+def test_nested_stream_and_model_keys_are_ignored():
+    class Req:
+        def __init__(self):
+            self.headers = {}
+
+    nested = api._request_fields(
+        b'{"messages": [], "response_format": {"json_schema": {"schema": {"properties": {"stream": true, "model": "inner"}}}}}'
+    )
+    assert not api._wants_stream(Req(), nested)
+    assert api._requested_model(nested) is None
+    flagged = api._request_fields(b'{"metadata": {"model": "inner", "stream": true}, "model": "outer", "stream": false}')
+    assert not api._wants_stream(Req(), flagged)
+    assert api._requested_model(flagged) == "outer"
+    assert api._requested_model(api._request_fields(b'{"messages": [{"content": "{\\"model\\": \\"x\\"}"}]}')) is None
+
+
+def test_top_level_scan_skips_nested_values_and_strings():
+    body = (
+        b'{"messages": [{"role": "user", "content": "a \\"} ] { \\"model\\": 1"}], "max_tokens": 12,'
+        b' "tools": [{"model": "t", "n": [1, {"stream": true}]}], "model": "caf\\u00e9", "stream" : true}'
+    )
+    assert top_level(body, ("model", "stream", "max_tokens", "messages")) == {"model": "caf\u00e9", "stream": True, "max_tokens": 12}
+    assert top_level(b'[{"model": "m"}]', ("model",)) == {}
+    # Bodies of many small tokens are decoded instead of walked, with the same result
+    schema = {"properties": {f"p{i}": {"type": "string", "model": "nested"} for i in range(200)}}
+    many = json.dumps({"model": "m", "tools": [{"parameters": schema}], "temperature": 0, "stream": True}).encode()
+    assert top_level(many, ("model", "stream", "temperature", "tools")) == {"model": "m", "stream": True, "temperature": 0}
+
+
+def test_benchmark_script_runs_against_the_full_app(monkeypatch):
+    # The benchmark builds the gateway state through the app's lifespan; this keeps it runnable
+    path = os.path.join(os.path.dirname(__file__), "..", "scripts", "bench_gateway.py")
+    spec = importlib.util.spec_from_file_location("bench_gateway", path)
+    bench = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bench)
+    for name in ("GATEWAY_PASSTHROUGH", "GATEWAY_BATCH_DIR", "_create_upstream_client"):
+        monkeypatch.setattr(api, name, getattr(api, name))
+    # Without anything left behind by the other tests' clients
+    monkeypatch.setattr(api.app, "state", State())
+
+    for passthrough in (False, True):
+        result = asyncio.run(bench._run(passthrough, requests=3, completion_kb=1, prompt_kb=1))
+        assert result["mode"] == ("passthrough" if passthrough else "parse")
+        assert result["cpu_ms_per_request"] > 0
@@ -0,0 +1,51 @@
+import httpx
+
+import api
+from conftest import AUTH
+
+
+def test_one_pooled_client_serves_every_request(gateway):
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        if request.url.path.endswith("/models"):
+            return httpx.Response(200, json={"data": [{"id": "m"}]})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    with gateway(handler) as client:
+        upstream = api.app.state.upstream
+        assert client.get("/v1/models", headers=AUTH).json() == {"data": [{"id": "m"}]}
+        r = client.post("/v1/chat/completions", headers=AUTH, json={"messages": []})
+        assert r.json()["choices"][0]["message"]["content"] == "ok"
+        assert api.app.state.upstream is upstream
+    assert upstream.is_closed
+    assert seen == ["/v1/models", "/v1/chat/completions"]
+
+
+def test_dead_upstream_fails_fast(gateway):
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    def slow(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    with gateway(handler) as client:
+        assert client.post("/v1/chat/completions", headers=AUTH, json={"stream": True}).status_code == 502
+    with gateway(slow) as client:
+        assert client.post("/v1/chat/completions", headers=AUTH, json={}).status_code == 504
+
+
+def test_streaming_passes_chunks_through(gateway):
+    async def events():
+        yield b"data: {}\n\n"
+        yield b"data: [DONE]\n\n"
+
+    def handler(request):
+        return httpx.Response(200, content=events(), headers={"content-type": "text/event-stream"})
+
+    with gateway(handler) as client:
+        r = client.post("/v1/chat/completions", headers=AUTH, json={"stream": True})
+        assert r.status_code == 200
+        assert r.text == "data: {}\n\ndata: [DONE]\n\n"
+        assert client.get("/metrics").json()["admission"]["in_flight"] == 0
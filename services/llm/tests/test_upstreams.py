@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+
+import api
+from conftest import AUTH
+from upstreams import UpstreamPool, affinity_key
+
+
+def test_least_outstanding_and_affinity_with_skew_bound():
+    pool = UpstreamPool(["http://a/v1", "http://b/v1", "http://c/v1"], max_affinity_skew=1)
+    a, b, c = pool.upstreams
+    a.outstanding, b.outstanding, c.outstanding = 2, 0, 1
+    assert pool.pick() is b
+
+    key = affinity_key(None, b'{"model": "m", "messages": [{"role": "system", "content": "tools"}]}', 64)
+    preferred = pool.pick(key)
+    assert pool.pick(key) is preferred  # stable
+    preferred.outstanding = 5
+    assert pool.pick(key) is not preferred  # too busy, spill to least loaded
+
+    b.healthy = False
+    assert all(pool.pick(k) is not b for k in ("x", "y", "z", None))
+
+
+def test_affinity_key_uses_session_or_messages_prefix():
+    body = b'{"model": "m", "messages": [{"content": "same prefix"}], "temperature": 0.7}'
+    other = b'{"temperature": 0, "model": "m", "messages": [{"content": "same prefix"}]}'
+    assert affinity_key(None, body, 32) == affinity_key(None, other, 32)
+    assert affinity_key("solve-1", body, 32) == "session:solve-1"
+    assert affinity_key(None, b'{"input": "x"}', 32) is None
+
+
+def test_gateway_routes_sessions_and_fails_over(monkeypatch):
+    monkeypatch.setattr(api, "UPSTREAM_BASE_URLS", ["http://a:8080/v1", "http://b:8080/v1"])
+    hosts = []
+
+    def handler(request):
+        if request.url.host == "a" and request.url.path.endswith("/completions"):
+            hosts.append("a")
+            raise httpx.ConnectError("down", request=request)
+        hosts.append(request.url.host)
+        return httpx.Response(200, json={"host": request.url.host})
+
+    monkeypatch.setattr(api, "_create_upstream_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    async def scenario():
+        async with api.lifespan(api.app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://gw") as client:
+                results = []
+                for session in ("s1", "s2", "s3", "s4"):
+                    r = await client.post("/v1/chat/completions", json={"messages": []}, headers={**AUTH, "x-session-id": session})
+                    results.append(r.status_code)
+                metrics = (await client.get("/metrics")).json()["upstreams"]
+        return results, metrics
+
+    results, metrics = asyncio.run(scenario())
+    # At most one request hits the dead replica; afterwards everything goes to b
+    assert results.count(502) <= 1
+    assert hosts.count("a") <= 1
+    assert {m["base_url"]: m["healthy"] for m in metrics}["http://b:8080/v1"] is True
+    assert all(m["outstanding"] == 0 for m in metrics)
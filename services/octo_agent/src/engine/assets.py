@@ -0,0 +1,104 @@
+"""
+Input assets - read, hash, measure and encode a solve's input file once
+The encoded form is reused by every engine call in the solve.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from engine.utils import get_file_type_from_bytes
+
+_MIME_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "pdf": "application/pdf"}
+
+
+@dataclass
+class InputAsset:
+    """
+    A single input file (image or document) loaded for a solve.
+
+    Args:
+        path: Source path ("" for in-memory bytes)
+        data: Raw file bytes
+        max_side: Optional longest-side limit applied when encoding images
+    """
+    path: str
+    data: bytes = field(repr=False)
+    max_side: Optional[int] = None
+    sha256: str = field(init=False)
+    kind: Optional[str] = field(init=False)
+    width: Optional[int] = field(init=False, default=None)
+    height: Optional[int] = field(init=False, default=None)
+
+    def __post_init__(self):
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+        try:
+            self.kind = get_file_type_from_bytes(self.data)
+        except ValueError:
+            self.kind = None
+        if self.is_image:
+            try:
+                with Image.open(io.BytesIO(self.data)) as img:
+                    self.width, self.height = img.size
+            except Exception as e:
+                print(f"Error processing image file: {str(e)}")
+        self._lock = threading.Lock()
+        self._data_url: Optional[str] = None
+
+    @classmethod
+    def load(cls, path: str, max_side: Optional[int] = None) -> Optional["InputAsset"]:
+        """Read `path` once; returns None if it is not an existing file"""
+        if not path or not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except Exception as e:
+            print(f"Error reading image file: {str(e)}")
+            return None
+        return cls(path=path, data=data, max_side=max_side)
+
+    @property
+    def is_image(self) -> bool:
+        return self.kind in ("jpeg", "png")
+
+    @property
+    def cache_token(self) -> str:
+        """Identity used in response-cache keys instead of the encoded payload"""
+        return f"{self.sha256}:{self.max_side}"
+
+    def info(self) -> Dict[str, Any]:
+        """Image info as shown in prompts (same shape the Planner always used)"""
+        info: Dict[str, Any] = {"image_path": self.path}
+        if self.width is not None:
+            info.update({"width": self.width, "height": self.height})
+        return info
+
+    def _encode(self) -> str:
+        data, kind = self.data, self.kind
+        if self.is_image and self.max_side and self.width and max(self.width, self.height) > self.max_side:
+            with Image.open(io.BytesIO(self.data)) as img:
+                img.thumbnail((self.max_side, self.max_side))
+                buffer = io.BytesIO()
+                img.save(buffer, format="PNG" if kind == "png" else "JPEG")
+            data = buffer.getvalue()
+        mime = _MIME_TYPES.get(kind or "", "application/octet-stream")
+        return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+    @property
+    def data_url(self) -> str:
+        """Base64 data URL, downscaled and encoded on first use only"""
+        with self._lock:
+            if self._data_url is None:
+                self._data_url = self._encode()
+            return self._data_url
+
+    def content_part(self) -> Dict[str, Any]:
+        """OpenAI-style image content part"""
+        return {"type": "image_url", "image_url": {"url": self.data_url}}
@@ -1,9 +1,10 @@
 # Reference: https://github.com/zou-group/textgrad/blob/main/textgrad/engine/base.py
 # Reference: https://github.com/octotools/octotools/blob/main/octotools/engine/base.py
 
-import hashlib
-import diskcache as dc
 from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Union
+
+from engine.cache import ResponseCache, hash_request
 
 class EngineLM(ABC):
     system_prompt: str = "You are a helpful, creative, and smart assistant."
@@ -17,22 +18,53 @@ class EngineLM(ABC):
 
 
 class CachedEngine:
-    def __init__(self, cache_path):
+    """
+    Mixin giving an engine a two-level response cache.
+
+    Only requests with temperature <= `cache_max_temperature` are cached, so
+    sampled generations are never replayed unless explicitly allowed.
+    """
+
+    def __init__(
+        self,
+        cache_path,
+        cache_l1_entries: int = 256,
+        cache_size_limit: int = 2 ** 30,
+        cache_ttl_s: Optional[float] = None,
+        cache_max_temperature: float = 0.0,
+    ):
         super().__init__()
         self.cache_path = cache_path
-        self.cache = dc.Cache(cache_path)
+        self.cache_l1_entries = cache_l1_entries
+        self.cache_size_limit = cache_size_limit
+        self.cache_ttl_s = cache_ttl_s
+        self.cache_max_temperature = cache_max_temperature
+        self.cache = self._open_cache()
+
+    def _open_cache(self) -> ResponseCache:
+        return ResponseCache(
+            self.cache_path,
+            l1_max_entries=self.cache_l1_entries,
+            l2_size_limit=self.cache_size_limit,
+            ttl_s=self.cache_ttl_s,
+        )
+
+    def _hash_prompt(self, request: Union[str, Dict[str, Any]]) -> str:
+        if isinstance(request, str):
+            request = {"prompt": request}
+        return hash_request(request)
+
+    def _is_cacheable(self, temperature: float) -> bool:
+        return temperature is not None and temperature <= self.cache_max_temperature
 
-    def _hash_prompt(self, prompt: str):
-        return hashlib.sha256(f"{prompt}".encode()).hexdigest()
+    def _check_cache(self, key: str):
+        return self.cache.get(key)
 
-    def _check_cache(self, prompt: str):
-        if prompt in self.cache:
-            return self.cache[prompt]
-        else:
-            return None
+    def _save_cache(self, key: str, response: str):
+        self.cache.set(key, response)
 
-    def _save_cache(self, prompt: str, response: str):
-        self.cache[prompt] = response
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
 
     def __getstate__(self):
         # Remove the cache from the state before pickling
@@ -43,4 +75,4 @@ class CachedEngine:
     def __setstate__(self, state):
         # Restore the cache after unpickling
         self.__dict__.update(state)
-        self.cache = dc.Cache(self.cache_path)
\ No newline at end of file
+        self.cache = self._open_cache()
@@ -0,0 +1,110 @@
+"""
+Two-level response cache for LLM engines
+L1: in-process LRU, L2: size-capped diskcache store with optional TTL
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import diskcache as dc
+
+
+def hash_request(params: Dict[str, Any]) -> str:
+    """Stable sha256 over every request-affecting parameter"""
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU in front of a bounded on-disk store.
+
+    Args:
+        cache_path: diskcache directory
+        l1_max_entries: Max entries kept in memory (0 disables L1)
+        l2_size_limit: Max bytes on disk; diskcache evicts least-recently-stored entries beyond it
+        ttl_s: Expiry in seconds for both levels (None = never)
+    """
+
+    def __init__(
+        self,
+        cache_path: str,
+        l1_max_entries: int = 256,
+        l2_size_limit: int = 2 ** 30,
+        ttl_s: Optional[float] = None,
+    ):
+        self.cache_path = cache_path
+        self.l1_max_entries = l1_max_entries
+        self.l2_size_limit = l2_size_limit
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._l1: "OrderedDict[str, tuple]" = OrderedDict()
+        self._l2 = dc.Cache(cache_path, size_limit=l2_size_limit, eviction_policy="least-recently-stored")
+        self._stats = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "bytes_read": 0,
+            "bytes_written": 0,
+        }
+
+    def _l1_put(self, key: str, value: str) -> None:
+        if self.l1_max_entries <= 0:
+            return
+        expires = None if self.ttl_s is None else time.time() + self.ttl_s
+        self._l1[key] = (value, expires)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max_entries:
+            self._l1.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.time():
+                    self._l1.move_to_end(key)
+                    self._stats["l1_hits"] += 1
+                    self._stats["bytes_read"] += len(value.encode("utf-8"))
+                    return value
+                del self._l1[key]
+
+        value = self._l2.get(key, default=None)
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["l2_hits"] += 1
+            self._stats["bytes_read"] += len(value.encode("utf-8"))
+            self._l1_put(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._l2.set(key, value, expire=self.ttl_s)
+        with self._lock:
+            self._l1_put(key, value)
+            self._stats["writes"] += 1
+            self._stats["bytes_written"] += len(value.encode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["l1_entries"] = len(self._l1)
+        lookups = stats["l1_hits"] + stats["l2_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["l1_hits"] + stats["l2_hits"]) / lookups, 4) if lookups else 0.0
+        stats["l2_entries"] = len(self._l2)
+        stats["l2_bytes"] = self._l2.volume()
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._l1.clear()
+        self._l2.clear()
+
+    def close(self) -> None:
+        self._l2.close()
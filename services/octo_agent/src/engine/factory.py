@@ -2,57 +2,120 @@
 Engine factory - adapted from octotools
 Creates LLM engine instances
 For our services, we default to ChatLocalLLM (via gateway)
+
+Engines are kept in a process-wide registry keyed by their configuration, so
+every caller asking for the same engine shares one instance (and with it the
+HTTP connection pool, the response cache and any stats).
 """
 
-import sys
-from pathlib import Path
-from typing import Any
+import atexit
+import threading
+from typing import Any, Dict, Tuple
 
 from engine.local_llm import ChatLocalLLM  # noqa: F401
 
+_ENGINE_REGISTRY: Dict[Tuple, Any] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _registry_key(model_string: str, use_cache: bool, is_multimodal: bool, base_url: str, api_key: str, kwargs: dict) -> Tuple:
+    return (
+        model_string,
+        use_cache,
+        is_multimodal,
+        base_url.rstrip("/"),
+        api_key,
+        tuple(sorted((k, repr(v)) for k, v in kwargs.items())),
+    )
+
+
+def _build_engine(
+    model_string: str,
+    use_cache: bool,
+    is_multimodal: bool,
+    base_url: str,
+    api_key: str,
+    **kwargs
+) -> Any:
+    # Default to local LLM gateway
+    if "local" in model_string.lower() or "vllm" in model_string.lower():
+        from .local_llm import ChatLocalLLM
+        return ChatLocalLLM(
+            model_string=model_string,
+            base_url=base_url,
+            api_key=api_key,
+            use_cache=use_cache,
+            is_multimodal=is_multimodal,
+            **kwargs
+        )
+
+    # For other models, could import from vendor engines
+    # This allows fallback to vendor implementations if needed
+    else:
+        raise ValueError(
+            f"Engine {model_string} not supported in orchestrator. "
+            "For now, use 'local' or 'vllm' prefix for local LLM gateway. "
+            "Other engines can be added from vendor/octotools/engine/"
+        )
+
+
 def create_llm_engine(
     model_string: str = "Corianas/DeepSeek-R1-Distill-Qwen-14B-AWQ", # default to qwen
     use_cache: bool = False,
     is_multimodal: bool = True,
     base_url: str = "http://localhost:8000/v1",
     api_key: str = "local-llm", # Default to local llm
+    shared: bool = True,
     **kwargs
 ) -> Any:
     """
     Factory function to create LLM engine instance.
-    
+
     For the orchestrator service, we primarily use ChatLocalLLM (gateway).
     Can be extended to support other engines from vendor/octotools.
-    
+
     Args:
         model_string: Model identifier (e.g., "deepseek-ai/DeepSeek-R1-Distill-Qwen-14B")
         use_cache: Enable caching
         is_multimodal: Support multimodal input
         base_url: LLM Gateway base URL
         api_key: API key for authentication
+        shared: Return the process-wide instance for this configuration (False builds a private one)
         **kwargs: Additional arguments
-    
+
     Returns:
         LLM engine instance
     """
-    
-    # Default to local LLM gateway
-    if "local" in model_string.lower() or "vllm" in model_string.lower():
-        from .local_llm import ChatLocalLLM
-        return ChatLocalLLM(
-            model_string=model_string,
-            base_url=base_url,
-            api_key=api_key,
-            use_cache=use_cache,
-            is_multimodal=is_multimodal,
-            **kwargs
-        )
-    
-    # For other models, could import from vendor engines
-    # This allows fallback to vendor implementations if needed
-    else:
-        raise ValueError(
-            f"Engine {model_string} not supported in orchestrator. "
-            "For now, use 'local' or 'vllm' prefix for local LLM gateway. "
-            "Other engines can be added from vendor/octotools/engine/"
-        )
+    if not shared:
+        return _build_engine(model_string, use_cache, is_multimodal, base_url, api_key, **kwargs)
+
+    key = _registry_key(model_string, use_cache, is_multimodal, base_url, api_key, kwargs)
+    with _REGISTRY_LOCK:
+        engine = _ENGINE_REGISTRY.get(key)
+        if engine is None:
+            engine = _build_engine(model_string, use_cache, is_multimodal, base_url, api_key, **kwargs)
+            _ENGINE_REGISTRY[key] = engine
+        return engine
+
+
+def registered_engines() -> list:
+    """Snapshot of the engines currently held by the registry"""
+    with _REGISTRY_LOCK:
+        return list(_ENGINE_REGISTRY.values())
+
+
+def shutdown_llm_engines() -> None:
+    """Close every shared engine (connection pools, caches) and empty the registry"""
+    with _REGISTRY_LOCK:
+        engines = list(_ENGINE_REGISTRY.values())
+        _ENGINE_REGISTRY.clear()
+    for engine in engines:
+        close = getattr(engine, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"Error closing LLM engine: {str(e)}")
+
+
+atexit.register(shutdown_llm_engines)
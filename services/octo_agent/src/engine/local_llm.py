@@ -3,10 +3,76 @@ Local LLM Engine Adapter - communicates with LLM Gateway service
 Adapted from octotools engine pattern
 """
 
-from typing import Union, Optional
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Type, Union
+
 import httpx
+from pydantic import BaseModel
 
+from engine.assets import InputAsset
 from engine.base import EngineLM, CachedEngine
+from engine.reasoning import ReasoningTrace, join_reasoning, split_reasoning
+from engine.streaming import (
+    StopCondition,
+    StreamStats,
+    answer_text,
+    completion_tokens,
+    extract_delta,
+    iter_sse_events,
+    prompt_cache_usage,
+)
+from engine.telemetry import CallRecord, TelemetrySink, emit_record
+from engine.tracing import span
+from engine.structured import is_response_model, parse_structured, response_format_payload
+from engine.utils import estimate_tokens
+
+# Sent as x-session-id: the gateway keeps one session's KV prefix in a llama.cpp slot
+_session_id: ContextVar[Optional[str]] = ContextVar("llm_session_id", default=None)
+
+
+@contextmanager
+def llm_session(session_id: str):
+    """Tag every gateway call in this context (e.g. one solve) with `session_id`"""
+    token = _session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+
+# Sent as x-priority: the gateway admits queued calls by priority class (interactive, default, batch)
+_priority: ContextVar[Optional[str]] = ContextVar("llm_priority", default=None)
+
+
+@contextmanager
+def llm_priority(priority: str):
+    """Send every gateway call in this context with priority class `priority`"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+# Set by callers that may abandon their calls (e.g. a speculative plan); calls made in the
+# context stream, and stop at the next delta once the event is set
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("llm_cancel_event", default=None)
+
+
+@contextmanager
+def llm_cancellable(event: threading.Event):
+    """Make every gateway call in this context stop early once `event` is set"""
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
 
 class ChatLocalLLM(EngineLM, CachedEngine):
     """
@@ -24,6 +90,20 @@ class ChatLocalLLM(EngineLM, CachedEngine):
         use_cache: bool = False,
         is_multimodal: bool = True,
         cache_path: str = ".cache/llm",
+        streaming: bool = False,
+        temperature: float = 0.7,
+        cache_l1_entries: int = 256,
+        cache_size_limit: int = 2 ** 30,
+        cache_ttl_s: Optional[float] = None,
+        cache_max_temperature: float = 0.0,
+        timeout_s: float = 300.0,
+        max_connections: int = 16,
+        http_client: Optional[httpx.Client] = None,
+        structured_output: Union[bool, Iterable[str]] = False,
+        strip_reasoning: bool = True,
+        reasoning_budgets: Optional[Dict[str, int]] = None,
+        reasoning_trace_path: Optional[str] = None,
+        telemetry_sinks: Optional[Sequence[TelemetrySink]] = None,
         **kwargs
     ):
         """
@@ -36,6 +116,27 @@ class ChatLocalLLM(EngineLM, CachedEngine):
             use_cache: Enable response caching
             is_multimodal: Support multimodal input
             cache_path: Cache directory path
+            streaming: Stream every generation (also enabled per call by stop conditions)
+            temperature: Default sampling temperature when a call does not set one
+            cache_l1_entries: In-process LRU size
+            cache_size_limit: On-disk cache size cap in bytes
+            cache_ttl_s: Cache entry lifetime in seconds (None = no expiry)
+            cache_max_temperature: Only requests at or below this temperature are cached
+            timeout_s: Per-request timeout in seconds
+            max_connections: Connection pool size of the shared HTTP client
+            http_client: Pre-built HTTP client (otherwise a pooled keep-alive client is created)
+            structured_output: Constrain replies to the JSON schema of `response_format` models:
+                True for every call site, or the call sites to constrain ("default" covers
+                unlabeled calls). Constrained replies always parse, but the grammar decides
+                where they end, so `stop_when` early stops are dropped, and R1-style models
+                cannot emit a <think> block, so they answer without reasoning. Unconstrained
+                calls keep both and return text for the caller to parse
+            strip_reasoning: Return only the answer part of R1-style replies (reasoning is dropped)
+            reasoning_budgets: Max reasoning tokens per call site ("default" applies to unlabeled
+                and unlisted sites); over budget the think block is closed and the answer requested
+            reasoning_trace_path: Optional JSONL file that receives every call's reasoning
+            telemetry_sinks: Sinks receiving a CallRecord per `generate` call (in addition
+                to collectors opened with `engine.telemetry.collect_telemetry`)
             **kwargs: Additional arguments
         """
         # Hard code the used model for local llm gateway
@@ -46,27 +147,393 @@ class ChatLocalLLM(EngineLM, CachedEngine):
         self.api_key = api_key
         self.is_multimodal = is_multimodal
         self.use_cache = use_cache
+        self.streaming = streaming
+        self.temperature = temperature
+        self.timeout_s = timeout_s
+        self.max_connections = max_connections
+        # A sorted tuple, so equal configurations share one engine in the registry
+        self.structured_output = structured_output if isinstance(structured_output, bool) else tuple(sorted(set(structured_output)))
+        self.strip_reasoning = strip_reasoning
+        self.reasoning_budgets = dict(reasoning_budgets or {})
+        self.reasoning_trace_path = reasoning_trace_path
+        self._reasoning_trace = ReasoningTrace(reasoning_trace_path) if reasoning_trace_path else None
+        self.telemetry_sinks = tuple(telemetry_sinks or ())
         self.kwargs = kwargs
+        # Engines are shared across threads (see engine.factory); keep per-call state thread-local
+        self._local = threading.local()
+        self._client = http_client or self._create_client()
+        self._prefix_lock = threading.Lock()
+        self._prefix_stats: dict = {}
+        self._token_counts: "OrderedDict[str, int]" = OrderedDict()
+        self._tokenizer_available = True
+        self._generation_slots: Optional[int] = None
+        self._generation_slots_checked = False
         
         if use_cache:
-            CachedEngine.__init__(self, cache_path=cache_path)
+            CachedEngine.__init__(
+                self,
+                cache_path=cache_path,
+                cache_l1_entries=cache_l1_entries,
+                cache_size_limit=cache_size_limit,
+                cache_ttl_s=cache_ttl_s,
+                cache_max_temperature=cache_max_temperature,
+            )
+
+    def _create_client(self) -> httpx.Client:
+        return httpx.Client(
+            timeout=self.timeout_s,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+        )
+
+    @property
+    def last_stream_stats(self) -> Optional[StreamStats]:
+        """Stats of the most recent streamed generation made by the calling thread"""
+        return getattr(self._local, "stream_stats", None)
+
+    @property
+    def last_reasoning(self) -> Optional[str]:
+        """Reasoning stripped from the most recent reply generated by the calling thread"""
+        return getattr(self._local, "reasoning", None)
+
+    def _is_structured(self, call_site: Optional[str]) -> bool:
+        if isinstance(self.structured_output, bool):
+            return self.structured_output
+        return (call_site or "default") in self.structured_output
+
+    def _reasoning_budget(self, call_site: Optional[str]) -> Optional[int]:
+        return self.reasoning_budgets.get(call_site or "default", self.reasoning_budgets.get("default"))
+
+    def _record_prompt_usage(self, call_site: Optional[str], data: dict) -> None:
+        """Accumulate KV prefix-cache reuse per call site from a response's usage/timings"""
+        call_usage = getattr(self._local, "call_usage", None)
+        generated = completion_tokens(data)
+        if call_usage is not None and generated is not None:
+            call_usage["completion_tokens"] += generated
+        usage = prompt_cache_usage(data)
+        if usage is None:
+            return
+        prompt_tokens, cached_tokens, prefill_ms = usage
+        if call_usage is not None:
+            call_usage["prompt_tokens"] += prompt_tokens
+            call_usage["cached_prompt_tokens"] += cached_tokens
+        with self._prefix_lock:
+            entry = self._prefix_stats.setdefault(call_site or "unlabeled", {
+                "calls": 0,
+                "prompt_tokens": 0,
+                "cached_tokens": 0,
+                "prefill_ms": 0.0,
+            })
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["cached_tokens"] += cached_tokens
+            entry["prefill_ms"] += prefill_ms or 0.0
+
+    def prefix_cache_report(self) -> dict:
+        """Per-call-site prefix-cache hit rate (cached / total prompt tokens) and prefill time"""
+        with self._prefix_lock:
+            report = {site: dict(entry) for site, entry in self._prefix_stats.items()}
+        for entry in report.values():
+            total = entry["prompt_tokens"]
+            entry["hit_rate"] = round(entry["cached_tokens"] / total, 4) if total else 0.0
+            entry["prefill_ms"] = round(entry["prefill_ms"], 1)
+        return report
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count tokens with the served model's tokenizer (llama.cpp `/tokenize`)
+        
+        Counts are memoized by content hash; if the endpoint is unreachable the
+        engine falls back to a character-based estimate for the rest of its life.
+        """
+        if not text:
+            return 0
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._prefix_lock:
+            if key in self._token_counts:
+                self._token_counts.move_to_end(key)
+                return self._token_counts[key]
+
+        count = None
+        if self._tokenizer_available:
+            root_url = self.base_url[:-3] if self.base_url.endswith("/v1") else self.base_url
+            try:
+                response = self._client.post(
+                    f"{root_url}/tokenize",
+                    json={"content": text},
+                    headers=self._prepare_headers(),
+                )
+                response.raise_for_status()
+                count = len(response.json()["tokens"])
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                print(f"Tokenizer endpoint unavailable ({e}); estimating token counts")
+                self._tokenizer_available = False
+        if count is None:
+            count = estimate_tokens(text)
+
+        with self._prefix_lock:
+            self._token_counts[key] = count
+            while len(self._token_counts) > 4096:
+                self._token_counts.popitem(last=False)
+        return count
+
+    def generation_slots(self) -> Optional[int]:
+        """
+        Generations the gateway runs at once (its admission `slots` in `/metrics`)
+
+        Asked once per engine; None when the server does not report it (e.g. no gateway).
+        """
+        if not self._generation_slots_checked:
+            self._generation_slots_checked = True
+            root_url = self.base_url[:-3] if self.base_url.endswith("/v1") else self.base_url
+            try:
+                response = self._client.get(f"{root_url}/metrics", headers=self._prepare_headers())
+                response.raise_for_status()
+                slots = response.json()["admission"]["slots"]
+                self._generation_slots = slots if isinstance(slots, int) else None
+            except (httpx.HTTPError, KeyError, TypeError, ValueError):
+                self._generation_slots = None
+        return self._generation_slots
+
+    def close(self) -> None:
+        """Release the HTTP connection pool and the response cache"""
+        self._client.close()
+        if self.use_cache and hasattr(self, "cache"):
+            self.cache.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("cache", "_client", "_local", "_prefix_lock", "_token_counts", "_reasoning_trace", "telemetry_sinks"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._client = self._create_client()
+        self._prefix_lock = threading.Lock()
+        self._token_counts = OrderedDict()
+        self._reasoning_trace = ReasoningTrace(self.reasoning_trace_path) if self.reasoning_trace_path else None
+        self.telemetry_sinks = ()
+        if self.use_cache:
+            self.cache = self._open_cache()
 
     def _prepare_headers(self) -> dict:
         """Prepare HTTP headers for requests"""
-        return {
+        headers = {
             "Content-Type": "application/json",
             "x-api-key": self.api_key,
             "Authorization": f"Bearer {self.api_key}",
         }
+        session_id = _session_id.get()
+        if session_id is not None:
+            headers["x-session-id"] = session_id
+        priority = _priority.get()
+        if priority is not None:
+            headers["x-priority"] = priority
+        return headers
 
-    def generate(
+    def _build_payload(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        stop: Optional[Sequence[str]] = None,
+        images: Optional[List[InputAsset]] = None,
+    ) -> dict:
+        """Build the chat.completions request body"""
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        else:
+            messages.append({"role": "system", "content": self.system_prompt})
+        if images:
+            content = [{"type": "text", "text": prompt}] + [asset.content_part() for asset in images]
+            messages.append({"role": "user", "content": content})
+        else:
+            messages.append({"role": "user", "content": prompt})
+
+        payload = {
+            "model": self.model_string,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+        if stop:
+            payload["stop"] = list(stop)
+        return payload
+
+    def stream(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
         max_tokens: int = 4000,
-        temperature: float = 0.7,
+        temperature: Optional[float] = None,
+        stop: Optional[Sequence[str]] = None,
+        stop_when: Optional[Callable[[str], bool]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        call_site: Optional[str] = None,
         **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a completion from the gateway, yielding text deltas
+        
+        The stream is closed (which cancels the upstream generation) as soon as
+        a stop sequence appears or `stop_when` returns True on the accumulated text.
+        Timing is recorded in `self.last_stream_stats` once the iterator finishes.
+        
+        Args:
+            prompt: Input prompt
+            system_prompt: System message
+            max_tokens: Max tokens to generate
+            temperature: Sampling temperature (defaults to the engine setting)
+            stop: Stop sequences (sent to the server and also checked client-side)
+            stop_when: Predicate on the accumulated text that ends generation early
+            on_token: Callback invoked with every text delta
+            call_site: Label used to attribute prefix-cache stats
+            **kwargs: Additional arguments
+        
+        Yields:
+            Text deltas (the last one is cut before a matched stop sequence)
+        """
+        if temperature is None:
+            temperature = self.temperature
+        payload = self._build_payload(prompt, system_prompt, max_tokens, temperature, stop=stop)
+        yield from self._stream_payload(payload, stop=stop, stop_when=stop_when, on_token=on_token, call_site=call_site)
+
+    def _stream_payload(
+        self,
+        payload: dict,
+        stop: Optional[Sequence[str]] = None,
+        stop_when: Optional[Callable[[str], bool]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        call_site: Optional[str] = None,
+        reasoning_budget: Optional[int] = None,
+    ) -> Iterator[str]:
+        """
+        Run a streaming request for a prepared payload (see `stream`)
+
+        Separate `reasoning_content` deltas are collected in `self._local.stream_reasoning`;
+        with `reasoning_budget` the stream ends once that many reasoning deltas arrived.
+        A set `llm_cancellable` event closes the stream (stop reason "cancelled").
+        """
+        condition = StopCondition(stop_sequences=tuple(stop or ()), predicate=stop_when)
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        stats = StreamStats()
+        self._local.stream_stats = stats
+        reasoning_parts: List[str] = []
+        self._local.stream_reasoning = reasoning_parts
+        reasoning_tokens = 0
+        cancel = _cancel_event.get()
+        if cancel is not None and cancel.is_set():
+            stats.stop_reason = "cancelled"
+            stats.stopped_early = True
+            return
+
+        print("Streaming model:", self.model_string)
+
+        started = time.perf_counter()
+        accumulated = ""
+        try:
+            with self._client.stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                json=payload,
+                headers=self._prepare_headers(),
+            ) as response:
+                response.raise_for_status()
+                for event in iter_sse_events(response.iter_lines()):
+                    if cancel is not None and cancel.is_set():
+                        # Closing the stream makes the gateway abort the upstream generation
+                        stats.stop_reason = "cancelled"
+                        stats.stopped_early = True
+                        break
+                    if "timings" in event or event.get("usage"):
+                        self._record_prompt_usage(call_site, event)
+                    content, reasoning, finish_reason = extract_delta(event)
+                    if finish_reason:
+                        stats.finish_reason = finish_reason
+                    if not content and not reasoning:
+                        continue
+                    if stats.ttft_s is None:
+                        stats.ttft_s = time.perf_counter() - started
+                    stats.chunks += 1
+                    if reasoning:
+                        reasoning_parts.append(reasoning)
+                    # One delta is one sampled token; inline <think> text counts as reasoning too
+                    in_reasoning = bool(reasoning) or answer_text(accumulated + (content or "")) is None
+                    if in_reasoning:
+                        reasoning_tokens += 1
+                        stats.extra["reasoning_tokens"] = reasoning_tokens
+                    over_budget = in_reasoning and reasoning_budget is not None and reasoning_tokens > reasoning_budget
+                    if not content:
+                        if over_budget:
+                            stats.stop_reason = "reasoning_budget"
+                            stats.stopped_early = True
+                            break
+                        continue
+
+                    reason, cut = condition.check(accumulated + content)
+                    delta = cut[len(accumulated):]
+                    accumulated = cut
+                    if delta:
+                        if on_token is not None:
+                            on_token(delta)
+                        yield delta
+                    if reason is not None:
+                        stats.stop_reason = reason
+                        stats.stopped_early = True
+                        break
+                    if over_budget:
+                        stats.stop_reason = "reasoning_budget"
+                        stats.stopped_early = True
+                        break
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"LLM Gateway error: {e}") from e
+        finally:
+            stats.total_s = time.perf_counter() - started
+
+    def _cache_key(
+        self,
+        payload: dict,
+        stop_when: Optional[Callable[[str], bool]],
+        images: Optional[List[InputAsset]] = None,
+        reasoning_budget: Optional[int] = None,
     ) -> str:
+        """Hash every request-affecting parameter (the stream flag does not change the answer)"""
+        request = {k: v for k, v in payload.items() if k not in ("stream", "stream_options")}
+        if images:
+            # Identify images by content hash rather than re-hashing the encoded data URLs
+            request["messages"] = [
+                {**m, "content": [p for p in m["content"] if p.get("type") == "text"]}
+                if isinstance(m["content"], list) else m
+                for m in request["messages"]
+            ]
+            request["images"] = [asset.cache_token for asset in images]
+        if stop_when is not None:
+            request["stop_when"] = stop_when.cache_token
+        if reasoning_budget is not None:
+            request["reasoning_budget"] = reasoning_budget
+        return self._hash_prompt(request)
+
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        max_tokens: int = 4000,
+        temperature: Optional[float] = None,
+        stream: Optional[bool] = None,
+        stop: Optional[Sequence[str]] = None,
+        stop_when: Optional[Callable[[str], bool]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        response_format: Optional[Type[BaseModel]] = None,
+        call_site: Optional[str] = None,
+        images: Optional[List[InputAsset]] = None,
+        **kwargs
+    ) -> Union[str, BaseModel]:
         """
         Generate text using local LLM via gateway
         
@@ -74,73 +541,224 @@ class ChatLocalLLM(EngineLM, CachedEngine):
             prompt: Input prompt
             system_prompt: System message
             max_tokens: Max tokens to generate
-            temperature: Sampling temperature
+            temperature: Sampling temperature (defaults to the engine setting)
+            stream: Force streaming on/off (defaults to the engine setting, or on when
+                `stop_when`/`on_token` are given)
+            stop: Stop sequences
+            stop_when: Predicate on the accumulated text that ends generation early
+            on_token: Callback invoked with every streamed text delta
+            response_format: Pydantic model; where `structured_output` covers the call site the server is
+                constrained to its JSON schema and the reply is parsed into it
+            call_site: Label used to attribute prefix-cache stats (e.g. "next_step")
+            images: Image assets sent as image content parts
             **kwargs: Additional arguments
         
         Returns:
-            Generated text
+            Generated text (the answer only, unless `strip_reasoning` is off), or a
+            `response_format` instance for structured replies
         """
-        
-        # Check cache if enabled
-        cache_key = f"{prompt}:{system_prompt}:{max_tokens}:{temperature}"
-        if self.use_cache and hasattr(self, '_check_cache'):
+        if temperature is None:
+            temperature = self.temperature
+
+        payload = self._build_payload(prompt, system_prompt, max_tokens, temperature, stop=stop, images=images)
+
+        structured = self._is_structured(call_site) and is_response_model(response_format)
+        if structured:
+            payload["response_format"] = response_format_payload(response_format)
+            # The grammar ends the reply; text predicates could fire inside JSON strings
+            stop_when = None
+
+        self._local.call_usage = {"prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+        self._local.cache_hit = False
+        self._local.streamed = False
+        # A cache hit or blocking call streams nothing; no stats of an earlier call may show through
+        self._local.stream_stats = None
+        with span("llm", call_site=call_site or "unlabeled", model=self.model_string) as llm_span:
+            started = time.perf_counter()
+            error = None
+            try:
+                result = self._complete(
+                    payload,
+                    temperature,
+                    stream=stream,
+                    stop=stop,
+                    stop_when=stop_when,
+                    on_token=on_token,
+                    call_site=call_site,
+                    images=images,
+                )
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                record = self._emit_telemetry(call_site, time.perf_counter() - started, error)
+                llm_span.set(
+                    prompt_tokens=record.prompt_tokens,
+                    completion_tokens=record.completion_tokens,
+                    cached_prompt_tokens=record.cached_prompt_tokens,
+                    cache_hit=record.cache_hit,
+                    streamed=record.streamed,
+                    ttft_s=record.ttft_s,
+                )
+
+        reasoning, answer = split_reasoning(result)
+        self._local.reasoning = reasoning
+        if self._reasoning_trace is not None and reasoning:
+            truncated = (self.last_stream_stats or StreamStats()).stop_reason == "reasoning_budget"
+            self._reasoning_trace.write(call_site, self.model_string, reasoning, answer, truncated)
+        if self.strip_reasoning:
+            result = answer
+
+        if structured:
+            parsed = parse_structured(result, response_format)
+            if parsed is not None:
+                return parsed
+            print(f"Structured reply did not validate as {response_format.__name__}; returning raw text")
+        return result
+
+    def _complete(
+        self,
+        payload: dict,
+        temperature: float,
+        stream: Optional[bool] = None,
+        stop: Optional[Sequence[str]] = None,
+        stop_when: Optional[Callable[[str], bool]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        call_site: Optional[str] = None,
+        images: Optional[List[InputAsset]] = None,
+    ) -> str:
+        """Run a prepared request (cached, streamed or blocking) and return the raw reply text"""
+        # Check cache if enabled (deterministic requests only). A stop predicate decides where the
+        # reply ends, so it needs a stable `cache_token`; other callables (lambdas, closures) only
+        # have a per-process repr, which would fill the disk cache with entries nothing ever hits
+        use_cache = self.use_cache and self._is_cacheable(temperature) and (stop_when is None or hasattr(stop_when, "cache_token"))
+        if use_cache:
+            cache_key = self._cache_key(payload, stop_when, images, self._reasoning_budget(call_site))
             cached = self._check_cache(cache_key)
-            if cached:
+            if cached is not None:
+                self._local.cache_hit = True
                 return cached
 
-        # Prepare messages
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        else:
-            messages.append({"role": "system", "content": self.system_prompt})
-        messages.append({"role": "user", "content": prompt})
+        cancel = _cancel_event.get()
+        if stream is None:
+            stream = self.streaming or stop_when is not None or on_token is not None or cancel is not None
+        reasoning_budget = self._reasoning_budget(call_site)
+        if reasoning_budget is not None:
+            # The budget is enforced on the token stream
+            stream = True
 
-        # Make request to gateway
-        payload = {
-            "model": self.model_string,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-        }
+        if stream:
+            self._local.streamed = True
+            result = "".join(self._stream_payload(
+                payload,
+                stop=stop,
+                stop_when=stop_when,
+                on_token=on_token,
+                call_site=call_site,
+                reasoning_budget=reasoning_budget,
+            ))
+            if self._local.stream_reasoning:
+                result = join_reasoning("".join(self._local.stream_reasoning), result)
+            if self.last_stream_stats.stop_reason == "cancelled":
+                # A partial reply nobody will use; never cached
+                return result
+            if self.last_stream_stats.stop_reason == "reasoning_budget":
+                result = self._answer_after_reasoning(payload, result, call_site)
+                if on_token is not None:
+                    on_token(split_reasoning(result)[1])
+            if use_cache:
+                self._save_cache(cache_key, result)
+            return result
 
         print("Sending model:", self.model_string)
         
         try:
-            response = httpx.post(
+            response = self._client.post(
                 f"{self.base_url}/chat/completions",
                 json=payload,
                 headers=self._prepare_headers(),
-                timeout=300.0,
             )
             response.raise_for_status()
             data = response.json()
+            self._record_prompt_usage(call_site, data)
             
-            result = data['choices'][0]['message']['content']
+            message = data['choices'][0]['message']
+            result = join_reasoning(message.get('reasoning_content') or "", message['content'] or "")
             
             # Cache result if enabled
-            if self.use_cache and hasattr(self, '_save_cache'):
+            if use_cache:
                 self._save_cache(cache_key, result)
             
             return result
             
         except httpx.HTTPError as e:
-            raise RuntimeError(f"LLM Gateway error: {e}")
+            raise RuntimeError(f"LLM Gateway error: {e}") from e
+
+    def _emit_telemetry(self, call_site: Optional[str], latency_s: float, error: Optional[str]) -> CallRecord:
+        """Build the CallRecord of the call that just finished on this thread, emit and return it"""
+        usage = self._local.call_usage
+        record = CallRecord(
+            call_site=call_site or "unlabeled",
+            model=self.model_string,
+            prompt_tokens=usage["prompt_tokens"],
+            completion_tokens=usage["completion_tokens"],
+            cached_prompt_tokens=usage["cached_prompt_tokens"],
+            latency_s=latency_s,
+            cache_hit=self._local.cache_hit,
+            streamed=self._local.streamed,
+            error=error,
+        )
+        stats = self.last_stream_stats
+        if record.streamed and stats is not None:
+            record.ttft_s = stats.ttft_s
+            record.stop_reason = stats.stop_reason or stats.finish_reason
+            if not record.completion_tokens:
+                # Streams closed early never receive the final usage chunk; one delta is one token
+                record.completion_tokens = stats.chunks
+        emit_record(record, self.telemetry_sinks)
+        return record
+
+    def _answer_after_reasoning(self, payload: dict, partial: str, call_site: Optional[str]) -> str:
+        """
+        Close a reasoning block cut off by its budget and request just the answer
+
+        The truncated reasoning is sent back as an assistant prefill ending in
+        `</think>`, so the server reuses the cached prefix and continues with the answer.
+        """
+        reasoning, _ = split_reasoning(partial)
+        prefill = join_reasoning(reasoning, "")
+        continuation = {
+            **payload,
+            "messages": payload["messages"] + [{"role": "assistant", "content": prefill}],
+        }
+        try:
+            response = self._client.post(
+                f"{self.base_url}/chat/completions",
+                json=continuation,
+                headers=self._prepare_headers(),
+            )
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"LLM Gateway error: {e}") from e
+        self._record_prompt_usage(call_site, data)
+        _, answer = split_reasoning(data['choices'][0]['message']['content'] or "")
+        return join_reasoning(reasoning, answer)
 
     def __call__(
         self,
         input_data: Union[str, list],
         **kwargs
-    ) -> str:
+    ) -> Union[str, BaseModel]:
         """
         Make engine callable for multimodal input
         
         Args:
-            input_data: String prompt or list [prompt, image_bytes, ...]
+            input_data: String prompt or list [prompt, InputAsset | image_bytes, ...]
             **kwargs: Additional arguments
         
         Returns:
-            Generated text
+            Generated text (or a parsed `response_format` instance)
         """
         
         if isinstance(input_data, str):
@@ -148,10 +766,15 @@ class ChatLocalLLM(EngineLM, CachedEngine):
         
         elif isinstance(input_data, list) and len(input_data) > 0:
             prompt = input_data[0] if isinstance(input_data[0], str) else str(input_data[0])
-            
-            # For now, just use text prompt
-            # Full multimodal support would require vision endpoint
-            return self.generate(prompt, **kwargs)
+
+            images = []
+            if self.is_multimodal:
+                for item in input_data[1:]:
+                    asset = InputAsset(path="", data=item) if isinstance(item, bytes) else item
+                    # Only images become content parts; documents reach the model through tools
+                    if isinstance(asset, InputAsset) and asset.is_image:
+                        images.append(asset)
+            return self.generate(prompt, images=images or None, **kwargs)
         
         else:
             raise ValueError(f"Unsupported input type: {type(input_data)}")
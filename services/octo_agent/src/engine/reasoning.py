@@ -0,0 +1,61 @@
+"""
+Reasoning-trace handling for R1-style models
+Separates `<think>` reasoning from the answer and records traces for debugging.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def split_reasoning(text: str) -> Tuple[str, str]:
+    """
+    Split a completion into (reasoning, answer).
+
+    Handles a full `<think>...</think>` block, a reply that only contains the
+    closing tag (the chat template already opened the block), and a block that
+    was cut off before closing (everything is reasoning).
+    """
+    if THINK_CLOSE in text:
+        reasoning, answer = text.split(THINK_CLOSE, 1)
+        reasoning = reasoning.split(THINK_OPEN, 1)[-1]
+        return reasoning.strip(), answer.strip()
+    stripped = text.lstrip()
+    if stripped.startswith(THINK_OPEN):
+        return stripped[len(THINK_OPEN):].strip(), ""
+    return "", text
+
+
+def join_reasoning(reasoning: str, answer: str) -> str:
+    """Inverse of split_reasoning, used to keep one raw representation for caching"""
+    return f"{THINK_OPEN}\n{reasoning}\n{THINK_CLOSE}\n\n{answer}" if reasoning else answer
+
+
+class ReasoningTrace:
+    """Append-only JSONL file of reasoning traces (one record per engine call)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, call_site: Optional[str], model: str, reasoning: str, answer: str, truncated: bool) -> None:
+        record = {
+            "ts": time.time(),
+            "call_site": call_site,
+            "model": model,
+            "reasoning": reasoning,
+            "reasoning_chars": len(reasoning),
+            "answer_chars": len(answer),
+            "budget_truncated": truncated,
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
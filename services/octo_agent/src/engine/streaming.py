@@ -0,0 +1,162 @@
+"""
+Streaming helpers for OpenAI-compatible chat completions
+Parses server-sent events and evaluates early-stop conditions on the accumulated text
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class StopCondition:
+    """
+    Client-side stop condition for a streamed generation.
+
+    Args:
+        stop_sequences: Literal strings; generation stops (and the text is cut) at the first match
+        predicate: Callable on the accumulated text; generation stops as soon as it returns True
+    """
+    stop_sequences: Sequence[str] = ()
+    predicate: Optional[Callable[[str], bool]] = None
+
+    def check(self, text: str) -> Tuple[Optional[str], str]:
+        """
+        Evaluate the condition against the accumulated text.
+
+        Returns:
+            (reason, text): reason is None while generation should continue;
+            text is cut before the matched stop sequence, if any.
+        """
+        for seq in self.stop_sequences:
+            idx = text.find(seq)
+            if seq and idx != -1:
+                return "stop_sequence", text[:idx]
+        if self.predicate is not None and self.predicate(text):
+            return "predicate", text
+        return None, text
+
+
+@dataclass
+class StreamStats:
+    """Timing and termination info for a single streamed generation"""
+    ttft_s: Optional[float] = None
+    total_s: float = 0.0
+    chunks: int = 0
+    stop_reason: Optional[str] = None
+    finish_reason: Optional[str] = None
+    stopped_early: bool = False
+    extra: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "ttft_s": None if self.ttft_s is None else round(self.ttft_s, 4),
+            "total_s": round(self.total_s, 4),
+            "chunks": self.chunks,
+            "stop_reason": self.stop_reason,
+            "finish_reason": self.finish_reason,
+            "stopped_early": self.stopped_early,
+            **self.extra,
+        }
+
+
+def iter_sse_events(lines: Iterable[str]) -> Iterator[dict]:
+    """Yield decoded JSON events from `data:` lines until `[DONE]`"""
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            continue
+
+
+def extract_delta(event: dict) -> Tuple[str, str, Optional[str]]:
+    """
+    Pull (content, reasoning_content, finish_reason) out of one chat.completion.chunk event.
+    """
+    choices = event.get("choices") or []
+    if not choices:
+        return "", "", None
+    choice = choices[0]
+    delta = choice.get("delta") or {}
+    return (
+        delta.get("content") or "",
+        delta.get("reasoning_content") or "",
+        choice.get("finish_reason"),
+    )
+
+
+def prompt_cache_usage(data: dict) -> Optional[Tuple[int, int, Optional[float]]]:
+    """
+    Read (prompt_tokens, cached_prompt_tokens, prefill_ms) from a completion or final chunk.
+
+    Prefers llama.cpp `timings` (cache_n = tokens reused from the KV cache,
+    prompt_n = tokens actually prefilled), falling back to the OpenAI `usage` block.
+    """
+    timings = data.get("timings") or {}
+    usage = data.get("usage") or {}
+    if "cache_n" in timings or "prompt_n" in timings:
+        cached = int(timings.get("cache_n") or 0)
+        processed = int(timings.get("prompt_n") or 0)
+        return cached + processed, cached, timings.get("prompt_ms")
+    if usage.get("prompt_tokens") is not None:
+        details = usage.get("prompt_tokens_details") or {}
+        return int(usage["prompt_tokens"]), int(details.get("cached_tokens") or 0), None
+    return None
+
+
+def completion_tokens(data: dict) -> Optional[int]:
+    """Generated token count from `usage.completion_tokens` or llama.cpp `timings.predicted_n`"""
+    usage = data.get("usage") or {}
+    if usage.get("completion_tokens") is not None:
+        return int(usage["completion_tokens"])
+    timings = data.get("timings") or {}
+    if timings.get("predicted_n") is not None:
+        return int(timings["predicted_n"])
+    return None
+
+
+def answer_text(text: str) -> Optional[str]:
+    """
+    Return the part of an R1-style completion after the reasoning block.
+
+    Returns None while a `<think>` block is still open, so stop predicates
+    never fire on text the model is only reasoning about.
+    """
+    if "<think>" in text and "</think>" not in text:
+        return None
+    if "</think>" in text:
+        return text.rsplit("</think>", 1)[1]
+    return text
+
+
+def line_completed_after(label: str) -> Callable[[str], bool]:
+    """Predicate: the answer contains `label` followed by a non-empty, newline-terminated value"""
+    pattern = re.compile(rf"{re.escape(label)}\s*\S[^\n]*\n")
+
+    def _predicate(text: str) -> bool:
+        answer = answer_text(text)
+        return answer is not None and pattern.search(answer.replace("**", "")) is not None
+
+    _predicate.cache_token = f"line_completed_after:{label}"
+    return _predicate
+
+
+def word_after(label: str, words: List[str]) -> Callable[[str], bool]:
+    """Predicate: the answer contains `label` followed by one of `words`"""
+    pattern = re.compile(
+        rf"{re.escape(label)}\**:?\s*\**\s*({'|'.join(map(re.escape, words))})\b",
+        re.IGNORECASE,
+    )
+
+    def _predicate(text: str) -> bool:
+        answer = answer_text(text)
+        return answer is not None and pattern.search(answer) is not None
+
+    _predicate.cache_token = f"word_after:{label}:{'|'.join(words)}"
+    return _predicate
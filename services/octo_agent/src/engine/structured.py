@@ -0,0 +1,47 @@
+"""
+Structured output helpers
+Turn pydantic response models into JSON-schema constraints for the llama.cpp
+server and parse constrained replies straight back into the model.
+"""
+
+import re
+from typing import Any, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL)
+
+
+def is_response_model(response_format: Any) -> bool:
+    return isinstance(response_format, type) and issubclass(response_format, BaseModel)
+
+
+def response_format_payload(model: Type[BaseModel]) -> dict:
+    """OpenAI-style `response_format` entry; llama.cpp compiles the schema into a grammar"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": model.__name__,
+            "schema": model.model_json_schema(),
+            "strict": True,
+        },
+    }
+
+
+def parse_structured(text: str, model: Type[BaseModel]) -> Optional[BaseModel]:
+    """
+    Validate a constrained reply against `model`.
+
+    Tolerates a leading reasoning block and markdown fences; returns None when
+    the reply does not validate so callers can fall back to text parsing.
+    """
+    if "</think>" in text:
+        text = text.rsplit("</think>", 1)[1]
+    text = text.strip()
+    fenced = _FENCE_RE.match(text)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        return model.model_validate_json(text)
+    except ValidationError:
+        return None
@@ -0,0 +1,135 @@
+"""
+Per-call LLM telemetry
+Every engine call produces one CallRecord that is sent to the engine's sinks and
+to any collectors active in the calling context (e.g. the rollup of one solve).
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class CallRecord:
+    """Tokens, latency and attribution of a single engine call"""
+    call_site: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    latency_s: float = 0.0
+    ttft_s: Optional[float] = None
+    cache_hit: bool = False
+    streamed: bool = False
+    stop_reason: Optional[str] = None
+    error: Optional[str] = None
+    ts: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        record = asdict(self)
+        record["latency_s"] = round(self.latency_s, 4)
+        if self.ttft_s is not None:
+            record["ttft_s"] = round(self.ttft_s, 4)
+        return record
+
+
+class TelemetrySink(ABC):
+    """Destination for call records; subclasses implement `emit`"""
+
+    @abstractmethod
+    def emit(self, record: CallRecord) -> None:
+        pass
+
+    def close(self) -> None:  # noqa: B027 - optional hook, most sinks hold nothing to release
+        """Release whatever the sink holds; a no-op unless overridden"""
+
+
+class JsonlSink(TelemetrySink):
+    """Appends one JSON line per call to `path`"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def emit(self, record: CallRecord) -> None:
+        line = json.dumps(record.to_dict())
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class TelemetryAggregator(TelemetrySink):
+    """In-memory sink that keeps the records and rolls them up per call site"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: List[CallRecord] = []
+
+    def emit(self, record: CallRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def rollup(self) -> Dict[str, dict]:
+        """Per-call-site totals plus a "total" entry"""
+        with self._lock:
+            records = list(self.records)
+        sites: Dict[str, dict] = {}
+        for record in records:
+            for key in (record.call_site, "total"):
+                entry = sites.setdefault(key, {
+                    "calls": 0,
+                    "cache_hits": 0,
+                    "errors": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cached_prompt_tokens": 0,
+                    "latency_s": 0.0,
+                    "_ttfts": [],
+                })
+                entry["calls"] += 1
+                entry["cache_hits"] += int(record.cache_hit)
+                entry["errors"] += int(record.error is not None)
+                entry["prompt_tokens"] += record.prompt_tokens
+                entry["completion_tokens"] += record.completion_tokens
+                entry["cached_prompt_tokens"] += record.cached_prompt_tokens
+                entry["latency_s"] += record.latency_s
+                if record.ttft_s is not None:
+                    entry["_ttfts"].append(record.ttft_s)
+        for entry in sites.values():
+            ttfts = entry.pop("_ttfts")
+            entry["latency_s"] = round(entry["latency_s"], 3)
+            entry["mean_latency_s"] = round(entry["latency_s"] / entry["calls"], 3)
+            entry["mean_ttft_s"] = round(sum(ttfts) / len(ttfts), 3) if ttfts else None
+        return sites
+
+
+# Collectors active in the current context; contextvars keep concurrent solves apart
+_collectors: contextvars.ContextVar[Tuple[TelemetrySink, ...]] = contextvars.ContextVar("llm_telemetry_collectors", default=())
+
+
+@contextlib.contextmanager
+def collect_telemetry(sink: Optional[TelemetrySink] = None) -> Iterator[TelemetrySink]:
+    """Route records of every engine call made in this context (and nested ones) to `sink`"""
+    sink = sink if sink is not None else TelemetryAggregator()
+    token = _collectors.set(_collectors.get() + (sink,))
+    try:
+        yield sink
+    finally:
+        _collectors.reset(token)
+
+
+def emit_record(record: CallRecord, sinks: Tuple[TelemetrySink, ...] = ()) -> None:
+    """Send `record` to `sinks` and the context's collectors; a failing sink never fails the call"""
+    for sink in tuple(sinks) + _collectors.get():
+        try:
+            sink.emit(record)
+        except Exception as e:
+            print(f"Telemetry sink {type(sink).__name__} failed: {e}")
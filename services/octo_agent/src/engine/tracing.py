@@ -0,0 +1,200 @@
+"""
+Structured span tracing
+`span(name, **attributes)` times a block as a child of the span open in the calling
+context. Spans are only recorded while a Tracer is active (`trace_spans`); otherwise
+`span` returns a shared no-op, so instrumented code costs one ContextVar lookup.
+Recorded traces export to Chrome trace / Perfetto JSON and to flat JSONL.
+"""
+
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+@dataclass
+class SpanRecord:
+    """One finished span; times are seconds since the tracer started"""
+    name: str
+    span_id: int
+    parent_id: Optional[int]
+    start_s: float
+    duration_s: float
+    thread: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        record = asdict(self)
+        record["start_s"] = round(self.start_s, 6)
+        record["duration_s"] = round(self.duration_s, 6)
+        return record
+
+
+class Tracer:
+    """Collects the spans of one run; safe to share between the threads of that run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._origin = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[SpanRecord] = []
+
+    def _next_id(self) -> int:
+        return next(self._ids)
+
+    def _record(self, record: SpanRecord) -> None:
+        with self._lock:
+            self.spans.append(record)
+
+    def records(self) -> List[SpanRecord]:
+        """Finished spans in start order"""
+        with self._lock:
+            return sorted(self.spans, key=lambda record: record.start_s)
+
+    def summary(self) -> Dict[str, dict]:
+        """Count, total and max duration per span name"""
+        names: Dict[str, dict] = {}
+        for record in self.records():
+            entry = names.setdefault(record.name, {"count": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["total_s"] += record.duration_s
+            entry["max_s"] = max(entry["max_s"], record.duration_s)
+            entry["errors"] += int(record.error is not None)
+        for entry in names.values():
+            entry["total_s"] = round(entry["total_s"], 4)
+            entry["max_s"] = round(entry["max_s"], 4)
+        return names
+
+    def chrome_trace(self) -> dict:
+        """The spans as Chrome trace events ("X" complete events, one track per thread)"""
+        records = self.records()
+        tids: Dict[str, int] = {}
+        events = []
+        for record in records:
+            tid = tids.setdefault(record.thread, len(tids) + 1)
+            args = dict(record.attributes)
+            if record.error is not None:
+                args["error"] = record.error
+            events.append({
+                "name": record.name,
+                "ph": "X",
+                "ts": round(record.start_s * 1e6, 3),
+                "dur": round(record.duration_s * 1e6, 3),
+                "pid": 1,
+                "tid": tid,
+                "args": args,
+            })
+        for thread, tid in tids.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": thread}})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"started_at": self.started_at}}
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Write a trace that chrome://tracing and ui.perfetto.dev open directly"""
+        _makedirs_for(path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, default=str)
+
+    def write_jsonl(self, path: str) -> None:
+        """Write one JSON line per span (flat, with parent ids) for scripted comparisons of runs"""
+        _makedirs_for(path)
+        with open(path, "w", encoding="utf-8") as f:
+            for record in self.records():
+                f.write(json.dumps(record.to_dict(), default=str) + "\n")
+
+
+def _makedirs_for(path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+class _NoopSpan:
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+# Tracer and innermost open span of the current context; copied into worker threads
+# together with the rest of the context
+_tracer: contextvars.ContextVar[Optional[Tracer]] = contextvars.ContextVar("span_tracer", default=None)
+_parent: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("span_parent", default=None)
+
+
+class Span:
+    """An open span; `set` adds attributes known only once the work is done (tokens, cache hit)"""
+
+    def __init__(self, tracer: Tracer, name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = tracer._next_id()
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self._parent_id = _parent.get()
+        self._token = _parent.set(self.span_id)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter()
+        _parent.reset(self._token)
+        self.tracer._record(SpanRecord(
+            name=self.name,
+            span_id=self.span_id,
+            parent_id=self._parent_id,
+            start_s=self._start - self.tracer._origin,
+            duration_s=end - self._start,
+            thread=threading.current_thread().name,
+            attributes=self.attributes,
+            error=f"{exc_type.__name__}: {exc}" if exc_type is not None else None,
+        ))
+
+
+def span(name: str, **attributes: Any):
+    """Context manager timing a block as span `name`; a no-op unless a tracer is active"""
+    tracer = _tracer.get()
+    if tracer is None:
+        return _NOOP_SPAN
+    return Span(tracer, name, attributes)
+
+
+def traced(name: str) -> Callable:
+    """Decorator running every call of the function inside span `name`"""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def trace_spans(tracer: Optional[Tracer] = None) -> Iterator[Tracer]:
+    """Record the spans of this context (and of threads started with a copy of it) in `tracer`"""
+    tracer = tracer if tracer is not None else Tracer()
+    tracer_token = _tracer.set(tracer)
+    parent_token = _parent.set(None)
+    try:
+        yield tracer
+    finally:
+        _parent.reset(parent_token)
+        _tracer.reset(tracer_token)
@@ -1,3 +1,6 @@
+import math
+
+
 def is_jpeg(data: bytes) -> bool:
     jpeg_signature = b"\xFF\xD8\xFF"
     return data.startswith(jpeg_signature)
@@ -26,3 +29,8 @@ def get_file_type_from_bytes(data: bytes) -> str:
     if is_png(data):
         return "png"
     raise ValueError("File type not supported, only pdf, jpeg and png supported.")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used when no tokenizer endpoint is reachable"""
+    return math.ceil(len(text) / 4) if text else 0
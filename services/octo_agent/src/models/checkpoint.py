@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from models.utils import make_json_serializable
+
+
+class Checkpoint:
+    """
+    Progress of one solve in `<query_cache_dir>/checkpoint.json`, rewritten atomically after
+    every stage: base response, query analysis, each step's sub-goals, each action's command and
+    result, each verification verdict, and the final/direct outputs.
+
+    With `resume`, a checkpoint of the same query is loaded and its stages are replayed instead
+    of being run again; a checkpoint of another query is ignored and overwritten.
+    """
+
+    FILENAME = "checkpoint.json"
+
+    @staticmethod
+    def directory_for(root_cache_dir: str, question: str, image_path: Optional[str]) -> str:
+        """Directory under `root_cache_dir` keyed by the query, for solves without their own cache dir"""
+        key = hashlib.sha1(json.dumps([question, image_path]).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(root_cache_dir, "checkpoints", key)
+
+    def __init__(self, query_cache_dir: str, question: str, image_path: Optional[str], resume: bool = False):
+        os.makedirs(query_cache_dir, exist_ok=True)
+        self.path = os.path.join(query_cache_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.state: Dict[str, Any] = {"query": question, "image": image_path, "stages": {}, "steps": []}
+        self.resumed = False
+        if resume and os.path.isfile(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                saved = None
+            if saved and saved.get("query") == question and saved.get("image") == image_path:
+                self.state = saved
+                self.resumed = True
+
+    def _save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+    def stage(self, name: str) -> Optional[Any]:
+        """Saved value of a finished stage, or None"""
+        with self._lock:
+            value = self.state["stages"].get(name)
+            if value is not None:
+                self.reused += 1
+            return value
+
+    def set_stage(self, name: str, value: Any) -> None:
+        with self._lock:
+            self.state["stages"][name] = make_json_serializable(value)
+            self._save()
+
+    def step(self, step_count: int) -> Dict[str, Any]:
+        """The record of step `step_count` (1-based): sub-goals, outcomes by index, verification"""
+        with self._lock:
+            steps: List[Dict[str, Any]] = self.state["steps"]
+            while len(steps) < step_count:
+                steps.append({"subgoals": None, "outcomes": {}, "verification": None})
+            return steps[step_count - 1]
+
+    def reuse(self, value: Any) -> Any:
+        """Count a replayed value of a step record"""
+        if value is not None:
+            with self._lock:
+                self.reused += 1
+        return value
+
+    def update_step(self, step_count: int, **fields: Any) -> None:
+        record = self.step(step_count)
+        with self._lock:
+            record.update(make_json_serializable(fields))
+            self._save()
+
+    def set_outcome(self, step_count: int, index: int, command: Any, result: Any) -> None:
+        record = self.step(step_count)
+        with self._lock:
+            record["outcomes"][str(index)] = make_json_serializable([command, result])
+            self._save()
+
+    def report(self) -> Dict[str, Any]:
+        return {"path": self.path, "resumed": self.resumed, "reused_stages": self.reused}
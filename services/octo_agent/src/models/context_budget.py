@@ -0,0 +1,156 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from engine.utils import estimate_tokens
+from models.utils import make_json_serializable
+
+# Token budget for the memory section of each planner call site
+DEFAULT_BUDGETS: Dict[str, int] = {
+    "next_step": 6000,
+    "verify": 6000,
+    "final": 12000,
+    "direct": 12000,
+}
+
+
+def _as_text(result: Any) -> str:
+    return result if isinstance(result, str) else str(make_json_serializable(result))
+
+
+def _key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ContextBudget:
+    """
+    Keeps planner prompts inside a per-call-site token budget.
+
+    Recent steps are rendered verbatim; older steps, and any result larger than
+    `max_result_tokens`, are replaced by a (cached) summary or a head/tail excerpt.
+    If the memory still does not fit, the oldest results are reduced to a stub.
+
+    With the gateway tokenizer every count is an HTTP round trip, so each text is
+    counted once: actions are counted one by one and the memory section's count is
+    their sum, updated as results are stubbed instead of re-counting the section.
+    """
+
+    MAX_TOKEN_COUNTS = 4096
+
+    def __init__(
+        self,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        budgets: Optional[Dict[str, int]] = None,
+        keep_recent: int = 2,
+        max_result_tokens: int = 2000,
+        excerpt_tokens: int = 300,
+        summarizer: Optional[Callable[[str], str]] = None,
+    ):
+        self.count_tokens = count_tokens or estimate_tokens
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.keep_recent = keep_recent
+        self.max_result_tokens = max_result_tokens
+        self.excerpt_tokens = excerpt_tokens
+        self.summarizer = summarizer
+        self._lock = threading.Lock()
+        self._summaries: Dict[str, str] = {}
+        self._token_counts: "OrderedDict[str, int]" = OrderedDict()
+        self.usage: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = _key(text)
+        with self._lock:
+            if key in self._token_counts:
+                self._token_counts.move_to_end(key)
+                return self._token_counts[key]
+        count = self.count_tokens(text)
+        self._remember(key, count)
+        return count
+
+    def _remember(self, key: str, count: int) -> None:
+        with self._lock:
+            self._token_counts[key] = count
+            self._token_counts.move_to_end(key)
+            while len(self._token_counts) > self.MAX_TOKEN_COUNTS:
+                self._token_counts.popitem(last=False)
+
+    def _compact(self, result: Any) -> str:
+        text = _as_text(result)
+        key = _key(text)
+        with self._lock:
+            if key in self._summaries:
+                return self._summaries[key]
+
+        if self.summarizer is not None:
+            compacted = f"[summary] {self.summarizer(text)}"
+        else:
+            # Character budget derived from the measured chars/token ratio of this text
+            tokens = max(self._count(text), 1)
+            keep_chars = max(int(len(text) * self.excerpt_tokens / tokens), 1)
+            head, tail = text[: keep_chars // 2], text[-(keep_chars // 2):]
+            compacted = f"[excerpt of {tokens} tokens] {head} ... {tail}"
+
+        with self._lock:
+            self._summaries[key] = compacted
+        return compacted
+
+    def _stub(self, result: Any) -> str:
+        return f"[result omitted to fit the context budget: {self._count(_as_text(result))} tokens]"
+
+    def render_actions(self, actions: Dict[str, Dict[str, Any]], call_site: str) -> str:
+        """Render memory actions for `call_site`, compacted to fit its budget"""
+        budget = self.budgets.get(call_site)
+        names = list(actions)
+        recent = set(names[-self.keep_recent:]) if self.keep_recent > 0 else set()
+
+        rendered: Dict[str, Dict[str, Any]] = {}
+        tokens: Dict[str, int] = {}
+        for name in names:
+            action = dict(actions[name])
+            result = action.get("result")
+            result_tokens = self._count(_as_text(result))
+            if (name not in recent or result_tokens > self.max_result_tokens) and result_tokens > self.excerpt_tokens:
+                action["result"] = self._compact(result)
+            rendered[name] = action
+            tokens[name] = self._count(str({name: action}))
+
+        total = sum(tokens.values())
+        if budget is not None:
+            # Oldest first, reduce results to stubs until the section fits
+            for name in names:
+                if total <= budget:
+                    break
+                rendered[name] = {**rendered[name], "result": self._stub(actions[name].get("result"))}
+                stubbed = self._count(str({name: rendered[name]}))
+                total += stubbed - tokens[name]
+                tokens[name] = stubbed
+        text = str(rendered)
+        # `record` counts this section again; it gets the sum instead of a round trip
+        self._remember(_key(text), total)
+        return text
+
+    def record(self, call_site: str, prompt: str, sections: Dict[str, str]) -> Dict[str, int]:
+        """
+        Count tokens per prompt section and keep the latest breakdown per call site.
+
+        `other` is whatever part of the prompt is not covered by `sections`
+        (instructions, examples, labels); it is counted on its own and `total` is
+        the sum, so the whole prompt is never sent to the tokenizer.
+        """
+        usage = {name: self._count(text) for name, text in sections.items()}
+        scaffold = prompt
+        for text in sections.values():
+            if text:
+                scaffold = scaffold.replace(text, "", 1)
+        usage["other"] = self._count(scaffold)
+        usage["total"] = sum(usage.values())
+        with self._lock:
+            self.usage[call_site] = usage
+        return usage
+
+    def usage_report(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {site: dict(usage) for site, usage in self.usage.items()}
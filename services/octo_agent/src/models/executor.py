@@ -1,13 +1,18 @@
+import contextvars
 import importlib
 import json
 import os
 import re
 import signal
+import threading
+import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Union
 
 from engine.factory import create_llm_engine
+from engine.tracing import span, traced
 from models.formatters import ToolCommand
+from models.utils import stable_dumps
 
 try:
     TimeoutError
@@ -19,8 +24,10 @@ def timeout_handler(signum, frame):
     raise TimeoutError("Function execution timed out")
 
 class Executor:
-    def __init__(self, llm_engine_name: str, root_cache_dir: str = "solver_cache",  num_threads: int = 1, max_time: int = 120, max_output_length: int = 100000, verbose: bool = False):
+    def __init__(self, llm_engine_name: str, root_cache_dir: str = "solver_cache",  num_threads: int = 1, max_time: int = 120, max_output_length: int = 100000, verbose: bool = False, use_cache: bool = False, temperature: float = 0.7, vision: bool = False, reasoning_budgets: Optional[Dict[str, int]] = None, reasoning_trace_path: Optional[str] = None, structured_output: Union[bool, Sequence[str]] = False):
         self.llm_engine_name = llm_engine_name
+        # Same configuration as the Planner's engine, so the registry returns the shared instance
+        self.llm_engine = create_llm_engine(model_string=llm_engine_name, is_multimodal=vision, use_cache=use_cache, temperature=temperature, reasoning_budgets=reasoning_budgets, reasoning_trace_path=reasoning_trace_path, structured_output=structured_output)
         self.root_cache_dir = root_cache_dir
         self.num_threads = num_threads
         self.max_time = max_time
@@ -31,21 +38,18 @@ class Executor:
         if query_cache_dir:
             self.query_cache_dir = query_cache_dir
         else:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.query_cache_dir = os.path.join(self.root_cache_dir, timestamp)
+            # Concurrent solves start within the same second; the suffix keeps their dirs apart
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            self.query_cache_dir = os.path.join(self.root_cache_dir, f"{timestamp}_{uuid.uuid4().hex[:8]}")
         os.makedirs(self.query_cache_dir, exist_ok=True)
 
+    @traced("executor.tool_command")
     def generate_tool_command(self, question: str, image: str, context: str, sub_goal: str, tool_name: str, tool_metadata: Dict[str, Any]) -> Any:
+        # Static instructions and examples first, then the selected tool, then per-call content,
+        # so consecutive calls share the longest possible KV prefix on the llama.cpp server.
         prompt_generate_tool_command = f"""
 Task: Generate a precise command to execute the selected tool based on the given information.
 
-Query: {question}
-Image: {image}
-Context: {context}
-Sub-Goal: {sub_goal}
-Selected Tool: {tool_name}
-Tool Metadata: {tool_metadata}
-
 Instructions:
 1. Carefully review all provided information: the query, image path, context, sub-goal, selected tool, and tool metadata.
 2. Analyze the tool's input_types from the metadata to understand required and optional parameters.
@@ -135,10 +139,18 @@ execution = tool.execute(url=urls[1])
 ```
 Reason: The command should process multiple items in a single execution, not separate executions for each item.
 
+Selected Tool: {tool_name}
+Tool Metadata:
+{stable_dumps(tool_metadata)}
+
+Query: {question}
+Image: {image}
+Context: {context}
+Sub-Goal: {sub_goal}
+
 Remember: Your response MUST end with the Generated Command, which should be valid Python code including any necessary data preparation steps and one or more `execution = tool.execute(` calls, without any additional explanatory text. The format `execution = tool.execute` must be strictly followed, and the last line must begin with `execution = tool.execute` to capture the final output."""
 
-        llm_generate_tool_command = create_llm_engine(model_string=self.llm_engine_name, is_multimodal=False)
-        tool_command = llm_generate_tool_command(prompt_generate_tool_command, response_format=ToolCommand)
+        tool_command = self.llm_engine(prompt_generate_tool_command, response_format=ToolCommand, call_site="tool_command")
 
         return tool_command
 
@@ -196,6 +208,9 @@ Remember: Your response MUST end with the Generated Command, which should be val
             return [block.strip() for block in blocks if block.strip()]
 
         def execute_with_timeout(block: str, local_context: dict) -> Optional[str]:
+            if threading.current_thread() is not threading.main_thread():
+                return execute_in_thread(block, local_context)
+
             # Set up the timeout handler
             signal.signal(signal.SIGALRM, timeout_handler)
             signal.alarm(self.max_time)
@@ -211,6 +226,28 @@ Remember: Your response MUST end with the Generated Command, which should be val
             finally:
                 signal.alarm(0)  # Ensure alarm is disabled even if other exceptions occur
 
+        def execute_in_thread(block: str, local_context: dict) -> Optional[str]:
+            # SIGALRM only works on the main thread (batch workers are not); a timed-out
+            # block is abandoned in its daemon thread instead of being interrupted
+            outcome = {}
+
+            def run():
+                try:
+                    exec(block, globals(), local_context)
+                    outcome['result'] = local_context.get('execution')
+                except BaseException as e:
+                    outcome['error'] = e
+
+            # A copy of the context keeps the tool's spans and LLM calls attributed to this solve
+            worker = threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True)
+            worker.start()
+            worker.join(self.max_time)
+            if worker.is_alive():
+                return f"Execution timed out after {self.max_time} seconds"
+            if 'error' in outcome:
+                raise outcome['error']
+            return outcome.get('result')
+
         # Import the tool module and instantiate it
         module_name = f"tools.{tool_name.lower().replace('_tool', '')}.tool"
 
@@ -243,7 +280,8 @@ Remember: Your response MUST end with the Generated Command, which should be val
                 local_context = {'tool': tool}
 
                 # Execute the block with timeout protection
-                result = execute_with_timeout(block, local_context)
+                with span("tool.execute", tool=tool_name):
+                    result = execute_with_timeout(block, local_context)
 
                 if result is not None:
                     executions.append(result)
@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel
 
 # Planner: QueryAnalysis
@@ -28,6 +30,16 @@ class NextStep(BaseModel):
     sub_goal: str
     tool_name: str
 
+# Planner: ParallelNextStep (independent sub-goals run concurrently as one step)
+class SubGoal(BaseModel):
+    context: str
+    sub_goal: str
+    tool_name: str
+
+class ParallelNextStep(BaseModel):
+    justification: str
+    sub_goals: List[SubGoal]
+
 # Executor: MemoryVerification
 class MemoryVerification(BaseModel):
     analysis: str
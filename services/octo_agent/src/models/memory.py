@@ -72,6 +72,20 @@ class Memory:
         step_name = f"Action Step {step_count}"
         self.actions[step_name] = action
 
+    def add_actions(self, step_count: int, actions: List[tuple]) -> None:
+        """Record one step's (tool_name, sub_goal, command, result) actions; the independent
+        sub-goals of a parallel step become Action Step N.1, N.2, ..."""
+        if len(actions) == 1:
+            self.add_action(step_count, *actions[0])
+            return
+        for index, (tool_name, sub_goal, command, result) in enumerate(actions, start=1):
+            self.actions[f"Action Step {step_count}.{index}"] = {
+                'tool_name': tool_name,
+                'sub_goal': sub_goal,
+                'command': command,
+                'result': result,
+            }
+
     def get_query(self) -> Optional[str]:
         return self.query
 
@@ -1,68 +1,94 @@
+import copy
 import json
-import os
 import re
-from typing import Any, Dict, List, Tuple
-
-from PIL import Image
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
+from engine.assets import InputAsset
 from engine.factory import create_llm_engine
-from models.formatters import MemoryVerification, NextStep, QueryAnalysis
+from engine.streaming import line_completed_after, word_after
+from engine.tracing import traced
+from models.context_budget import ContextBudget
+from models.formatters import MemoryVerification, NextStep, ParallelNextStep, QueryAnalysis
 from models.memory import Memory
+from models.utils import stable_dumps
+
+# Early-stop predicates: the answer is complete once these fields have been emitted
+NEXT_STEP_COMPLETE = line_completed_after("Tool Name:")
+VERIFICATION_COMPLETE = word_after("Conclusion", ["STOP", "CONTINUE"])
 
 
 class Planner:
-    def __init__(self, llm_engine_name: str, toolbox_metadata: dict = None, available_tools: List = None, verbose: bool = False):
+    def __init__(self, llm_engine_name: str, toolbox_metadata: dict = None, available_tools: List = None, verbose: bool = False, use_cache: bool = False, temperature: float = 0.7, context_budgets: Optional[Dict[str, int]] = None, vision: bool = False, max_image_side: Optional[int] = None, reasoning_budgets: Optional[Dict[str, int]] = None, reasoning_trace_path: Optional[str] = None, structured_output: Union[bool, Sequence[str]] = False):
         self.llm_engine_name = llm_engine_name
-        self.llm_engine_mm = create_llm_engine(model_string=llm_engine_name, is_multimodal=True)
-        self.llm_engine = create_llm_engine(model_string=llm_engine_name, is_multimodal=False)
+        # One shared engine serves both text-only and multimodal prompts; `vision` decides
+        # whether input images are sent as image content parts (the default R1 distill is text-only)
+        # Replies come back without their <think> block; reasoning is budgeted per call site
+        self.llm_engine_mm = create_llm_engine(model_string=llm_engine_name, is_multimodal=vision, use_cache=use_cache, temperature=temperature, reasoning_budgets=reasoning_budgets, reasoning_trace_path=reasoning_trace_path, structured_output=structured_output)
+        self.llm_engine = self.llm_engine_mm
         self.toolbox_metadata = toolbox_metadata if toolbox_metadata is not None else {}
         self.available_tools = available_tools if available_tools is not None else []
         self.verbose = verbose
+        self.max_image_side = max_image_side
+        self.input_asset: Optional[InputAsset] = None
+        # Byte-stable tool catalog shared as the leading prompt section by every tool-aware call
+        # site, so llama.cpp can reuse its KV prefix (--cache-reuse / --cache-ram) across calls.
+        self.tools_prefix = f"""Available Tools: {stable_dumps(sorted(self.available_tools))}
+
+Tool Metadata:
+{stable_dumps(self.toolbox_metadata)}
+"""
+        # Token-aware compaction of memory in prompts, counted with the served model's tokenizer
+        self.context_budget = ContextBudget(
+            count_tokens=getattr(self.llm_engine, "count_tokens", None),
+            budgets=context_budgets,
+        )
+
+    def fork(self) -> "Planner":
+        """A planner for a concurrent solve: shares engines and compaction summaries, owns its input and usage report"""
+        forked = copy.copy(self)
+        forked.input_asset = None
+        forked.context_budget = copy.copy(self.context_budget)
+        forked.context_budget.usage = {}
+        return forked
+
+    def load_input_asset(self, image_path: Optional[str]) -> Optional[InputAsset]:
+        """Read, hash and measure the solve's input once; every later call reuses it"""
+        self.input_asset = InputAsset.load(image_path, max_side=self.max_image_side) if image_path else None
+        return self.input_asset
+
+    def _get_asset(self, image_path: Optional[str]) -> Optional[InputAsset]:
+        if not image_path:
+            return None
+        if self.input_asset is None or self.input_asset.path != image_path:
+            self.load_input_asset(image_path)
+        return self.input_asset
+
     def get_image_info(self, image_path: str) -> Dict[str, Any]:
-        image_info = {}
-        if image_path and os.path.isfile(image_path):
-            image_info["image_path"] = image_path
-            try:
-                with Image.open(image_path) as img:
-                    width, height = img.size
-                image_info.update({
-                    "width": width,
-                    "height": height
-                })
-            except Exception as e:
-                print(f"Error processing image file: {str(e)}")
-        return image_info
+        asset = self._get_asset(image_path)
+        return asset.info() if asset is not None else {}
 
-    def generate_base_response(self, question: str, image: str, max_tokens: str = 4000) -> str:
-        image_info = self.get_image_info(image)
+    def _build_input(self, prompt: str, image_path: Optional[str]) -> list:
+        input_data = [prompt]
+        asset = self._get_asset(image_path)
+        if asset is not None:
+            input_data.append(asset)
+        return input_data
 
-        input_data = [question]
-        if image_info and "image_path" in image_info:
-            try:
-                with open(image_info["image_path"], 'rb') as file:
-                    image_bytes = file.read()
-                input_data.append(image_bytes)
-            except Exception as e:
-                print(f"Error reading image file: {str(e)}")
+    @traced("planner.base_response")
+    def generate_base_response(self, question: str, image: str, max_tokens: str = 4000) -> str:
+        input_data = self._build_input(question, image)
 
-        self.base_response = self.llm_engine_mm(input_data, max_tokens=max_tokens)
+        self.base_response = self.llm_engine_mm(input_data, max_tokens=max_tokens, call_site="base")
 
         return self.base_response
 
+    @traced("planner.analyze_query")
     def analyze_query(self, question: str, image: str) -> str:
         image_info = self.get_image_info(image)
 
-        query_prompt = f"""
+        query_prompt = f"""{self.tools_prefix}
 Task: Analyze the given query with accompanying inputs and determine the skills and tools needed to address it effectively.
 
-Available tools: {self.available_tools}
-
-Metadata for the tools: {self.toolbox_metadata}
-
-Image: {image_info}
-
-Query: {question}
-
 Instructions:
 1. Carefully read and understand the query and any accompanying inputs.
 2. Identify the main objectives or tasks within the query.
@@ -77,22 +103,27 @@ Your response should include:
 4. Any additional considerations that might be important for addressing the query effectively.
 
 Please present your analysis in a clear, structured format.
+
+Image: {image_info}
+
+Query: {question}
 """
 
-        input_data = [query_prompt]
-        if image_info:
-            try:
-                with open(image_info["image_path"], 'rb') as file:
-                    image_bytes = file.read()
-                input_data.append(image_bytes)
-            except Exception as e:
-                print(f"Error reading image file: {str(e)}")
+        input_data = self._build_input(query_prompt, image)
 
-        print(input_data)
-        self.query_analysis = self.llm_engine_mm(input_data, response_format=QueryAnalysis)
+        self.query_analysis = self.llm_engine_mm(input_data, response_format=QueryAnalysis, call_site="analyze_query")
 
         return str(self.query_analysis).strip()
 
+    def _record_prompt_usage(self, call_site: str, prompt: str, query_analysis: str, memory_text: str) -> None:
+        usage = self.context_budget.record(call_site, prompt, {
+            "tools": self.tools_prefix if prompt.startswith(self.tools_prefix) else "",
+            "query_analysis": query_analysis or "",
+            "memory": memory_text,
+        })
+        if self.verbose:
+            print(f"[Prompt tokens] {call_site}: {usage}")
+
     def extract_context_subgoal_and_tool(self, response: Any) -> Tuple[str, str, str]:
 
         def normalize_tool_name(tool_name: str) -> str:
@@ -136,27 +167,37 @@ Please present your analysis in a clear, structured format.
 
         return context, sub_goal, tool_name
 
+    def extract_subgoals(self, response: Any, max_subgoals: int) -> List[Tuple[str, str, str]]:
+        """(context, sub_goal, tool_name) of every sub-goal in a parallel next-step reply, at most `max_subgoals`"""
+        if isinstance(response, str):
+            try:
+                response = ParallelNextStep(**json.loads(response))
+            except Exception as e:
+                print(f"Failed to parse response as JSON: {str(e)}")
+        if isinstance(response, ParallelNextStep):
+            raw = [(g.context, g.sub_goal, g.tool_name) for g in response.sub_goals]
+        elif isinstance(response, NextStep):
+            raw = [(response.context, response.sub_goal, response.tool_name)]
+        else:
+            text = str(response).replace("**", "")
+            pattern = r"Context:\s*(.*?)Sub-Goal:\s*(.*?)Tool Name:\s*(.*?)(?=\n\n|\nContext:|\Z)"
+            raw = re.findall(pattern, text, re.DOTALL)
+
+        subgoals = []
+        for context, sub_goal, tool_name in raw:
+            tool_name = tool_name.strip()
+            matched = next((tool for tool in self.available_tools if tool.lower() in tool_name.lower()), None)
+            subgoal = (context.strip(), sub_goal.strip(), matched or "No matched tool given: " + tool_name)
+            if subgoal not in subgoals:
+                subgoals.append(subgoal)
+        return subgoals[:max(1, max_subgoals)]
+
+    @traced("planner.next_step")
     def generate_next_step(self, question: str, image: str, query_analysis: str, memory: Memory, step_count: int, max_step_count: int) -> Any:
-        prompt_generate_next_step = f"""
+        memory_text = self.context_budget.render_actions(memory.get_actions(), "next_step")
+        prompt_generate_next_step = f"""{self.tools_prefix}
 Task: Determine the optimal next step to address the given query based on the provided analysis, available tools, and previous steps taken.
 
-Context:
-Query: {question}
-Image: {image}
-Query Analysis: {query_analysis}
-
-Available Tools:
-{self.available_tools}
-
-Tool Metadata:
-{self.toolbox_metadata}
-
-Previous Steps and Their Results:
-{memory.get_actions()}
-
-Current Step: {step_count} in {max_step_count} steps
-Remaining Steps: {max_step_count - step_count}
-
 Instructions:
 1. Analyze the context thoroughly, including the query, its analysis, any image, available tools and their metadata, and previous steps taken.
 
@@ -194,7 +235,7 @@ Rules:
 - Select only ONE tool for this step.
 - The sub-goal MUST directly address the query and be achievable by the selected tool.
 - The Context section MUST include ALL necessary information for the tool to function, including ALL relevant file paths, data, and variables from previous steps.
-- The tool name MUST exactly match one from the available tools list: {self.available_tools}.
+- The tool name MUST exactly match one from the Available Tools list above.
 - Avoid redundancy by considering previous steps and building on prior results.
 - Your response MUST conclude with the Context, Sub-Goal, and Tool Name sections IN THIS ORDER, presented ONLY ONCE.
 - Include NO content after these three sections.
@@ -205,24 +246,105 @@ Context: Image path: "example/image.jpg", Previous detection results: [list of o
 Sub-Goal: Detect and count the number of specific objects in the image "example/image.jpg"
 Tool Name: Object_Detector_Tool
 
+Context:
+Query: {question}
+Image: {image}
+Query Analysis: {query_analysis}
+
+Previous Steps and Their Results:
+{memory_text}
+
+Current Step: {step_count} in {max_step_count} steps
+Remaining Steps: {max_step_count - step_count}
+
 Remember: Your response MUST end with the Context, Sub-Goal, and Tool Name sections, with NO additional content afterwards.
 """
-        next_step = self.llm_engine(prompt_generate_next_step, response_format=NextStep)
+        self._record_prompt_usage("next_step", prompt_generate_next_step, query_analysis, memory_text)
+        next_step = self.llm_engine(prompt_generate_next_step, response_format=NextStep, stop_when=NEXT_STEP_COMPLETE, call_site="next_step")
         return next_step
 
-    def verificate_context(self, question: str, image: str, query_analysis: str, memory: Memory) -> Any:
-        image_info = self.get_image_info(image)
+    @traced("planner.next_step")
+    def generate_parallel_next_step(self, question: str, image: str, query_analysis: str, memory: Memory, step_count: int, max_step_count: int, max_subgoals: int) -> Any:
+        """Like `generate_next_step`, but the step may consist of up to `max_subgoals` independent sub-goals"""
+        memory_text = self.context_budget.render_actions(memory.get_actions(), "next_step")
+        prompt_generate_next_step = f"""{self.tools_prefix}
+Task: Determine the optimal next step to address the given query based on the provided analysis, available tools, and previous steps taken. A step may consist of several INDEPENDENT sub-goals that are executed at the same time.
 
-        prompt_memory_verification = f"""
-Task: Thoroughly evaluate the completeness and accuracy of the memory for fulfilling the given query, considering the potential need for additional tool usage.
+Instructions:
+1. Analyze the context thoroughly, including the query, its analysis, any image, available tools and their metadata, and previous steps taken.
+
+2. Determine the most appropriate next step by considering:
+   - Key objectives from the query analysis
+   - Capabilities of available tools
+   - Logical progression of problem-solving
+   - Outcomes from previous steps
+   - Current step count and remaining steps
+
+3. Split the step into up to {max_subgoals} sub-goals ONLY when they are independent: no sub-goal may need the result of another sub-goal of the same step (e.g. OCR of several different files, or memory queries for several different concepts). If the work is sequential, return exactly ONE sub-goal.
+
+4. For each sub-goal, select ONE tool and formulate a specific, achievable objective for it.
+
+Response Format:
+Your response MUST follow this structure:
+1. Justification: Explain your choice in detail, including why the sub-goals are independent.
+2. One block per sub-goal, each with the following format:
+
+Context: <context>
+Sub-Goal: <sub_goal>
+Tool Name: <tool_name>
+
+Where:
+- <context> MUST include ALL necessary information for the tool to function, structured as follows:
+  * Relevant data from previous steps
+  * File names or paths created or used in previous steps (list EACH ONE individually)
+  * Variable names and their values from previous steps' results
+  * Any other context-specific information required by the tool
+- <sub_goal> is a specific, achievable objective for the tool, based on its metadata and previous outcomes.
+It MUST contain any involved data, file names, and variables from Previous Steps and Their Results that the tool can act upon.
+- <tool_name> MUST be the exact name of a tool from the available tools list.
+
+Rules:
+- At most {max_subgoals} sub-goals, each with exactly ONE tool.
+- Sub-goals of the same step MUST NOT depend on each other's results.
+- Each Context section MUST include ALL necessary information for its tool to function, including ALL relevant file paths, data, and variables from previous steps.
+- Each tool name MUST exactly match one from the Available Tools list above.
+- Avoid redundancy by considering previous steps and building on prior results.
+- Include NO content after the last sub-goal block.
+
+Example (do not copy, use only as reference):
+Justification: [Your detailed explanation here]
+Context: Document path: "papers/a.pdf"
+Sub-Goal: Extract the text of "papers/a.pdf"
+Tool Name: Document_Parser_OCR_Tool
+
+Context: Document path: "papers/b.pdf"
+Sub-Goal: Extract the text of "papers/b.pdf"
+Tool Name: Document_Parser_OCR_Tool
 
 Context:
 Query: {question}
-Image: {image_info}
-Available Tools: {self.available_tools}
-Toolbox Metadata: {self.toolbox_metadata}
-Initial Analysis: {query_analysis}
-Memory (tools used and results): {memory.get_actions()}
+Image: {image}
+Query Analysis: {query_analysis}
+
+Previous Steps and Their Results:
+{memory_text}
+
+Current Step: {step_count} in {max_step_count} steps
+Remaining Steps: {max_step_count - step_count}
+
+Remember: Your response MUST end with the sub-goal blocks, with NO additional content afterwards.
+"""
+        self._record_prompt_usage("next_step", prompt_generate_next_step, query_analysis, memory_text)
+        # No early stop: the reply is only complete after its last sub-goal
+        return self.llm_engine(prompt_generate_next_step, response_format=ParallelNextStep, call_site="next_step")
+
+    @traced("planner.verify")
+    def verificate_context(self, question: str, image: str, query_analysis: str, memory: Memory) -> Any:
+        image_info = self.get_image_info(image)
+        memory_text = self.context_budget.render_actions(memory.get_actions(), "verify")
+
+        prompt_memory_verification = f"""{self.tools_prefix}
+Task: Thoroughly evaluate the completeness and accuracy of the memory for fulfilling the given query, considering the potential need for additional tool usage.
 
 Detailed Instructions:
 1. Carefully analyze the query, initial analysis, and image (if provided):
@@ -272,19 +394,19 @@ Explanation:
 
 Conclusion: CONTINUE
 
+Context:
+Query: {question}
+Image: {image_info}
+Initial Analysis: {query_analysis}
+Memory (tools used and results): {memory_text}
+
 IMPORTANT: Your response MUST end with either 'Conclusion: STOP' or 'Conclusion: CONTINUE' and nothing else. Ensure your explanation thoroughly justifies this conclusion.
 """
 
-        input_data = [prompt_memory_verification]
-        if image_info:
-            try:
-                with open(image_info["image_path"], 'rb') as file:
-                    image_bytes = file.read()
-                input_data.append(image_bytes)
-            except Exception as e:
-                print(f"Error reading image file: {str(e)}")
+        self._record_prompt_usage("verify", prompt_memory_verification, query_analysis, memory_text)
+        input_data = self._build_input(prompt_memory_verification, image)
 
-        stop_verification = self.llm_engine_mm(input_data, response_format=MemoryVerification)
+        stop_verification = self.llm_engine_mm(input_data, response_format=MemoryVerification, stop_when=VERIFICATION_COMPLETE, call_site="verify")
 
         return stop_verification
 
@@ -325,18 +447,14 @@ IMPORTANT: Your response MUST end with either 'Conclusion: STOP' or 'Conclusion:
                 print("No valid conclusion (STOP or CONTINUE) found in the response. Continuing...")
                 return analysis, 'CONTINUE'
 
+    @traced("planner.final_output")
     def generate_final_output(self, question: str, image: str, memory: Memory) -> str:
         image_info = self.get_image_info(image)
+        memory_text = self.context_budget.render_actions(memory.get_actions(), "final")
 
         prompt_generate_final_output = f"""
 Task: Generate the final output based on the query, image, and tools used in the process.
 
-Context:
-Query: {question}
-Image: {image_info}
-Actions Taken:
-{memory.get_actions()}
-
 Instructions:
 1. Review the query, image, and all actions taken during the process.
 2. Consider the results obtained from each tool execution.
@@ -369,48 +487,44 @@ Your response should be well-organized and include the following sections:
 6. Conclusion:
    - Summarize the main points and reinforce the answer to the query.
    - If appropriate, suggest potential next steps or areas for further investigation.
+
+Context:
+Query: {question}
+Image: {image_info}
+Actions Taken:
+{memory_text}
 """
 
-        input_data = [prompt_generate_final_output]
-        if image_info:
-            try:
-                with open(image_info["image_path"], 'rb') as file:
-                    image_bytes = file.read()
-                input_data.append(image_bytes)
-            except Exception as e:
-                print(f"Error reading image file: {str(e)}")
+        self._record_prompt_usage("final", prompt_generate_final_output, "", memory_text)
+        input_data = self._build_input(prompt_generate_final_output, image)
 
-        final_output = self.llm_engine_mm(input_data)
+        final_output = self.llm_engine_mm(input_data, call_site="final")
 
         return final_output
 
 
-    def generate_direct_output(self, question: str, image: str, memory: Memory) -> str:
+    @traced("planner.direct_output")
+    def generate_direct_output(self, question: str, image: str, query_analysis: str, memory: Memory) -> str:
         image_info = self.get_image_info(image)
+        memory_text = self.context_budget.render_actions(memory.get_actions(), "direct")
 
         prompt_generate_final_output = f"""
+Please generate the concise output based on the query, image information, initial analysis, and actions taken. Break down the process into clear, logical, and conherent steps. Conclude with a precise and direct answer to the query.
+
 Context:
 Query: {question}
 Image: {image_info}
 Initial Analysis:
-{self.query_analysis}
+{query_analysis}
 Actions Taken:
-{memory.get_actions()}
-
-Please generate the concise output based on the query, image information, initial analysis, and actions taken. Break down the process into clear, logical, and conherent steps. Conclude with a precise and direct answer to the query.
+{memory_text}
 
 Answer:
 """
 
-        input_data = [prompt_generate_final_output]
-        if image_info:
-            try:
-                with open(image_info["image_path"], 'rb') as file:
-                    image_bytes = file.read()
-                input_data.append(image_bytes)
-            except Exception as e:
-                print(f"Error reading image file: {str(e)}")
+        self._record_prompt_usage("direct", prompt_generate_final_output, query_analysis, memory_text)
+        input_data = self._build_input(prompt_generate_final_output, image)
 
-        final_output = self.llm_engine_mm(input_data)
+        final_output = self.llm_engine_mm(input_data, call_site="direct")
 
         return final_output
\ No newline at end of file
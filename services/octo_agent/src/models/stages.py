@@ -0,0 +1,172 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from engine.local_llm import llm_cancellable, llm_priority
+from engine.telemetry import TelemetryAggregator, collect_telemetry
+from engine.tracing import span
+
+
+class StageRunner:
+    """
+    Runs the independent stages of one solve concurrently and times them.
+
+    At most `max_concurrency` stages run at once, counting stages run inline in
+    the caller's thread. Background stages run in a copy of the caller's context,
+    so telemetry collectors and the LLM session id follow them. `after` names the
+    stages a stage depends on; it only feeds the critical-path estimate.
+    """
+
+    def __init__(self, max_concurrency: int = 2):
+        self.max_concurrency = max(1, max_concurrency)
+        self._slots = threading.Semaphore(self.max_concurrency)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.durations: Dict[str, float] = {}
+        self.dependencies: Dict[str, tuple] = {}
+        self._started = time.perf_counter()
+
+    def _record(self, name: str, after: Iterable[str], duration: float) -> None:
+        with self._lock:
+            self.durations[name] = duration
+            self.dependencies[name] = tuple(after)
+
+    @contextmanager
+    def stage(self, name: str, after: Iterable[str] = ()):
+        """Time a block run in the caller's thread as stage `name`"""
+        with self._slots, span(f"stage.{name}"):
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self._record(name, after, time.perf_counter() - start)
+
+    def submit(self, name: str, fn: Callable[..., Any], *args, after: Iterable[str] = (), **kwargs) -> Future:
+        """Run `fn` as stage `name` in the background"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="solver-stage")
+
+        def run():
+            with self.stage(name, after):
+                return fn(*args, **kwargs)
+
+        return self._pool.submit(contextvars.copy_context().run, run)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def critical_path_time(self) -> float:
+        """Longest chain of dependent stages: the solve's wall time with unlimited concurrency"""
+        finish: Dict[str, float] = {}
+
+        def finish_time(name: str) -> float:
+            if name not in finish:
+                deps = [d for d in self.dependencies.get(name, ()) if d in self.durations]
+                finish[name] = self.durations[name] + max((finish_time(d) for d in deps), default=0.0)
+            return finish[name]
+
+        return max((finish_time(name) for name in self.durations), default=0.0)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "stages": {name: round(seconds, 2) for name, seconds in self.durations.items()},
+            "summed_time": round(sum(self.durations.values()), 2),
+            "critical_path_time": round(self.critical_path_time(), 2),
+            "wall_time": round(time.perf_counter() - self._started, 2),
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+class Speculation:
+    """
+    At most one speculative call in flight: started alongside other work, then either taken
+    (its result is used) or discarded. A discarded call is cancelled: its LLM calls stream and
+    stop at their next delta, which frees the server slot it holds. `close` waits for it, so no
+    speculative call outlives the solve. Tokens and time of discarded calls count as waste;
+    `saved_time` is the part of taken calls that overlapped with the other work. Its calls go
+    out at `priority`, so the gateway admits the work they run alongside first.
+    """
+
+    def __init__(self, priority: str = "batch"):
+        self.priority = priority
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="solver-speculation")
+        self._lock = threading.Lock()
+        self._pending: Optional[Tuple[Future, threading.Event, TelemetryAggregator]] = None
+        self.started = 0
+        self.used = 0
+        self.wasted = 0
+        self.saved_time = 0.0
+        self.used_tokens = 0
+        self.wasted_tokens = 0
+        self.wasted_time = 0.0
+
+    @property
+    def pending(self) -> bool:
+        return self._pending is not None
+
+    def start(self, fn: Callable[..., Any], *args, **kwargs) -> None:
+        self.discard()
+        cancel = threading.Event()
+        calls = TelemetryAggregator()
+
+        def run():
+            start = time.perf_counter()
+            with llm_priority(self.priority), llm_cancellable(cancel), collect_telemetry(calls):
+                return fn(*args, **kwargs), time.perf_counter() - start
+
+        future = self._pool.submit(contextvars.copy_context().run, run)
+        self._pending = (future, cancel, calls)
+        self.started += 1
+
+    def take(self) -> Any:
+        future, _, calls = self._pending
+        self._pending = None
+        waited = time.perf_counter()
+        result, duration = future.result()
+        self.used += 1
+        self.saved_time += max(duration - (time.perf_counter() - waited), 0.0)
+        with self._lock:
+            self.used_tokens += _tokens(calls)
+        return result
+
+    def discard(self) -> None:
+        if self._pending is None:
+            return
+        future, cancel, calls = self._pending
+        self._pending = None
+        self.wasted += 1
+        cancel.set()
+
+        def count_waste(_: Future) -> None:
+            with self._lock:
+                self.wasted_tokens += _tokens(calls)
+                self.wasted_time += sum(record.latency_s for record in calls.records)
+
+        future.add_done_callback(count_waste)
+
+    def close(self) -> None:
+        self.discard()
+        self._pool.shutdown(wait=True)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            spent_tokens = self.used_tokens + self.wasted_tokens
+            return {
+                "started": self.started,
+                "used": self.used,
+                "wasted": self.wasted,
+                "waste_rate": round(self.wasted / self.started, 4) if self.started else 0.0,
+                "wasted_tokens": self.wasted_tokens,
+                "token_waste_rate": round(self.wasted_tokens / spent_tokens, 4) if spent_tokens else 0.0,
+                "wasted_time": round(self.wasted_time, 2),
+                "saved_time": round(self.saved_time, 2),
+            }
+
+
+def _tokens(calls: TelemetryAggregator) -> int:
+    return sum(record.prompt_tokens + record.completion_tokens for record in calls.records)
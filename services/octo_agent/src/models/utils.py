@@ -1,3 +1,5 @@
+import json
+
 
 def make_json_serializable(obj):
     if isinstance(obj, (str, int, float, bool, type(None))):
@@ -29,4 +31,8 @@ def make_json_serializable_truncated(obj, max_length: int = 100000):
     else:
         result = str(obj)
         return result if len(result) <= max_length else result[:max_length - 3] + "..."
-    
\ No newline at end of file
+    
+
+def stable_dumps(obj) -> str:
+    """Byte-stable rendering (sorted keys) for prompt sections that should hit the KV prefix cache"""
+    return json.dumps(make_json_serializable(obj), sort_keys=True, indent=2, ensure_ascii=False)
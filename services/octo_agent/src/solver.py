@@ -1,11 +1,24 @@
 import argparse
+import contextlib
+import contextvars
+import copy
+import os
+import re
 import time
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional
 
+from engine.factory import shutdown_llm_engines
+from engine.local_llm import llm_session
+from engine.telemetry import JsonlSink, collect_telemetry
 from models.initializer import Initializer
 from models.planner import Planner
 from models.memory import Memory
+from models.stages import Speculation, StageRunner
+from engine.tracing import span, trace_spans
+from models.checkpoint import Checkpoint
 from models.executor import Executor
 from models.utils import make_json_serializable_truncated
 
@@ -20,7 +33,12 @@ class Solver:
         max_time: int = 300,
         max_tokens: int = 4000,
         root_cache_dir: str = "cache",
-        verbose: bool = True
+        verbose: bool = True,
+        telemetry_path: Optional[str] = None,
+        stage_concurrency: int = 2,
+        speculative_planning: bool = False,
+        parallel_steps: int = 1,
+        trace: bool = False
     ):
         self.planner = planner
         self.memory = memory
@@ -32,15 +50,79 @@ class Solver:
         self.output_types = output_types.lower().split(',')
         assert all(output_type in ["base", "final", "direct"] for output_type in self.output_types), "Invalid output type. Supported types are 'base', 'final', 'direct'."
         self.verbose = verbose
-    def solve(self, question: str, image_path: Optional[str] = None):
+        self.telemetry_sink = JsonlSink(telemetry_path) if telemetry_path else None
+        self.stage_concurrency = stage_concurrency
+        self.speculative_planning = speculative_planning
+        # Max independent sub-goals (one tool each) the planner may put into one step
+        self.parallel_steps = max(1, parallel_steps)
+        self.checkpoint: Optional[Checkpoint] = None
+        # Write each solve's spans as trace.json (Chrome trace / Perfetto) and spans.jsonl
+        self.trace = trace
+
+    def fork(self) -> "Solver":
+        """A solver for one concurrent task: shares engines and tool metadata, owns its memory and per-solve state"""
+        forked = copy.copy(self)
+        forked.planner = self.planner.fork()
+        forked.executor = copy.copy(self.executor)
+        forked.memory = Memory()
+        return forked
+
+    def solve(self, question: str, image_path: Optional[str] = None, query_cache_dir: Optional[str] = None, resume: bool = False):
         """
         Solve a single problem from the benchmark dataset.
         
         Args:
-            index (int): Index of the problem to solve
+            question (str): The question to solve
+            image_path (str): Optional input image or document
+            query_cache_dir (str): Directory for this solve's tool outputs and checkpoint (defaults to root_cache_dir,
+                with the checkpoint in a directory keyed by the question and image)
+            resume (bool): Continue an interrupted solve of the same question from its checkpoint
         """
+        # Every LLM call of this solve (planner and executor) is attributed to its rollup
+        tracer = None
+        with contextlib.ExitStack() as stack:
+            if self.telemetry_sink is not None:
+                stack.enter_context(collect_telemetry(self.telemetry_sink))
+            telemetry = stack.enter_context(collect_telemetry())
+            # The gateway keeps this solve's growing prompt prefix cached between its calls
+            stack.enter_context(llm_session(uuid.uuid4().hex))
+            if self.trace:
+                tracer = stack.enter_context(trace_spans())
+            with span("solve", query=question, image=image_path, resume=resume):
+                json_data = self._solve(question, image_path, query_cache_dir, resume)
+
+        json_data["llm_calls"] = telemetry.rollup()
+        if tracer is not None:
+            json_data["trace"] = self._write_trace(tracer)
+        if self.verbose:
+            print(f"\n==> 📊 LLM calls by call site:\n{json.dumps(json_data['llm_calls'], indent=4)}")
+        return json_data
+
+    def _write_trace(self, tracer) -> dict:
+        """Export the solve's spans next to its tool outputs; returns their paths and per-span totals"""
+        chrome_trace_path = os.path.join(self.executor.query_cache_dir, "trace.json")
+        spans_path = os.path.join(self.executor.query_cache_dir, "spans.jsonl")
+        tracer.write_chrome_trace(chrome_trace_path)
+        tracer.write_jsonl(spans_path)
+        if self.verbose:
+            print(f"\n==> 🧭 Trace written to {chrome_trace_path} (open in ui.perfetto.dev)")
+        return {"chrome_trace": chrome_trace_path, "spans": spans_path, "summary": tracer.summary()}
+
+    def _solve(self, question: str, image_path: Optional[str] = None, query_cache_dir: Optional[str] = None, resume: bool = False):
         # Update cache directory for the executor
-        self.executor.set_query_cache_dir(self.root_cache_dir)
+        self.executor.set_query_cache_dir(query_cache_dir or self.root_cache_dir)
+
+        # Every finished stage is saved next to the tool outputs; a resumed solve replays them
+        # instead of repeating their LLM calls and tool executions. Without a per-query cache dir
+        # the checkpoint gets one of its own, so solves of other questions do not overwrite it
+        checkpoint_dir = query_cache_dir or Checkpoint.directory_for(self.root_cache_dir, question, image_path)
+        self.checkpoint = Checkpoint(checkpoint_dir, question, image_path, resume)
+
+        # Every solve starts from an empty memory, so earlier questions' actions stay out of its prompts
+        self.memory = Memory()
+
+        # Read, hash and measure the input once for every LLM call in this solve
+        self.planner.load_input_asset(image_path)
 
         # Initialize json_data with basic problem information
         json_data = {
@@ -51,18 +133,29 @@ class Solver:
             print(f"\n==> 🔍 Received Query: {question}")
             if image_path:
                 print(f"\n==> 🖼️ Received Image: {image_path}")
+            if self.checkpoint.resumed:
+                print(f"\n==> 💾 Resuming from checkpoint: {self.checkpoint.path}")
+
+        # Stages that do not depend on each other run concurrently (base response alongside the
+        # reasoning loop, final alongside direct output); the report compares the critical path
+        # with the time they would take one after another
+        stages = StageRunner(self.stage_concurrency)
+        try:
+            self._run_stages(stages, json_data, question, image_path)
+        finally:
+            stages.close()
+        json_data["stage_times"] = stages.report()
+        json_data["checkpoint"] = self.checkpoint.report()
+        if self.verbose:
+            print(f"\n==> ⏱️ Stage times:\n{json.dumps(json_data['stage_times'], indent=4)}")
+        return json_data
 
-        # Generate base response if requested
+    def _run_stages(self, stages: StageRunner, json_data: dict, question: str, image_path: Optional[str]) -> None:
+        # Generate base response if requested; it does not depend on the query analysis
+        base_future = None
         if 'base' in self.output_types:
-            base_response = self.planner.generate_base_response(question, image_path, self.max_tokens)
-            json_data["base_response"] = base_response
-            if self.verbose:
-                print(f"\n==> 📝 Base Response from LLM:\n\n{base_response}")
+            base_future = stages.submit("base_response", self._checkpointed, "base_response", self.planner.generate_base_response, question, image_path, self.max_tokens)
 
-        # If only base response is needed, save and return
-        if set(self.output_types) == {'base'}:
-            return json_data
-    
         # Continue with query analysis and tool execution if final or direct responses are needed
         if {'final', 'direct'} & set(self.output_types):
             if self.verbose:
@@ -70,117 +163,306 @@ class Solver:
 
             # [1] Analyze query
             query_start_time = time.time()
-            query_analysis = self.planner.analyze_query(question, image_path)
+            with stages.stage("query_analysis"):
+                query_analysis = self._checkpointed("query_analysis", self.planner.analyze_query, question, image_path)
             json_data["query_analysis"] = query_analysis
             if self.verbose:
                 print(f"\n==> 🔍 Step 0: Query Analysis\n")
                 print(f"{query_analysis}")
                 print(f"[Time]: {round(time.time() - query_start_time, 2)}s")
 
-            # Main execution loop
-            step_count = 0
-            action_times = []
-            while step_count < self.max_steps and (time.time() - query_start_time) < self.max_time:
-                step_count += 1
+            with stages.stage("steps", after=("query_analysis",)):
+                memory_actions, step_count, speculation = self._run_steps(question, image_path, query_analysis, query_start_time)
+            if speculation is not None:
+                json_data["speculation"] = speculation
+                if self.verbose:
+                    print(f"\n==> 🔮 Speculative planning:\n{json.dumps(speculation, indent=4)}")
+
+            # Add memory and statistics to json_data
+            json_data.update({
+                "memory": memory_actions,
+                "step_count": step_count,
+                "action_count": len(memory_actions),
+                "execution_time": round(time.time() - query_start_time, 2),
+            })
+
+            # Final and direct outputs only read the finished memory
+            outputs = {}
+            if 'final' in self.output_types:
+                outputs["final_output"] = stages.submit("final_output", self._checkpointed, "final_output", self.planner.generate_final_output, question, image_path, self.memory, after=("steps",))
+            if 'direct' in self.output_types:
+                outputs["direct_output"] = stages.submit("direct_output", self._checkpointed, "direct_output", self.planner.generate_direct_output, question, image_path, query_analysis, self.memory, after=("steps",))
+
+            # Generate final output if requested
+            if 'final_output' in outputs:
+                final_output = outputs["final_output"].result()
+                json_data["final_output"] = final_output
+                print(f"\n==> 🐙 Detailed Solution:\n\n{final_output}")
+
+            # Generate direct output if requested
+            if 'direct_output' in outputs:
+                direct_output = outputs["direct_output"].result()
+                json_data["direct_output"] = direct_output
+                print(f"\n==> 🐙 Final Answer:\n\n{direct_output}")
+
+            # Latest per-section prompt token breakdown for each planner call site
+            json_data["prompt_tokens"] = self.planner.context_budget.usage_report()
+
+            # KV prefix-cache reuse per call site (shared engine, so this covers planner and executor)
+            prefix_cache_report = getattr(self.planner.llm_engine, "prefix_cache_report", None)
+            if callable(prefix_cache_report):
+                json_data["prefix_cache"] = prefix_cache_report()
+                if self.verbose:
+                    print(f"\n==> 📊 Prefix cache by call site:\n{json.dumps(json_data['prefix_cache'], indent=4)}")
+
+            print(f"\n[Total Time]: {round(time.time() - query_start_time, 2)}s")
+            print(f"\n==> ✅ Query Solved!")
+
+        if base_future is not None:
+            base_response = base_future.result()
+            json_data["base_response"] = base_response
+            if self.verbose:
+                print(f"\n==> 📝 Base Response from LLM:\n\n{base_response}")
+
+    def _run_steps(self, question: str, image_path: Optional[str], query_analysis: str, query_start_time: float):
+        """The plan -> command -> execute -> verify loop; returns (memory actions, step count, speculation stats)"""
+        if not self.speculative_planning or not self._can_speculate():
+            actions, step_count = self._step_loop(question, image_path, query_analysis, query_start_time, None)
+            return actions, step_count, None
+        # Verification says CONTINUE most of the time, so the next step is planned while it runs
+        # (on the same memory, which verification does not change); a STOP discards that plan
+        speculation = Speculation()
+        try:
+            actions, step_count = self._step_loop(question, image_path, query_analysis, query_start_time, speculation)
+        finally:
+            speculation.close()
+        return actions, step_count, speculation.report()
+
+    def _can_speculate(self) -> bool:
+        """A speculative plan only overlaps verification if the server runs two generations at once"""
+        slots = getattr(self.planner.llm_engine, "generation_slots", lambda: None)()
+        if slots is not None and slots < 2:
+            if self.verbose:
+                print("\n==> 🔮 Speculative planning skipped: the server runs one generation at a time")
+            return False
+        return True
+
+    def _step_loop(self, question: str, image_path: Optional[str], query_analysis: str, query_start_time: float, speculation: Optional[Speculation]):
+        # Main execution loop
+        step_count = 0
+        action_times = []
+        while step_count < self.max_steps and (time.time() - query_start_time) < self.max_time:
+            step_count += 1
+            with span("step", step=step_count) as step_span:
                 step_start_time = time.time()
 
                 # [2] Generate next step
                 local_start_time = time.time()
-                next_step = self.planner.generate_next_step(
-                    question, 
-                    image_path, 
-                    query_analysis, 
-                    self.memory, 
-                    step_count, 
-                    self.max_steps
-                )
-                context, sub_goal, tool_name = self.planner.extract_context_subgoal_and_tool(next_step)
+                saved = self.checkpoint.step(step_count)
+                subgoals = self.checkpoint.reuse(saved["subgoals"])
+                if subgoals is not None:
+                    subgoals = [tuple(subgoal) for subgoal in subgoals]
+                else:
+                    if speculation is not None and speculation.pending:
+                        # Planned during the previous verification
+                        next_step = speculation.take()
+                    else:
+                        next_step = self._plan_next_step(question, image_path, query_analysis, step_count)
+                    if self.parallel_steps > 1:
+                        subgoals = self.planner.extract_subgoals(next_step, self.parallel_steps) or [(None, None, None)]
+                    else:
+                        subgoals = [self.planner.extract_context_subgoal_and_tool(next_step)]
+                    self.checkpoint.update_step(step_count, subgoals=[list(subgoal) for subgoal in subgoals])
+                labels = [str(step_count)] if len(subgoals) == 1 else [f"{step_count}.{i}" for i in range(1, len(subgoals) + 1)]
                 if self.verbose:
-                    print(f"\n==> 🎯 Step {step_count}: Action Prediction ({tool_name})\n")
-                    print(f"[Context]: {context}\n[Sub Goal]: {sub_goal}\n[Tool]: {tool_name}")
+                    for step_label, (context, sub_goal, tool_name) in zip(labels, subgoals, strict=True):
+                        print(f"\n==> 🎯 Step {step_label}: Action Prediction ({tool_name})\n")
+                        print(f"[Context]: {context}\n[Sub Goal]: {sub_goal}\n[Tool]: {tool_name}")
                     print(f"[Time]: {round(time.time() - local_start_time, 2)}s")
 
-                if tool_name is None or tool_name not in self.planner.available_tools:
-                    print(f"\n==> 🚫 Error: Tool '{tool_name}' is not available or not found.")
-                    command = "No command was generated because the tool was not found."
-                    result = "No result was generated because the tool was not found."
-
+                # [3] + [4] Generate and execute the tool commands; independent sub-goals run concurrently
+                if len(subgoals) == 1:
+                    outcomes = [self._run_saved_action(step_count, 0, labels[0], question, image_path, *subgoals[0])]
                 else:
-                    # [3] Generate the tool command
-                    local_start_time = time.time()
-                    tool_command = self.executor.generate_tool_command(
-                        question, 
-                        image_path, 
-                        context, 
-                        sub_goal, 
-                        tool_name, 
-                        self.planner.toolbox_metadata[tool_name]
-                    )
-                    analysis, explanation, command = self.executor.extract_explanation_and_command(tool_command)
-                    if self.verbose:
-                        print(f"\n==> 📝 Step {step_count}: Command Generation ({tool_name})\n")
-                        print(f"[Analysis]: {analysis}\n[Explanation]: {explanation}\n[Command]: {command}")
-                        print(f"[Time]: {round(time.time() - local_start_time, 2)}s")
-                    
-                    # [4] Execute the tool command
-                    local_start_time = time.time()
-                    result = self.executor.execute_tool_command(tool_name, command)
-                    result = make_json_serializable_truncated(result) # Convert to JSON serializable format
-                    if self.verbose:
-                        print(f"\n==> 🛠️ Step {step_count}: Command Execution ({tool_name})\n")
-                        print(f"[Result]:\n{json.dumps(result, indent=4)}")
-                        print(f"[Time]: {round(time.time() - local_start_time, 2)}s")
-                
+                    with ThreadPoolExecutor(max_workers=len(subgoals), thread_name_prefix="solver-action") as pool:
+                        futures = [
+                            pool.submit(contextvars.copy_context().run, self._run_saved_action, step_count, index, step_label, question, image_path, *subgoal)
+                            for index, (step_label, subgoal) in enumerate(zip(labels, subgoals, strict=True))
+                        ]
+                        outcomes = [future.result() for future in futures]
+
                 # Track execution time for the current step
                 execution_time_step = round(time.time() - step_start_time, 2)
                 action_times.append(execution_time_step)
 
-                # Update memory
-                self.memory.add_action(step_count, tool_name, sub_goal, command, result)
-                memory_actions = self.memory.get_actions()
+                # Update memory; all sub-goals of the step count as one step
+                self.memory.add_actions(step_count, [
+                    (tool_name, sub_goal, command, result)
+                    for (context, sub_goal, tool_name), (command, result) in zip(subgoals, outcomes, strict=True)
+                ])
 
                 # [5] Verify memory (context verification)
                 local_start_time = time.time()
-                stop_verification = self.planner.verificate_context(
-                    question, 
-                    image_path, 
-                    query_analysis, 
-                    self.memory
-                )
-                context_verification, conclusion = self.planner.extract_conclusion(stop_verification)
+                verification = self.checkpoint.reuse(saved["verification"])
+                if verification is not None:
+                    context_verification, conclusion = verification
+                else:
+                    if speculation is not None and step_count < self.max_steps:
+                        speculation.start(self._plan_next_step, question, image_path, query_analysis, step_count + 1)
+                    stop_verification = self.planner.verificate_context(
+                        question, 
+                        image_path, 
+                        query_analysis, 
+                        self.memory
+                    )
+                    context_verification, conclusion = self.planner.extract_conclusion(stop_verification)
+                    self.checkpoint.update_step(step_count, verification=[context_verification, conclusion])
                 if self.verbose:
                     conclusion_emoji = "✅" if conclusion == 'STOP' else "🛑"
                     print(f"\n==> 🤖 Step {step_count}: Context Verification\n")
                     print(f"[Analysis]: {context_verification}\n[Conclusion]: {conclusion} {conclusion_emoji}")
                     print(f"[Time]: {round(time.time() - local_start_time, 2)}s")
-                
+                step_span.set(actions=len(subgoals), conclusion=conclusion)
+
                 # Break the loop if the context is verified
                 if conclusion == 'STOP':
                     break
 
-            # Add memory and statistics to json_data
-            json_data.update({
-                "memory": memory_actions,
-                "step_count": step_count,
-                "execution_time": round(time.time() - query_start_time, 2),
-            })
+        return self.memory.get_actions(), step_count
 
-            # Generate final output if requested
-            if 'final' in self.output_types:
-                final_output = self.planner.generate_final_output(question, image_path, self.memory)
-                json_data["final_output"] = final_output
-                print(f"\n==> 🐙 Detailed Solution:\n\n{final_output}")
+    def _plan_next_step(self, question: str, image_path: Optional[str], query_analysis: str, step_count: int):
+        if self.parallel_steps > 1:
+            return self.planner.generate_parallel_next_step(
+                question, image_path, query_analysis, self.memory, step_count, self.max_steps, self.parallel_steps
+            )
+        return self.planner.generate_next_step(question, image_path, query_analysis, self.memory, step_count, self.max_steps)
 
-            # Generate direct output if requested
-            if 'direct' in self.output_types:
-                direct_output = self.planner.generate_direct_output(question, image_path, self.memory)
-                json_data["direct_output"] = direct_output
-                print(f"\n==> 🐙 Final Answer:\n\n{direct_output}")
+    def _checkpointed(self, name: str, fn, *args):
+        """Run stage `name`, or take its value from the checkpoint of an interrupted solve"""
+        value = self.checkpoint.stage(name)
+        if value is None:
+            value = fn(*args)
+            self.checkpoint.set_stage(name, value)
+        return value
 
-            print(f"\n[Total Time]: {round(time.time() - query_start_time, 2)}s")
-            print(f"\n==> ✅ Query Solved!")
+    def _run_saved_action(self, step_count: int, index: int, step_label: str, question: str, image_path: Optional[str], context: str, sub_goal: str, tool_name: str):
+        """`_run_action` for sub-goal `index` of a step, unless the checkpoint already has its command and result"""
+        with span("action", step=step_label, tool=tool_name) as action_span:
+            saved = self.checkpoint.reuse(self.checkpoint.step(step_count)["outcomes"].get(str(index)))
+            if saved is not None:
+                action_span.set(checkpoint=True)
+                return tuple(saved)
+            command, result = self._run_action(step_label, question, image_path, context, sub_goal, tool_name)
+            self.checkpoint.set_outcome(step_count, index, command, result)
+            return command, result
 
-        return json_data
+    def _run_action(self, step_label: str, question: str, image_path: Optional[str], context: str, sub_goal: str, tool_name: str):
+        """Generate and execute the command of one sub-goal; returns (command, result)"""
+        if tool_name is None or tool_name not in self.planner.available_tools:
+            print(f"\n==> 🚫 Error: Tool '{tool_name}' is not available or not found.")
+            command = "No command was generated because the tool was not found."
+            result = "No result was generated because the tool was not found."
+
+        else:
+            # [3] Generate the tool command
+            local_start_time = time.time()
+            tool_command = self.executor.generate_tool_command(
+                question, 
+                image_path, 
+                context, 
+                sub_goal, 
+                tool_name, 
+                self.planner.toolbox_metadata[tool_name]
+            )
+            analysis, explanation, command = self.executor.extract_explanation_and_command(tool_command)
+            if self.verbose:
+                print(f"\n==> 📝 Step {step_label}: Command Generation ({tool_name})\n")
+                print(f"[Analysis]: {analysis}\n[Explanation]: {explanation}\n[Command]: {command}")
+                print(f"[Time]: {round(time.time() - local_start_time, 2)}s")
+                    
+            # [4] Execute the tool command
+            local_start_time = time.time()
+            result = self.executor.execute_tool_command(tool_name, command)
+            result = make_json_serializable_truncated(result) # Convert to JSON serializable format
+            if self.verbose:
+                print(f"\n==> 🛠️ Step {step_label}: Command Execution ({tool_name})\n")
+                print(f"[Result]:\n{json.dumps(result, indent=4)}")
+                print(f"[Time]: {round(time.time() - local_start_time, 2)}s")
+
+        return command, result
+
+def _read_batch_tasks(input_path: str) -> list:
+    """JSONL tasks `{"id": ..., "question": ..., "image_path": ...}`; `id` defaults to the line number"""
+    tasks, seen = [], set()
+    with open(input_path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            task = json.loads(line)
+            if not task.get("question"):
+                raise ValueError(f"{input_path}:{line_no}: task has no question")
+            task_id = str(task.get("id", line_no))
+            if task_id in seen:
+                raise ValueError(f"{input_path}:{line_no}: duplicate task id {task_id!r}")
+            seen.add(task_id)
+            tasks.append({**task, "id": task_id})
+    return tasks
+
+def _finished_task_ids(output_path: str) -> set:
+    """Ids already answered in `output_path`; failed tasks and a line torn by a crash are redone"""
+    done = set()
+    if not os.path.isfile(output_path):
+        return done
+    with open(output_path, "rb+") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in record:
+                done.add(str(record["id"]))
+        # The next result must not be appended to a torn last line
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return done
+
+def solve_batch(solver: Solver, input_path: str, output_path: str, workers: int = 4, resume: bool = True) -> dict:
+    """
+    Solve every task of a JSONL file with a pool of `workers` threads.
+
+    Each task runs on a forked solver (fresh Memory, own planner/executor state) with its own
+    cache dir under root_cache_dir. Results are appended to `output_path` as they finish; with
+    `resume`, tasks that already have a result there are skipped and interrupted ones continue
+    from their checkpoint.
+    """
+    tasks = _read_batch_tasks(input_path)
+    done = _finished_task_ids(output_path) if resume else set()
+    pending = [task for task in tasks if task["id"] not in done]
+    summary = {"total": len(tasks), "skipped": len(tasks) - len(pending), "completed": 0, "failed": 0}
+    start_time = time.time()
+
+    def run(task: dict) -> dict:
+        # Task ids come from user input; keep them to safe path characters
+        cache_name = re.sub(r"[^A-Za-z0-9_.-]", "_", task["id"])
+        query_cache_dir = os.path.join(solver.root_cache_dir, f"task_{cache_name}")
+        try:
+            result = solver.fork().solve(task["question"], task.get("image_path"), query_cache_dir=query_cache_dir, resume=resume)
+            return {"id": task["id"], **result}
+        except Exception as e:
+            return {"id": task["id"], "query": task["question"], "image": task.get("image_path"), "error": f"{type(e).__name__}: {e}"}
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as output, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for future in as_completed([pool.submit(run, task) for task in pending]):
+            # Written from this thread only, one complete line per finished task
+            record = future.result()
+            output.write(json.dumps(make_json_serializable_truncated(record)) + "\n")
+            output.flush()
+            summary["failed" if "error" in record else "completed"] += 1
+
+    summary["wall_time"] = round(time.time() - start_time, 2)
+    return summary
 
 def construct_solver(llm_engine_name : str = "Corianas/DeepSeek-R1-Distill-Qwen-14B-AWQ",
                      enabled_tools : list[str] = ["all"],
@@ -190,8 +472,27 @@ def construct_solver(llm_engine_name : str = "Corianas/DeepSeek-R1-Distill-Qwen-
                      max_tokens : int = 4000,
                      root_cache_dir : str = "solver_cache",
                      verbose : bool = True,
-                     vllm_config_path : str = None):
+                     vllm_config_path : str = None,
+                     use_cache : bool = False,
+                     temperature : float = 0.7,
+                     vision : bool = False,
+                     max_image_side : int = None,
+                     reasoning_budget : int = None,
+                     reasoning_trace_path : str = None,
+                     telemetry_path : str = None,
+                     stage_concurrency : int = 2,
+                     speculative_planning : bool = False,
+                     parallel_steps : int = 1,
+                     trace : bool = False,
+                     structured_call_sites : list[str] = None):
     
+    # Same budget for every call site; the engine returns answers without their reasoning
+    reasoning_budgets = {"default": reasoning_budget} if reasoning_budget is not None else None
+
+    # Call sites whose replies are constrained to their JSON schema; the others keep streaming
+    # early stops and <think> reasoning (see ChatLocalLLM `structured_output`)
+    structured_output = tuple(sorted(structured_call_sites or ()))
+
     # Instantiate Initializer
     initializer = Initializer(
         enabled_tools=enabled_tools,
@@ -206,6 +507,13 @@ def construct_solver(llm_engine_name : str = "Corianas/DeepSeek-R1-Distill-Qwen-
         toolbox_metadata=initializer.toolbox_metadata,
         available_tools=initializer.available_tools,
         verbose=verbose,
+        use_cache=use_cache,
+        temperature=temperature,
+        vision=vision,
+        max_image_side=max_image_side,
+        reasoning_budgets=reasoning_budgets,
+        reasoning_trace_path=reasoning_trace_path,
+        structured_output=structured_output,
     )
 
     # Instantiate Memory
@@ -216,6 +524,12 @@ def construct_solver(llm_engine_name : str = "Corianas/DeepSeek-R1-Distill-Qwen-
         llm_engine_name=llm_engine_name,
         root_cache_dir=root_cache_dir,
         verbose=verbose,
+        use_cache=use_cache,
+        temperature=temperature,
+        vision=vision,
+        reasoning_budgets=reasoning_budgets,
+        reasoning_trace_path=reasoning_trace_path,
+        structured_output=structured_output,
     )
 
     # Instantiate Solver
@@ -229,6 +543,11 @@ def construct_solver(llm_engine_name : str = "Corianas/DeepSeek-R1-Distill-Qwen-
         max_tokens=max_tokens,
         root_cache_dir=root_cache_dir,
         verbose=verbose,
+        telemetry_path=telemetry_path,
+        stage_concurrency=stage_concurrency,
+        speculative_planning=speculative_planning,
+        parallel_steps=parallel_steps,
+        trace=trace,
     )
     return solver
 
@@ -246,12 +565,36 @@ def parse_arguments():
     parser.add_argument("--max_steps", type=int, default=10, help="Maximum number of steps to execute.")
     parser.add_argument("--max_time", type=int, default=600, help="Maximum time allowed in seconds.")
     parser.add_argument("--verbose", type=bool, default=True, help="Enable verbose output.")
+    parser.add_argument("--use_cache", action="store_true", help="Cache deterministic LLM responses (L1 memory + L2 disk).")
+    parser.add_argument("--vision", action="store_true", help="Send input images to the LLM as image content parts (vision models only).")
+    parser.add_argument("--max_image_side", type=int, default=None, help="Downscale input images so their longest side fits this many pixels.")
+    parser.add_argument("--temperature", type=float, default=0.7, help="LLM sampling temperature (use 0 to make responses cacheable).")
+    parser.add_argument("--structured_call_sites", default="", help="Comma-separated call sites (e.g. analyze_query,tool_command) whose replies are constrained to their JSON schema; this disables their early stop and reasoning.")
+    parser.add_argument("--reasoning_budget", type=int, default=None, help="Max reasoning (<think>) tokens per LLM call before the answer is forced.")
+    parser.add_argument("--telemetry_path", default=None, help="Optional JSONL file that records tokens, latency and call site of every LLM call.")
+    parser.add_argument("--stage_concurrency", type=int, default=2, help="Max independent solver stages (LLM calls) run at once; 1 runs them one after another.")
+    parser.add_argument("--speculative_planning", action="store_true", help="Plan the next step while the current one is verified; discarded when verification says STOP.")
+    parser.add_argument("--parallel_steps", type=int, default=1, help="Max independent sub-goals per step, each with its own tool, executed concurrently.")
+    parser.add_argument("--trace", action="store_true", help="Write each solve's spans to trace.json (Chrome trace / Perfetto) and spans.jsonl in its cache dir.")
+    parser.add_argument("--reasoning_trace", default=None, help="Optional JSONL file that records the stripped reasoning of every LLM call.")
 
     # My added args
-    parser.add_argument("--question", required=True, help="User question/task to solve.")
+    parser.add_argument("--question", default=None, help="User question/task to solve.")
     parser.add_argument("--image_path", default=None, help="Optional image/PDF path for tools that accept it.")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted solve of --question from its checkpoint in --root_cache_dir.")
+
+    # Batch mode: solve every {"id", "question", "image_path"} line of a JSONL file
+    parser.add_argument("--batch_input", default=None, help="JSONL file of tasks to solve instead of --question.")
+    parser.add_argument("--batch_output", default=None, help="JSONL file the batch results are appended to.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of tasks solved concurrently in batch mode.")
+    parser.add_argument("--no_resume", action="store_true", help="Rerun every batch task instead of skipping finished ones.")
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.batch_input is None and args.question is None:
+        parser.error("either --question or --batch_input is required")
+    if args.batch_input is not None and args.batch_output is None:
+        parser.error("--batch_output is required with --batch_input")
+    return args
 
 def _parse_enabled_tools(value: str) -> list[str]:
     """Parse the enabled tools from a comma-separated string."""
@@ -274,11 +617,30 @@ def main(args):
                               max_time=args.max_time, 
                               max_tokens=args.max_tokens, 
                               root_cache_dir=args.root_cache_dir,
-                              verbose=args.verbose)
+                              verbose=args.verbose,
+                              use_cache=args.use_cache,
+                              temperature=args.temperature,
+                              vision=args.vision,
+                              max_image_side=args.max_image_side,
+                              reasoning_budget=args.reasoning_budget,
+                              reasoning_trace_path=args.reasoning_trace,
+                              telemetry_path=args.telemetry_path,
+                              stage_concurrency=args.stage_concurrency,
+                              speculative_planning=args.speculative_planning,
+                              parallel_steps=args.parallel_steps,
+                              trace=args.trace,
+                              structured_call_sites=[site.strip() for site in args.structured_call_sites.split(",") if site.strip()])
 
     # Solve the task or problem
     # solver.solve("What is the capital of France?")
-    solver.solve(args.question, image_path=args.image_path)
+    try:
+        if args.batch_input is not None:
+            summary = solve_batch(solver, args.batch_input, args.batch_output, workers=args.workers, resume=not args.no_resume)
+            print(f"\n==> 📦 Batch finished:\n{json.dumps(summary, indent=4)}")
+        else:
+            solver.solve(args.question, image_path=args.image_path, resume=args.resume)
+    finally:
+        shutdown_llm_engines()
 
 if __name__ == "__main__":
     args = parse_arguments()
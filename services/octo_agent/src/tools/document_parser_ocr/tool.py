@@ -22,6 +22,7 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 
 import requests
 
+from engine.tracing import span
 from tools.base import BaseTool
 
 
@@ -114,7 +115,8 @@ class Document_Parser_OCR_Tool(BaseTool):
         payload = {"doc_id": doc_id_final, "content_b64": content_b64}
 
         t0 = time.time()
-        response_json = self._post_ocr(cfg, payload)
+        with span("ocr.request", doc_id=doc_id_final, source=source_kind, input_bytes=len(content_bytes)):
+            response_json = self._post_ocr(cfg, payload)
         t1 = time.time()
 
         sections = response_json.get("sections", []) or []
@@ -125,7 +127,8 @@ class Document_Parser_OCR_Tool(BaseTool):
 
         artifacts: Dict[str, Optional[str]] = {"markdown_path": None, "json_path": None}
         if save_artifacts:
-            artifacts = self._write_artifacts(doc_id_final, markdown, response_json)
+            with span("ocr.write_artifacts", doc_id=doc_id_final):
+                artifacts = self._write_artifacts(doc_id_final, markdown, response_json)
 
         finished = time.time()
         return {
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from models.memory import Memory
+from solver import Solver
+
+
+class FakePlanner:
+    """Scripted planner: one tool per step, verdicts in order, optional per-call delay"""
+
+    def __init__(self, tools=("Tool_A",), verdicts=("STOP",), delay=0.0, fan_out=1):
+        self.available_tools = list(tools)
+        self.toolbox_metadata = {name: {} for name in tools}
+        self.verdicts = list(verdicts)
+        self.delay = delay
+        self.fan_out = fan_out
+        self.calls = []
+        self._lock = threading.Lock()
+        self.llm_engine = None
+
+        class Budget:
+            def usage_report(self):
+                return {}
+
+        self.context_budget = Budget()
+
+    def _call(self, name, *args):
+        with self._lock:
+            self.calls.append((name, *args))
+        time.sleep(self.delay)
+
+    def load_input_asset(self, image_path):
+        return None
+
+    def generate_base_response(self, question, image_path, max_tokens):
+        self._call("base")
+        return "base"
+
+    def analyze_query(self, question, image_path):
+        self._call("analyze")
+        return "analysis"
+
+    def generate_next_step(self, question, image_path, query_analysis, memory, step_count, max_steps):
+        self._call("next_step", step_count, len(memory.get_actions()))
+        return step_count
+
+    def generate_parallel_next_step(self, question, image_path, query_analysis, memory, step_count, max_steps, max_subgoals):
+        self._call("next_step", step_count, len(memory.get_actions()))
+        return step_count
+
+    def extract_subgoals(self, next_step, max_subgoals):
+        return [
+            (f"context {next_step}.{i}", f"goal {next_step}.{i}", self.available_tools[i % len(self.available_tools)])
+            for i in range(min(self.fan_out, max_subgoals))
+        ]
+
+    def extract_context_subgoal_and_tool(self, next_step):
+        tool = self.available_tools[(next_step - 1) % len(self.available_tools)]
+        return f"context {next_step}", f"goal {next_step}", tool
+
+    def verificate_context(self, question, image_path, query_analysis, memory):
+        step = len(memory.get_actions())
+        self._call("verify", step)
+        return self.verdicts[min(step, len(self.verdicts)) - 1]
+
+    def extract_conclusion(self, verification):
+        return "analysis", verification
+
+    def generate_final_output(self, question, image_path, memory):
+        self._call("final")
+        return "final"
+
+    def generate_direct_output(self, question, image_path, query_analysis, memory):
+        self._call("direct")
+        return "direct"
+
+
+class FakeExecutor:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.executed = []
+
+    def set_query_cache_dir(self, query_cache_dir):
+        self.query_cache_dir = query_cache_dir
+
+    def generate_tool_command(self, question, image_path, context, sub_goal, tool_name, metadata):
+        time.sleep(self.delay)
+        return f"execution = tool.execute(goal={sub_goal!r})"
+
+    def extract_explanation_and_command(self, tool_command):
+        return "analysis", "explanation", tool_command
+
+    def execute_tool_command(self, tool_name, command):
+        time.sleep(self.delay)
+        self.executed.append((tool_name, command))
+        return [f"{tool_name} result"]
+
+
+@pytest.fixture
+def make_solver(tmp_path):
+    def make(planner=None, executor=None, **kwargs):
+        kwargs.setdefault("verbose", False)
+        kwargs.setdefault("root_cache_dir", str(tmp_path / "cache"))
+        return Solver(planner or FakePlanner(), Memory(), executor or FakeExecutor(), **kwargs)
+
+    return make
@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+
+import pytest
+
+from models.memory import Memory
+from solver import solve_batch
+
+
+class ForkedSolver:
+    def __init__(self, parent):
+        self.parent = parent
+        self.memory = Memory()
+
+    def solve(self, question, image_path=None, query_cache_dir=None, resume=False):
+        parent = self.parent
+        with parent.lock:
+            parent.active += 1
+            parent.max_active = max(parent.max_active, parent.active)
+            parent.calls.append((question, query_cache_dir, id(self.memory)))
+        time.sleep(0.05)
+        with parent.lock:
+            parent.active -= 1
+        if question in parent.fail_on:
+            raise RuntimeError("tool crashed")
+        self.memory.add_action(1, "Tool", question, "cmd", "result")
+        return {"query": question, "image": image_path, "direct_output": question.upper(), "memory": self.memory.get_actions()}
+
+
+class FakeSolver:
+    """Duck-typed Solver: records which forked instance solved what, and where"""
+
+    def __init__(self, root_cache_dir, fail_on=()):
+        self.root_cache_dir = root_cache_dir
+        self.fail_on = set(fail_on)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def fork(self):
+        return ForkedSolver(self)
+
+
+def _write_tasks(path, questions):
+    path.write_text("".join(json.dumps({"id": f"t{i}", "question": q}) + "\n" for i, q in enumerate(questions)))
+
+
+def test_batch_runs_tasks_concurrently_with_isolated_state(tmp_path):
+    tasks, output = tmp_path / "tasks.jsonl", tmp_path / "out.jsonl"
+    _write_tasks(tasks, ["a", "b", "c", "d"])
+    solver = FakeSolver(str(tmp_path / "cache"))
+
+    summary = solve_batch(solver, str(tasks), str(output), workers=4)
+
+    assert summary["completed"] == 4 and summary["failed"] == 0
+    assert solver.max_active > 1
+    assert len({call[1] for call in solver.calls}) == 4
+    assert len({call[2] for call in solver.calls}) == 4
+    records = {r["id"]: r for r in map(json.loads, output.read_text().splitlines())}
+    assert records["t2"]["direct_output"] == "C"
+    assert all(len(r["memory"]) == 1 for r in records.values())
+
+
+def test_resume_skips_finished_tasks_and_retries_failures(tmp_path):
+    tasks, output = tmp_path / "tasks.jsonl", tmp_path / "out.jsonl"
+    _write_tasks(tasks, ["a", "b", "c"])
+    first = FakeSolver(str(tmp_path / "cache"), fail_on={"b"})
+    assert solve_batch(first, str(tasks), str(output), workers=2)["failed"] == 1
+    # A crash mid-write leaves a torn last line
+    with open(output, "a") as f:
+        f.write('{"id": "t2", "quer')
+
+    second = FakeSolver(str(tmp_path / "cache"))
+    summary = solve_batch(second, str(tasks), str(output), workers=2)
+
+    assert summary["skipped"] == 2
+    assert sorted(call[0] for call in second.calls) == ["b"]
+    lines = output.read_text().splitlines()
+    ok = [json.loads(line) for line in lines if line.startswith("{") and line.endswith("}")]
+    assert sorted(r["id"] for r in ok if "error" not in r) == ["t0", "t1", "t2"]
+
+
+def test_duplicate_task_ids_are_rejected(tmp_path):
+    tasks = tmp_path / "tasks.jsonl"
+    tasks.write_text('{"id": 1, "question": "a"}\n{"id": 1, "question": "b"}\n')
+    with pytest.raises(ValueError, match="duplicate"):
+        solve_batch(FakeSolver(str(tmp_path)), str(tasks), str(tmp_path / "out.jsonl"))
@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+from conftest import FakeExecutor, FakePlanner
+
+from models.planner import Planner
+
+
+class CrashingPlanner(FakePlanner):
+    """Fails the verification of step `crash_at`, like a process killed mid-call"""
+
+    def __init__(self, crash_at, **kwargs):
+        super().__init__(**kwargs)
+        self.crash_at = crash_at
+
+    def verificate_context(self, question, image_path, query_analysis, memory):
+        if len(memory.get_actions()) == self.crash_at:
+            raise RuntimeError("killed")
+        return super().verificate_context(question, image_path, query_analysis, memory)
+
+
+def test_resume_continues_after_the_last_finished_stage(make_solver, tmp_path):
+    verdicts = ("CONTINUE", "CONTINUE", "STOP")
+    crashed, crashed_executor = CrashingPlanner(2, tools=("Tool_A", "Tool_B"), verdicts=verdicts), FakeExecutor()
+    with pytest.raises(RuntimeError):
+        make_solver(crashed, crashed_executor, output_types="direct").solve("q")
+
+    planner, executor = FakePlanner(tools=("Tool_A", "Tool_B"), verdicts=verdicts), FakeExecutor()
+    result = make_solver(planner, executor, output_types="direct").solve("q", resume=True)
+
+    # Query analysis, both plans, both actions and the first verdict come from the checkpoint
+    assert planner.calls == [("verify", 2), ("next_step", 3, 2), ("verify", 3), ("direct",)]
+    assert executor.executed == [("Tool_A", "execution = tool.execute(goal='goal 3')")]
+    assert result["query_analysis"] == "analysis"
+    assert result["step_count"] == 3
+    assert [action["tool_name"] for action in result["memory"].values()] == ["Tool_A", "Tool_B", "Tool_A"]
+    assert result["memory"]["Action Step 2"]["result"] == ["Tool_B result"]
+    assert result["checkpoint"]["resumed"] is True
+    assert result["checkpoint"]["reused_stages"] == 6
+
+
+def test_finished_solve_resumes_without_any_calls(make_solver):
+    make_solver(FakePlanner(), output_types="base,direct").solve("q")
+
+    planner, executor = FakePlanner(), FakeExecutor()
+    result = make_solver(planner, executor, output_types="base,direct").solve("q", resume=True)
+
+    assert planner.calls == [] and executor.executed == []
+    assert (result["base_response"], result["direct_output"]) == ("base", "direct")
+
+
+def test_checkpoint_of_another_question_is_not_resumed(make_solver, tmp_path):
+    query_cache_dir = str(tmp_path / "shared")
+    make_solver(FakePlanner(), output_types="direct").solve("q1", query_cache_dir=query_cache_dir)
+
+    planner = FakePlanner()
+    result = make_solver(planner, output_types="direct").solve("q2", query_cache_dir=query_cache_dir, resume=True)
+
+    assert [call[0] for call in planner.calls] == ["analyze", "next_step", "verify", "direct"]
+    assert result["checkpoint"]["resumed"] is False
+    with open(os.path.join(query_cache_dir, "checkpoint.json"), encoding="utf-8") as f:
+        assert json.load(f)["query"] == "q2"
+
+
+def test_solves_without_a_cache_dir_keep_one_checkpoint_per_question(make_solver):
+    with pytest.raises(RuntimeError):
+        make_solver(CrashingPlanner(1, verdicts=("CONTINUE", "STOP")), output_types="direct").solve("q1")
+    other = make_solver(FakePlanner(), output_types="direct").solve("q2")
+
+    planner = FakePlanner(verdicts=("CONTINUE", "STOP"))
+    result = make_solver(planner, output_types="direct").solve("q1", resume=True)
+
+    assert result["checkpoint"]["resumed"] is True
+    assert planner.calls[0] == ("verify", 1)
+    assert result["checkpoint"]["path"] != other["checkpoint"]["path"]
+
+
+class ScriptedEngine:
+    """Stands in for the LLM behind a real Planner; fails verification when `crash`"""
+
+    def __init__(self, crash=False):
+        self.crash = crash
+        self.prompts = {}
+
+    def __call__(self, input_data, call_site=None, **kwargs):
+        prompt = input_data if isinstance(input_data, str) else input_data[0]
+        self.prompts[call_site] = prompt
+        if call_site == "analyze_query":
+            return "analysis of q"
+        if call_site == "next_step":
+            return "Context: c\nSub-Goal: read it\nTool Name: Tool_A"
+        if call_site == "verify":
+            if self.crash:
+                raise RuntimeError("killed")
+            return "Conclusion: STOP"
+        return "answer"
+
+
+def _real_planner(engine):
+    planner = Planner("local-llm", toolbox_metadata={"Tool_A": {"tool_name": "Tool_A"}}, available_tools=["Tool_A"])
+    planner.llm_engine = planner.llm_engine_mm = engine
+    return planner
+
+
+def test_resumed_direct_output_uses_the_saved_query_analysis(make_solver):
+    with pytest.raises(RuntimeError):
+        make_solver(_real_planner(ScriptedEngine(crash=True)), output_types="direct").solve("q")
+
+    engine = ScriptedEngine()
+    result = make_solver(_real_planner(engine), output_types="direct").solve("q", resume=True)
+
+    assert "analyze_query" not in engine.prompts and "next_step" not in engine.prompts
+    assert result["direct_output"] == "answer"
+    assert "Initial Analysis:\nanalysis of q\n" in engine.prompts["direct"]
@@ -0,0 +1,90 @@
+from models.context_budget import ContextBudget
+from models.memory import Memory
+
+
+def _memory(n_steps, result_chars):
+    memory = Memory()
+    for step in range(1, n_steps + 1):
+        memory.add_action(step, "A_Tool", f"goal {step}", f"cmd {step}", f"r{step}:" + "x" * result_chars)
+    return memory
+
+
+def test_recent_steps_verbatim_older_steps_excerpted():
+    budget = ContextBudget(keep_recent=1, max_result_tokens=10_000, excerpt_tokens=50)
+    text = budget.render_actions(_memory(3, 2000).get_actions(), "next_step")
+
+    assert "r3:" + "x" * 2000 in text
+    assert text.count("[excerpt of") == 2
+
+
+def test_oversized_recent_result_is_excerpted():
+    budget = ContextBudget(keep_recent=2, max_result_tokens=100, excerpt_tokens=50)
+    text = budget.render_actions(_memory(1, 4000).get_actions(), "verify")
+    assert "[excerpt of" in text
+    assert len(text) < 1000
+
+
+def test_budget_stubs_oldest_results_and_reports_sections():
+    budget = ContextBudget(budgets={"final": 300}, keep_recent=3, max_result_tokens=10_000)
+    text = budget.render_actions(_memory(3, 400).get_actions(), "final")
+    assert budget.count_tokens(text) <= 300
+    assert "[result omitted" in text
+    assert "r3:" in text
+
+    usage = budget.record("final", "header\n" + text, {"memory": text})
+    # The section count is the sum of the per-action counts, within a token per action of the whole
+    assert abs(usage["memory"] - budget.count_tokens(text)) <= 3
+    assert usage["other"] == budget.count_tokens("header\n")
+    assert usage["total"] == usage["memory"] + usage["other"]
+    assert budget.usage_report()["final"] == usage
+
+
+def test_each_text_is_counted_once():
+    counted = []
+
+    def count_tokens(text):
+        counted.append(text)
+        return len(text) // 4
+
+    budget = ContextBudget(count_tokens=count_tokens, budgets={"final": 300}, keep_recent=3, max_result_tokens=10_000)
+    actions = _memory(6, 400).get_actions()
+    text = budget.render_actions(actions, "final")
+    assert "[result omitted" in text
+    assert len(counted) == len(set(counted))
+    # Neither the rendered section nor the prompt around it is sent to the tokenizer
+    assert text not in counted
+    budget.record("final", "header\n" + text + "\nfooter", {"memory": text})
+    assert counted[-1] == "header\n\nfooter" and len(counted) == len(set(counted))
+
+    calls = len(counted)
+    assert budget.render_actions(actions, "final") == text
+    assert len(counted) == calls
+
+
+def test_summaries_are_cached():
+    calls = []
+    budget = ContextBudget(keep_recent=0, excerpt_tokens=10, summarizer=lambda text: calls.append(text) or "short")
+    actions = _memory(2, 500).get_actions()
+    budget.render_actions(actions, "next_step")
+    budget.render_actions(actions, "verify")
+    assert len(calls) == 2
+
+
+def test_engine_counts_tokens_with_server_tokenizer_and_falls_back():
+    import httpx
+
+    from engine.local_llm import ChatLocalLLM
+
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        if len(seen) > 1:
+            return httpx.Response(404)
+        return httpx.Response(200, json={"tokens": [1, 2, 3]})
+
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+    assert engine.count_tokens("abc def") == 3
+    assert engine.count_tokens("abc def") == 3  # memoized
+    assert seen == ["/tokenize"]
+    assert engine.count_tokens("x" * 40) == 10  # endpoint gone -> estimate
@@ -0,0 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.factory import create_llm_engine, registered_engines, shutdown_llm_engines
+
+
+def test_registry_shares_instances_per_configuration():
+    shutdown_llm_engines()
+    a = create_llm_engine(model_string="local-llm", base_url="http://gw/v1")
+    b = create_llm_engine(model_string="local-llm", base_url="http://gw/v1/")
+    c = create_llm_engine(model_string="local-llm", base_url="http://gw/v1", temperature=0)
+    private = create_llm_engine(model_string="local-llm", base_url="http://gw/v1", shared=False)
+
+    assert a is b
+    assert a is not c
+    assert private is not a
+    assert len(registered_engines()) == 2
+    private.close()
+    shutdown_llm_engines()
+    assert registered_engines() == []
+
+
+def test_registry_is_thread_safe():
+    shutdown_llm_engines()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        engines = list(pool.map(lambda _: create_llm_engine(model_string="local-llm", base_url="http://gw/v1"), range(32)))
+    assert all(engine is engines[0] for engine in engines)
+    shutdown_llm_engines()
@@ -0,0 +1,68 @@
+import base64
+import io
+import json
+
+import httpx
+from PIL import Image
+
+from engine.assets import InputAsset
+from engine.local_llm import ChatLocalLLM
+from models.planner import Planner
+
+
+def _png(path, size=(64, 32)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format="PNG")
+    path.write_bytes(buffer.getvalue())
+    return str(path)
+
+
+def test_asset_measures_and_encodes_once(tmp_path):
+    asset = InputAsset.load(_png(tmp_path / "img.png"), max_side=16)
+
+    assert asset.kind == "png"
+    assert asset.info() == {"image_path": str(tmp_path / "img.png"), "width": 64, "height": 32}
+    url = asset.data_url
+    assert url.startswith("data:image/png;base64,")
+    assert asset.data_url is url
+
+    decoded = Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+    assert max(decoded.size) == 16
+
+
+def test_planner_reads_input_once_per_solve(tmp_path, monkeypatch):
+    path = _png(tmp_path / "img.png")
+    loads = []
+    original = InputAsset.load.__func__
+
+    def counting_load(cls, *args, **kwargs):
+        loads.append(args)
+        return original(cls, *args, **kwargs)
+
+    monkeypatch.setattr(InputAsset, "load", classmethod(counting_load))
+    planner = Planner("local-llm")
+    planner.load_input_asset(path)
+    for _ in range(3):
+        assert planner.get_image_info(path)["width"] == 64
+        assert isinstance(planner._build_input("p", path)[1], InputAsset)
+    assert len(loads) == 1
+
+
+def test_engine_sends_image_content_part(tmp_path):
+    seen = []
+
+    def handler(request):
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+    asset = InputAsset.load(_png(tmp_path / "img.png"))
+    engine(["describe", asset])
+
+    content = seen[0]["messages"][1]["content"]
+    assert content[0] == {"type": "text", "text": "describe"}
+    assert content[1]["image_url"]["url"] == asset.data_url
+
+    engine.is_multimodal = False
+    engine(["describe", asset])
+    assert seen[1]["messages"][1]["content"] == "describe"
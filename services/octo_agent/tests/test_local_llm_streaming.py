@@ -0,0 +1,84 @@
+import json
+
+import httpx
+import pytest
+
+from engine.local_llm import ChatLocalLLM
+from engine.streaming import StopCondition, line_completed_after, word_after
+
+
+def _sse(*contents):
+    lines = []
+    for text in contents:
+        event = {"choices": [{"delta": {"content": text}, "finish_reason": None}]}
+        lines.append(f"data: {json.dumps(event)}")
+        lines.append("")
+    lines.append("data: [DONE]")
+    return lines
+
+
+@pytest.fixture
+def fake_stream():
+    state = {}
+
+    def install(lines):
+        state["lines"] = lines
+        state["consumed"] = 0
+
+        def body():
+            # Counts the lines the engine actually pulled from the stream
+            for line in lines:
+                state["consumed"] += 1
+                yield (line + "\n").encode()
+
+        def handler(request):
+            state["payload"] = json.loads(request.content)
+            return httpx.Response(200, content=body(), headers={"content-type": "text/event-stream"})
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        state["engine"] = ChatLocalLLM(model_string="test-model", base_url="http://gw/v1", http_client=client)
+        return state
+
+    return install
+
+
+def test_stop_condition_cuts_before_stop_sequence():
+    reason, text = StopCondition(stop_sequences=["END"]).check("abc END def")
+    assert reason == "stop_sequence"
+    assert text == "abc "
+
+
+def test_predicates_ignore_open_think_block():
+    next_step_done = line_completed_after("Tool Name:")
+    assert not next_step_done("<think>Tool Name: X\n")
+    assert next_step_done("<think>hmm</think>\nContext: c\nSub-Goal: s\n**Tool Name:** X_Tool\n")
+
+    verdict = word_after("Conclusion", ["STOP", "CONTINUE"])
+    assert not verdict("Conclusion: CONT")
+    assert verdict("Explanation: ok\n\nConclusion: STOP")
+
+
+def test_generate_stops_early_on_predicate(fake_stream):
+    state = fake_stream(_sse("Context: c\n", "Sub-Goal: s\n", "Tool Name: X_Tool", "\n", "extra", " text"))
+    engine = state["engine"]
+
+    text = engine.generate("prompt", stop_when=line_completed_after("Tool Name:"))
+
+    assert text == "Context: c\nSub-Goal: s\nTool Name: X_Tool\n"
+    assert state["payload"]["stream"] is True
+    # The rest of the upstream stream was never read
+    assert state["consumed"] < len(state["lines"])
+    stats = engine.last_stream_stats
+    assert stats.stopped_early and stats.stop_reason == "predicate"
+    assert stats.ttft_s is not None
+
+
+def test_stream_iterator_and_callback(fake_stream):
+    engine = fake_stream(_sse("Hello", " world", "STOP here"))["engine"]
+    seen = []
+
+    chunks = list(engine.stream("prompt", stop=["STOP"], on_token=seen.append))
+
+    assert "".join(chunks) == "Hello world"
+    assert seen == chunks
+    assert engine.last_stream_stats.stop_reason == "stop_sequence"
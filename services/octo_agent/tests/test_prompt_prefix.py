@@ -0,0 +1,98 @@
+import json
+
+import httpx
+
+from engine.local_llm import ChatLocalLLM
+from models.memory import Memory
+from models.planner import Planner
+
+
+class RecordingEngine:
+    def __init__(self):
+        self.prompts = []
+
+    def __call__(self, input_data, **kwargs):
+        prompt = input_data if isinstance(input_data, str) else input_data[0]
+        self.prompts.append((kwargs.get("call_site"), prompt))
+        return "Conclusion: CONTINUE"
+
+
+def _planner():
+    metadata = {
+        "B_Tool": {"tool_name": "B_Tool", "input_types": {"x": "str"}},
+        "A_Tool": {"tool_name": "A_Tool", "input_types": {"y": "int"}},
+    }
+    planner = Planner("local-llm", toolbox_metadata=metadata, available_tools=list(metadata))
+    planner.llm_engine = planner.llm_engine_mm = RecordingEngine()
+    return planner
+
+
+def test_variable_content_follows_stable_prefix():
+    planner = _planner()
+    memory = Memory()
+    planner.generate_next_step("first question", None, "analysis 1", memory, 1, 5)
+    memory.add_action(1, "A_Tool", "goal", "cmd", "result")
+    planner.generate_next_step("second question", None, "analysis 2", memory, 2, 5)
+    planner.verificate_context("first question", None, "analysis 1", memory)
+
+    (site_a, first), (_, second), (site_v, verify) = planner.llm_engine.prompts
+    assert (site_a, site_v) == ("next_step", "verify")
+
+    shared = first.index("Query: first question")
+    assert second[:shared] == first[:shared]
+    assert first.startswith(planner.tools_prefix)
+    assert verify.startswith(planner.tools_prefix)
+
+
+def test_tools_prefix_is_independent_of_dict_order():
+    planner = _planner()
+    reordered = Planner(
+        "local-llm",
+        toolbox_metadata=dict(reversed(list(planner.toolbox_metadata.items()))),
+        available_tools=list(reversed(planner.available_tools)),
+    )
+    assert reordered.tools_prefix == planner.tools_prefix
+
+
+def test_engine_reports_prefix_hits_per_call_site():
+    replies = iter([
+        {"timings": {"prompt_n": 1000, "cache_n": 0, "prompt_ms": 500.0}},
+        {"timings": {"prompt_n": 100, "cache_n": 900, "prompt_ms": 50.0}},
+    ])
+
+    def handler(request):
+        body = {"choices": [{"message": {"content": "ok"}}], **next(replies)}
+        return httpx.Response(200, json=body)
+
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+    engine.generate("p", call_site="next_step")
+    engine.generate("p", call_site="next_step")
+
+    report = engine.prefix_cache_report()["next_step"]
+    assert report["calls"] == 2
+    assert report["prompt_tokens"] == 2000
+    assert report["hit_rate"] == 0.45
+    assert report["prefill_ms"] == 550.0
+    json.dumps(report)
+
+
+def test_parallel_next_step_prompt_and_subgoal_extraction():
+    planner = _planner()
+    planner.generate_parallel_next_step("q", None, "analysis", Memory(), 1, 5, 3)
+    site, prompt = planner.llm_engine.prompts[0]
+    assert site == "next_step"
+    assert prompt.startswith(planner.tools_prefix)
+    assert "up to 3 sub-goals" in prompt
+
+    reply = (
+        "Justification: independent files\n"
+        "Context: a.pdf\nSub-Goal: read a\nTool Name: A_Tool\n\n"
+        "Context: b.pdf\nSub-Goal: read b\nTool Name: A_Tool\n"
+        "Context: x\nSub-Goal: look up x\nTool Name: B_Tool"
+    )
+    assert planner.extract_subgoals(reply, 3) == [
+        ("a.pdf", "read a", "A_Tool"),
+        ("b.pdf", "read b", "A_Tool"),
+        ("x", "look up x", "B_Tool"),
+    ]
+    assert len(planner.extract_subgoals(reply, 2)) == 2
@@ -0,0 +1,67 @@
+import json
+
+import httpx
+
+from engine.local_llm import ChatLocalLLM
+from engine.reasoning import split_reasoning
+
+
+def _sse(*contents):
+    lines = []
+    for text in contents:
+        event = {"choices": [{"delta": {"content": text}, "finish_reason": None}]}
+        lines.append(f"data: {json.dumps(event)}")
+        lines.append("")
+    lines.append("data: [DONE]")
+    return lines
+
+
+def test_split_reasoning_variants():
+    assert split_reasoning("<think>a b</think>\n\nanswer") == ("a b", "answer")
+    # Chat template already opened the block
+    assert split_reasoning("a b</think>answer") == ("a b", "answer")
+    assert split_reasoning("<think>unfinished") == ("unfinished", "")
+    assert split_reasoning("plain answer\n") == ("", "plain answer\n")
+
+
+def test_generate_strips_reasoning_and_writes_trace(tmp_path):
+    def handler(request):
+        return httpx.Response(200, json={"choices": [{"message": {"content": "<think>long thoughts</think>\n\nParis"}}]})
+
+    trace_path = tmp_path / "trace.jsonl"
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", http_client=client, reasoning_trace_path=str(trace_path))
+
+    assert engine.generate("q", call_site="final") == "Paris"
+    assert engine.last_reasoning == "long thoughts"
+    record = json.loads(trace_path.read_text().strip())
+    assert record["call_site"] == "final"
+    assert record["reasoning"] == "long thoughts"
+    assert record["budget_truncated"] is False
+
+
+def test_reasoning_budget_closes_think_block_and_requests_answer():
+    requests = []
+
+    def handler(request):
+        payload = json.loads(request.content)
+        requests.append(payload)
+        if payload.get("stream"):
+            body = "\n".join(_sse("<think>", "step", " step", " step", " step", "</think>", "never")).encode()
+            return httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Conclusion: STOP"}}]})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", http_client=client, reasoning_budgets={"verify": 2})
+
+    assert engine.generate("q", call_site="verify") == "Conclusion: STOP"
+    assert engine.last_stream_stats.stop_reason == "reasoning_budget"
+    assert len(requests) == 2
+    prefill = requests[1]["messages"][-1]
+    assert prefill["role"] == "assistant"
+    assert prefill["content"].rstrip().endswith("</think>")
+    assert "step step" in prefill["content"]
+
+    # Call sites without a budget are not forced onto the stream
+    engine.generate("q", call_site="final")
+    assert "stream" not in requests[-1]
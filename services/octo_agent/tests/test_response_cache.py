@@ -0,0 +1,90 @@
+import json
+
+import httpx
+
+from engine.cache import ResponseCache
+from engine.local_llm import ChatLocalLLM
+from engine.streaming import line_completed_after
+
+
+def _mock_client():
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"answer {len(calls)}"}}]})
+
+    return httpx.Client(transport=httpx.MockTransport(handler)), calls
+
+
+def test_l1_lru_and_l2_fallback(tmp_path):
+    cache = ResponseCache(str(tmp_path), l1_max_entries=1)
+    cache.set("a", "alpha")
+    cache.set("b", "beta")  # evicts "a" from L1
+
+    assert cache.get("b") == "beta"
+    assert cache.get("a") == "alpha"
+    assert cache.get("missing") is None
+
+    stats = cache.stats()
+    assert stats["l1_hits"] == 1
+    assert stats["l2_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["bytes_written"] == len("alpha") + len("beta")
+    cache.close()
+
+
+def test_engine_caches_only_deterministic_requests(tmp_path):
+    client, calls = _mock_client()
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", use_cache=True, cache_path=str(tmp_path), http_client=client)
+
+    assert engine.generate("q", temperature=0) == "answer 1"
+    assert engine.generate("q", temperature=0) == "answer 1"
+    assert len(calls) == 1
+
+    engine.generate("q", temperature=0.7)
+    engine.generate("q", temperature=0.7)
+    assert len(calls) == 3
+    assert engine.cache_stats()["l1_hits"] == 1
+
+
+def test_cache_key_covers_request_parameters(tmp_path):
+    client, calls = _mock_client()
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", use_cache=True, cache_path=str(tmp_path), temperature=0, http_client=client)
+
+    engine.generate("q")
+    engine.generate("q", max_tokens=10)
+    engine.generate("q", system_prompt="other")
+    engine.generate("q", stop=["END"])
+    engine.model_string = "other-model"
+    engine.generate("q")
+    assert len(calls) == 5
+
+
+def _sse_client():
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        event = {"choices": [{"delta": {"content": f"Tool Name: X{len(calls)}\n"}, "finish_reason": None}]}
+        body = f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n"
+        return httpx.Response(200, content=body.encode(), headers={"content-type": "text/event-stream"})
+
+    return httpx.Client(transport=httpx.MockTransport(handler)), calls
+
+
+def test_stop_predicates_without_cache_token_are_not_cached(tmp_path):
+    client, calls = _sse_client()
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", use_cache=True, cache_path=str(tmp_path), temperature=0, http_client=client)
+
+    engine.generate("q", stop_when=lambda text: text.endswith("\n"))
+    engine.generate("q", stop_when=lambda text: text.endswith("\n"))
+    assert len(calls) == 2
+    assert engine.cache_stats()["bytes_written"] == 0
+
+    assert engine.generate("q", stop_when=line_completed_after("Tool Name:")) == "Tool Name: X3\n"
+    assert engine.last_stream_stats is not None
+    assert engine.generate("q", stop_when=line_completed_after("Tool Name:")) == "Tool Name: X3\n"
+    assert len(calls) == 3
+    # The hit streamed nothing; the stats of the call before it are gone
+    assert engine.last_stream_stats is None
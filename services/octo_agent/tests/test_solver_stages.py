@@ -0,0 +1,88 @@
+from conftest import FakeExecutor, FakePlanner
+
+
+def test_multi_output_solve_takes_its_longest_chain(make_solver):
+    planner = FakePlanner(delay=0.1)
+    solver = make_solver(planner, output_types="base,final,direct", stage_concurrency=3)
+
+    result = solver.solve("q")
+
+    assert (result["base_response"], result["final_output"], result["direct_output"]) == ("base", "final", "direct")
+    times = result["stage_times"]
+    assert set(times["stages"]) == {"base_response", "query_analysis", "steps", "final_output", "direct_output"}
+    # analyze -> next_step + verify -> final/direct: four 0.1s calls; the base response and one
+    # of the outputs overlap with it
+    assert times["summed_time"] >= 0.6
+    assert times["critical_path_time"] < 0.5
+    assert times["wall_time"] < times["summed_time"] - 0.15
+
+
+def test_stage_concurrency_one_keeps_the_sequential_order(make_solver):
+    planner = FakePlanner()
+    solver = make_solver(planner, output_types="base,final,direct", stage_concurrency=1)
+
+    solver.solve("q")
+
+    assert [call[0] for call in planner.calls] == ["base", "analyze", "next_step", "verify", "final", "direct"]
+
+
+def test_each_solve_starts_with_empty_memory(make_solver):
+    planner = FakePlanner(verdicts=("CONTINUE", "STOP"))
+    solver = make_solver(planner, output_types="direct")
+
+    first = solver.solve("q1")
+    second = solver.solve("q2")
+
+    assert len(first["memory"]) == len(second["memory"]) == 2
+    assert [call[2] for call in planner.calls if call[0] == "next_step"] == [0, 1, 0, 1]
+
+
+def test_speculative_planning_overlaps_verification(make_solver):
+    planner = FakePlanner(verdicts=("CONTINUE", "CONTINUE", "STOP"), delay=0.05)
+    sequential = FakePlanner(verdicts=("CONTINUE", "CONTINUE", "STOP"))
+    solver = make_solver(planner, output_types="direct", speculative_planning=True)
+
+    result = solver.solve("q")
+    make_solver(sequential, output_types="direct").solve("q")
+
+    assert result["step_count"] == 3
+    # Same plans on the same memory as without speculation, plus the discarded plan for step 4
+    speculative_steps = [call[1:] for call in planner.calls if call[0] == "next_step"]
+    sequential_steps = [call[1:] for call in sequential.calls if call[0] == "next_step"]
+    assert speculative_steps[:3] == sequential_steps
+    assert speculative_steps[3] == (4, 3)
+    speculation = result["speculation"]
+    assert (speculation["started"], speculation["used"], speculation["wasted"]) == (3, 2, 1)
+    assert speculation["waste_rate"] == round(1 / 3, 4)
+    assert speculation["saved_time"] > 0.05
+
+
+def test_speculative_planning_is_skipped_with_a_single_generation_slot(make_solver):
+    class OneSlotEngine:
+        def generation_slots(self):
+            return 1
+
+    planner = FakePlanner(verdicts=("CONTINUE", "STOP"))
+    planner.llm_engine = OneSlotEngine()
+
+    result = make_solver(planner, output_types="direct", speculative_planning=True).solve("q")
+
+    # A plan started during verification would only hold the slot verification waits for
+    assert [call[1] for call in planner.calls if call[0] == "next_step"] == [1, 2]
+    assert "speculation" not in result
+
+
+def test_parallel_step_runs_independent_subgoals_concurrently(make_solver):
+    planner = FakePlanner(tools=("OCR_Tool", "Memory_Tool"), fan_out=3)
+    executor = FakeExecutor(delay=0.1)
+    solver = make_solver(planner, executor, output_types="direct", parallel_steps=3)
+
+    result = solver.solve("q")
+
+    assert result["step_count"] == 1
+    assert result["action_count"] == 3
+    assert list(result["memory"]) == ["Action Step 1.1", "Action Step 1.2", "Action Step 1.3"]
+    assert result["memory"]["Action Step 1.2"]["tool_name"] == "Memory_Tool"
+    assert [call[0] for call in planner.calls].count("verify") == 1
+    # Three sub-goals of 0.2s (command + execution) each, run side by side
+    assert result["stage_times"]["stages"]["steps"] < 0.45
@@ -0,0 +1,112 @@
+import contextvars
+import json
+import threading
+import time
+
+import httpx
+
+from engine.local_llm import ChatLocalLLM
+from models.stages import Speculation, StageRunner
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def _sleep(seconds, seen=None):
+    time.sleep(seconds)
+    if seen is not None:
+        seen.append(request_id.get())
+    return seconds
+
+
+def test_independent_stages_overlap_and_report_critical_path():
+    runner = StageRunner(max_concurrency=3)
+    base = runner.submit("base", _sleep, 0.2)
+    with runner.stage("analysis"):
+        _sleep(0.05)
+    with runner.stage("steps", after=("analysis",)):
+        _sleep(0.1)
+    final = runner.submit("final", _sleep, 0.1, after=("steps",))
+    direct = runner.submit("direct", _sleep, 0.1, after=("steps",))
+    for future in (base, final, direct):
+        future.result()
+    runner.close()
+
+    report = runner.report()
+    assert report["summed_time"] >= 0.55
+    # analysis -> steps -> final is 0.25s, the base response alone 0.2s
+    assert 0.25 <= report["critical_path_time"] < 0.35
+    assert report["wall_time"] < report["summed_time"]
+
+
+def test_concurrency_cap_of_one_runs_stages_one_after_another():
+    runner = StageRunner(max_concurrency=1)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def tracked():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    futures = [runner.submit(f"s{i}", tracked) for i in range(3)]
+    with runner.stage("inline"):
+        tracked()
+    for future in futures:
+        future.result()
+    runner.close()
+    assert peak[0] == 1
+
+
+def test_background_stages_see_the_callers_context():
+    token = request_id.set("solve-1")
+    try:
+        runner = StageRunner(max_concurrency=2)
+        seen = []
+        runner.submit("base", _sleep, 0, seen).result()
+        runner.close()
+    finally:
+        request_id.reset(token)
+    assert seen == ["solve-1"]
+
+
+def test_discarded_speculation_closes_its_stream_and_counts_as_waste():
+    sent = []
+    priorities = []
+
+    def deltas():
+        for i in range(200):
+            sent.append(i)
+            event = {"choices": [{"delta": {"content": f"t{i} "}, "finish_reason": None}]}
+            yield f"data: {json.dumps(event)}\n\n".encode()
+            time.sleep(0.005)
+        yield b"data: [DONE]\n\n"
+
+    def handler(request):
+        if request.url.path == "/metrics":
+            return httpx.Response(200, json={"admission": {"slots": 2}})
+        priorities.append(request.headers.get("x-priority"))
+        return httpx.Response(200, content=deltas(), headers={"content-type": "text/event-stream"})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", http_client=client)
+    assert engine.generation_slots() == 2
+    speculation = Speculation()
+
+    speculation.start(engine.generate, "plan the next step")
+    while len(sent) < 5:
+        time.sleep(0.005)
+    speculation.discard()
+    speculation.close()
+
+    # close() returns once the cancelled call has stopped reading the stream
+    stopped_at = len(sent)
+    time.sleep(0.05)
+    assert len(sent) == stopped_at < 200
+    # Queued behind the calls it runs alongside
+    assert priorities == ["batch"]
+    report = speculation.report()
+    assert (report["started"], report["wasted"]) == (1, 1)
+    assert report["wasted_tokens"] > 0 and report["token_waste_rate"] == 1.0
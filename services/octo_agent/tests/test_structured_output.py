@@ -0,0 +1,74 @@
+import json
+
+import httpx
+
+from engine.local_llm import ChatLocalLLM
+from engine.streaming import line_completed_after
+from models.formatters import NextStep, QueryAnalysis
+
+
+def _engine(reply, seen, **kwargs):
+    def handler(request):
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, json={"choices": [{"message": {"content": reply}}]})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    return ChatLocalLLM(model_string="m", base_url="http://gw/v1", http_client=client, **kwargs)
+
+
+def test_response_format_is_sent_as_schema_and_parsed():
+    seen = []
+    reply = json.dumps({"justification": "j", "context": "c", "sub_goal": "s", "tool_name": "X_Tool"})
+    engine = _engine(reply, seen, structured_output=True)
+
+    result = engine.generate("prompt", response_format=NextStep, stop_when=line_completed_after("Tool Name:"))
+
+    assert isinstance(result, NextStep)
+    assert result.tool_name == "X_Tool"
+    schema = seen[0]["response_format"]["json_schema"]["schema"]
+    assert set(schema["required"]) == {"justification", "context", "sub_goal", "tool_name"}
+    assert "stream" not in seen[0]
+
+
+def test_invalid_reply_falls_back_to_text():
+    seen = []
+    engine = _engine("Context: c\nSub-Goal: s\nTool Name: X_Tool", seen, structured_output=True)
+
+    assert engine.generate("prompt", response_format=NextStep) == "Context: c\nSub-Goal: s\nTool Name: X_Tool"
+
+
+def test_structured_output_is_opt_in():
+    seen = []
+    engine = _engine("plain", seen)
+
+    assert engine.generate("prompt", response_format=NextStep) == "plain"
+    assert "response_format" not in seen[0]
+
+
+def test_unconstrained_call_sites_keep_early_stop_and_reasoning():
+    seen = []
+    deltas = ["<think>which tool?</think>", "Context: c\n", "Sub-Goal: s\n", "Tool Name: X_Tool\n", "never sent"]
+    analysis = json.dumps({"concise_summary": "s", "required_skills": "r", "relevant_tools": "t", "additional_considerations": "a"})
+
+    def handler(request):
+        payload = json.loads(request.content)
+        seen.append(payload)
+        if not payload.get("stream"):
+            return httpx.Response(200, json={"choices": [{"message": {"content": analysis}}]})
+        events = [f"data: {json.dumps({'choices': [{'delta': {'content': d}, 'finish_reason': None}]})}\n\n" for d in deltas]
+        return httpx.Response(200, content="".join(events) + "data: [DONE]\n\n", headers={"content-type": "text/event-stream"})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    engine = ChatLocalLLM(model_string="m", base_url="http://gw/v1", http_client=client, structured_output=["analyze_query"])
+
+    step = engine.generate("prompt", response_format=NextStep, stop_when=line_completed_after("Tool Name:"), call_site="next_step")
+    reasoning, stats = engine.last_reasoning, engine.last_stream_stats
+    parsed = engine.generate("prompt", response_format=QueryAnalysis, call_site="analyze_query")
+
+    # next_step is not constrained: it streams, stops after the tool line and keeps its reasoning
+    assert step == "Context: c\nSub-Goal: s\nTool Name: X_Tool"
+    assert "response_format" not in seen[0] and seen[0]["stream"] is True
+    assert stats.stop_reason == "predicate" and reasoning == "which tool?"
+    # analyze_query is constrained to its schema and parsed
+    assert isinstance(parsed, QueryAnalysis)
+    assert "response_format" in seen[1] and "stream" not in seen[1]
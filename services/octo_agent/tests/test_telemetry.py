@@ -0,0 +1,64 @@
+import json
+import threading
+
+import httpx
+
+from engine.local_llm import ChatLocalLLM
+from engine.telemetry import JsonlSink, TelemetryAggregator, collect_telemetry
+
+
+def _engine(tmp_path=None, **kwargs):
+    def handler(request):
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "ok"}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 7},
+            "timings": {"cache_n": 60, "prompt_n": 40, "prompt_ms": 12.0, "predicted_n": 7},
+        })
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    if tmp_path is not None:
+        kwargs.update(use_cache=True, cache_path=str(tmp_path / "cache"))
+    return ChatLocalLLM(model_string="m", base_url="http://gw/v1", http_client=client, **kwargs)
+
+
+def test_records_tokens_and_cache_hits(tmp_path):
+    sink = JsonlSink(str(tmp_path / "calls.jsonl"))
+    engine = _engine(tmp_path, temperature=0, telemetry_sinks=[sink])
+
+    with collect_telemetry() as telemetry:
+        engine.generate("q", call_site="next_step")
+        engine.generate("q", call_site="next_step")
+        engine.generate("other", call_site="verify")
+
+    rollup = telemetry.rollup()
+    assert rollup["next_step"]["calls"] == 2
+    assert rollup["next_step"]["cache_hits"] == 1
+    assert rollup["next_step"]["prompt_tokens"] == 100
+    assert rollup["next_step"]["cached_prompt_tokens"] == 60
+    assert rollup["next_step"]["completion_tokens"] == 7
+    assert rollup["total"]["calls"] == 3
+
+    lines = [json.loads(line) for line in (tmp_path / "calls.jsonl").read_text().splitlines()]
+    assert [line["call_site"] for line in lines] == ["next_step", "next_step", "verify"]
+    assert lines[1]["cache_hit"] is True
+
+
+def test_collectors_are_scoped_per_context():
+    engine = _engine()
+    results = {}
+
+    def solve(name, calls):
+        with collect_telemetry(TelemetryAggregator()) as telemetry:
+            for _ in range(calls):
+                engine.generate("q", call_site=name)
+        results[name] = telemetry.rollup()
+
+    threads = [threading.Thread(target=solve, args=("a", 2)), threading.Thread(target=solve, args=("b", 3))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results["a"]["total"]["calls"] == 2
+    assert results["b"]["total"]["calls"] == 3
+    assert "a" not in results["b"]
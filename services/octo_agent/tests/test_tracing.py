@@ -0,0 +1,72 @@
+import contextvars
+import json
+import threading
+
+from conftest import FakePlanner
+
+from engine.tracing import Tracer, span, trace_spans
+
+
+def test_span_is_a_shared_noop_without_a_tracer():
+    first, second = span("a", step=1), span("b")
+    assert first is second
+    with first as opened:
+        opened.set(tokens=3)
+
+
+def test_nested_spans_keep_their_parent_across_threads():
+    def inner():
+        with span("inner"):
+            pass
+
+    with trace_spans() as tracer, span("outer", step=1) as outer:
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(inner,), name="worker")
+        worker.start()
+        worker.join()
+        outer.set(tokens=42)
+
+    inner, outer = sorted(tracer.records(), key=lambda record: record.name)
+    assert inner.parent_id == outer.span_id and outer.parent_id is None
+    assert inner.thread == "worker"
+    assert outer.attributes == {"step": 1, "tokens": 42}
+    # Spans opened after the tracer is gone are not recorded
+    with span("after"):
+        pass
+    assert len(tracer.records()) == 2
+
+
+def test_failed_span_records_the_error_and_exports(tmp_path):
+    tracer = Tracer()
+    with trace_spans(tracer):
+        try:
+            with span("llm", call_site="verify"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+
+    trace = tracer.chrome_trace()
+    complete = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    assert complete[0]["name"] == "llm" and complete[0]["args"] == {"call_site": "verify", "error": "ValueError: boom"}
+    assert any(event["ph"] == "M" for event in trace["traceEvents"])
+    tracer.write_jsonl(str(tmp_path / "spans.jsonl"))
+    line = json.loads((tmp_path / "spans.jsonl").read_text())
+    assert (line["name"], line["error"], tracer.summary()["llm"]["errors"]) == ("llm", "ValueError: boom", 1)
+
+
+def test_traced_solve_writes_chrome_trace_and_spans(make_solver):
+    solver = make_solver(FakePlanner(tools=("Tool_A", "Tool_B"), verdicts=("CONTINUE", "STOP")), output_types="direct", trace=True)
+
+    result = solver.solve("q")
+
+    summary = result["trace"]["summary"]
+    assert summary["solve"]["count"] == 1 and summary["step"]["count"] == 2 and summary["action"]["count"] == 2
+    assert {"stage.query_analysis", "stage.steps", "stage.direct_output"} <= set(summary)
+    with open(result["trace"]["spans"], encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f]
+    by_id = {record["span_id"]: record for record in spans}
+    actions = [record for record in spans if record["name"] == "action"]
+    assert [record["attributes"]["tool"] for record in actions] == ["Tool_A", "Tool_B"]
+    assert all(by_id[record["parent_id"]]["name"] == "step" for record in actions)
+    assert by_id[actions[0]["parent_id"]]["attributes"] == {"step": 1, "actions": 1, "conclusion": "CONTINUE"}
+    with open(result["trace"]["chrome_trace"], encoding="utf-8") as f:
+        assert len([event for event in json.load(f)["traceEvents"] if event["ph"] == "X"]) == len(spans)